@@ -0,0 +1,257 @@
+# analytics.py
+"""
+Population-level statistics over stress_assessments, computed in SQL.
+
+Every query here is a single GROUP BY over the tables, so the database
+does the work and only the aggregated rows come back: no Assessment
+objects are built. Period bucketing is dialect specific (SQLite date(),
+PostgreSQL to_char/date_trunc), everything else is portable.
+
+export() streams stress_assessments to a columnar file for offline
+analysis, chunk by chunk, so memory stays bounded by the chunk size:
+
+- Parquet (one row group per chunk) when pyarrow with parquet support is
+  installed,
+- otherwise Arrow IPC when only pyarrow is,
+- otherwise a compressed .npz whose members are "<column>/<chunk>" arrays,
+  read back with read_npz_export().
+
+    python analytics.py distribution
+    python analytics.py mechanisms --period month
+    python analytics.py export assessments.parquet --chunk-rows 50000
+"""
+import argparse
+import json
+import zipfile
+
+import numpy as np
+from sqlalchemy import Date, DateTime, Float, Integer, case, func, select
+
+from models import Assessment, AssessmentMechanism, Mechanism, RECOMMENDED, db
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: export falls back to NPZ
+    pa = None
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+# lower bounds of the age bands; the last band is open-ended
+AGE_BANDS = (18, 21, 24, 27, 30)
+
+PERIODS = ("day", "week", "month")
+
+# legacy JSON strings, superseded by stress_assessment_mechanisms
+_EXPORT_SKIP = {"current_mechanisms", "recommendations"}
+
+
+def age_band(column=Assessment.age):
+    """SQL CASE labelling ages by AGE_BANDS, e.g. '<18', '18-20', '30+'; NULL ages are 'unknown'."""
+    whens = [(column.is_(None), "unknown"), (column < AGE_BANDS[0], f"<{AGE_BANDS[0]}")]
+    for lo, hi in zip(AGE_BANDS, AGE_BANDS[1:]):
+        whens.append((column < hi, f"{lo}-{hi - 1}"))
+    return case(*whens, else_=f"{AGE_BANDS[-1]}+")
+
+
+def period_start(column, period):
+    """SQL expression for the first day of column's day/week/month, as 'YYYY-MM-DD' text."""
+    if period not in PERIODS:
+        raise ValueError(f"unknown period {period!r}; choose one of {', '.join(PERIODS)}")
+    if db.engine.dialect.name == "postgresql":
+        unit = {"day": "day", "week": "week", "month": "month"}[period]
+        return func.to_char(func.date_trunc(unit, column), "YYYY-MM-DD")
+    # SQLite: weeks start on Monday like date_trunc('week')
+    if period == "day":
+        return func.date(column)
+    if period == "week":
+        return func.date(column, "-6 days", "weekday 1")
+    return func.date(column, "start of month")
+
+
+def _filtered(query, start=None, end=None):
+    if start is not None:
+        query = query.where(Assessment.created_at >= start)
+    if end is not None:
+        query = query.where(Assessment.created_at < end)
+    return query
+
+
+def category_distribution(by=("age_band", "gender"), start=None, end=None):
+    """
+    Assessment counts per predicted stress category within each group of
+    `by` (any of "age_band", "gender"), with each category's share of the
+    group: [{"age_band": "18-20", "gender": "Female", "total": n,
+    "Low": {"count": .., "share": ..}, ...}].
+    """
+    columns = {"age_band": age_band().label("age_band"), "gender": Assessment.gender.label("gender")}
+    keys = [columns[name] for name in by]
+    query = _filtered(select(*keys, Assessment.predicted_stress, func.count().label("n"))
+                      .group_by(*keys, Assessment.predicted_stress), start, end)
+    groups = {}
+    for row in db.session.execute(query):
+        key = tuple(row[:len(keys)])
+        group = groups.setdefault(key, dict(zip(by, key), total=0))
+        group["total"] += row.n
+        group[row.predicted_stress or "unknown"] = {"count": row.n}
+    out = []
+    for key in sorted(groups, key=lambda k: tuple("" if v is None else str(v) for v in k)):
+        group = groups[key]
+        for name, value in group.items():
+            if isinstance(value, dict):
+                value["share"] = value["count"] / group["total"]
+        out.append(group)
+    return out
+
+
+def top_mechanisms(period="month", limit=5, kind=RECOMMENDED, start=None, end=None):
+    """
+    The `limit` mechanisms most often recommended (or, with kind="current",
+    already in use) per period: [{"period": "2026-10-01", "assessments": n,
+    "mechanisms": [{"mechanism": .., "count": .., "share": ..}, ...]}].
+    """
+    bucket = period_start(Assessment.created_at, period).label("period")
+    per_mechanism = _filtered(
+        select(bucket, Mechanism.name, func.count().label("n"))
+        .select_from(AssessmentMechanism)
+        .join(Assessment, Assessment.id == AssessmentMechanism.assessment_id)
+        .join(Mechanism, Mechanism.id == AssessmentMechanism.mechanism_id)
+        .where(AssessmentMechanism.kind == kind)
+        .group_by(bucket, Mechanism.name), start, end)
+    per_period = _filtered(select(bucket, func.count().label("n")).group_by(bucket), start, end)
+    totals = {row.period: row.n for row in db.session.execute(per_period)}
+
+    by_period = {}
+    for row in db.session.execute(per_mechanism):
+        by_period.setdefault(row.period, []).append((row.n, row.name))
+    out = []
+    for p in sorted(by_period):
+        ranked = sorted(by_period[p], key=lambda item: (-item[0], item[1]))[:limit]
+        out.append({
+            "period": str(p),
+            "assessments": totals.get(p, 0),
+            "mechanisms": [{"mechanism": name, "count": n, "share": n / totals[p]} for n, name in ranked],
+        })
+    return out
+
+
+# ── columnar export ──────────────────────────────────────────────────────────
+
+def _export_columns():
+    return [c for c in Assessment.__table__.columns if c.name not in _EXPORT_SKIP]
+
+
+def _numpy_column(column, values):
+    if isinstance(column.type, DateTime):
+        return np.array(values, dtype="datetime64[us]")
+    if isinstance(column.type, Date):
+        return np.array(values, dtype="datetime64[D]")
+    if isinstance(column.type, Integer) and not column.nullable:
+        return np.array(values, dtype=np.int64)
+    if isinstance(column.type, (Integer, Float)):
+        # nullable numbers become float64 with NaN for NULL
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+def _arrow_schema(columns):
+    def arrow_type(column):
+        if isinstance(column.type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column.type, Date):
+            return pa.date32()
+        if isinstance(column.type, Integer):
+            return pa.int64()
+        if isinstance(column.type, Float):
+            return pa.float64()
+        return pa.string()
+    return pa.schema([pa.field(c.name, arrow_type(c), nullable=c.nullable) for c in columns])
+
+
+def default_format():
+    if pq is not None:
+        return "parquet"
+    if pa is not None:
+        return "arrow"
+    return "npz"
+
+
+def iter_chunks(chunk_rows=50_000, columns=None):
+    """Yield lists of row tuples from stress_assessments, chunk_rows at a time, in id order."""
+    columns = columns or _export_columns()
+    query = select(*columns).order_by(Assessment.id).execution_options(yield_per=chunk_rows)
+    for partition in db.session.execute(query).partitions(chunk_rows):
+        yield partition
+
+
+def export(path, fmt=None, chunk_rows=50_000):
+    """Stream stress_assessments to `path`; returns (format, rows written)."""
+    fmt = fmt or default_format()
+    columns = _export_columns()
+    names = [c.name for c in columns]
+    rows = 0
+    if fmt in ("parquet", "arrow"):
+        if pa is None or (fmt == "parquet" and pq is None):
+            raise RuntimeError(f"{fmt} export needs pyarrow; use fmt='npz'")
+        schema = _arrow_schema(columns)
+        writer = pq.ParquetWriter(path, schema) if fmt == "parquet" else pa.ipc.new_file(path, schema)
+        try:
+            for chunk in iter_chunks(chunk_rows, columns):
+                data = list(zip(*chunk))
+                writer.write_table(pa.table({n: data[i] for i, n in enumerate(names)}, schema=schema))
+                rows += len(chunk)
+        finally:
+            writer.close()
+    elif fmt == "npz":
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            i = 0
+            for i, chunk in enumerate(iter_chunks(chunk_rows, columns)):
+                data = list(zip(*chunk))
+                for j, column in enumerate(columns):
+                    with zf.open(f"{column.name}/{i:06d}.npy", "w", force_zip64=True) as f:
+                        np.lib.format.write_array(f, _numpy_column(column, data[j]), allow_pickle=False)
+                rows += len(chunk)
+            zf.writestr("columns.json", json.dumps({"columns": names, "chunks": i + 1 if rows else 0,
+                                                    "rows": rows}))
+    else:
+        raise ValueError(f"unknown export format {fmt!r}; choose parquet, arrow or npz")
+    return fmt, rows
+
+
+def read_npz_export(path, columns=None):
+    """{column: array} for an NPZ export, concatenating its chunks (all in memory)."""
+    with np.load(path) as npz:
+        with zipfile.ZipFile(path) as zf:
+            meta = json.loads(zf.read("columns.json"))
+        out = {}
+        for name in columns or meta["columns"]:
+            parts = [npz[f"{name}/{i:06d}"] for i in range(meta["chunks"])]
+            out[name] = np.concatenate(parts) if parts else np.array([])
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cohort statistics and columnar export.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    dist = sub.add_parser("distribution")
+    dist.add_argument("--by", nargs="+", default=["age_band", "gender"], choices=["age_band", "gender"])
+    mech = sub.add_parser("mechanisms")
+    mech.add_argument("--period", default="month", choices=PERIODS)
+    mech.add_argument("--limit", type=int, default=5)
+    exp = sub.add_parser("export")
+    exp.add_argument("path")
+    exp.add_argument("--format", default=None, choices=["parquet", "arrow", "npz"])
+    exp.add_argument("--chunk-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if args.command == "distribution":
+            print(json.dumps(category_distribution(tuple(args.by)), indent=2))
+        elif args.command == "mechanisms":
+            print(json.dumps(top_mechanisms(args.period, args.limit), indent=2))
+        else:
+            fmt, rows = export(args.path, args.format, args.chunk_rows)
+            print(f"Wrote {rows} assessments to {args.path} ({fmt})")
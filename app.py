@@ -1,13 +1,25 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-import pandas as pd
-import numpy as np
-import joblib
-import json
-import json as json_module
+import math
 import os
-from models import db, User, Profile, Assessment
+from datetime import datetime
+from sqlalchemy import func, or_, and_
+from models import db, User, Profile, Assessment, recommendations_for
 from forms import RegistrationForm, LoginForm, ProfileForm
+from mechanisms import known_mechanisms
+from reference_store import ReferenceStore
+from model_registry import LazyModels, ModelRegistry, load_bundle_dir, load_pickles, validate
+from prediction_cache import PredictionCache
+from rate_limit import Coalescer, DatabaseBucketStore, MemoryBucketStore, RateLimiter
+from micro_batch import MicroBatcher
+from assessment_writer import AssessmentWriter
+from request_stats import RequestStats
+from metrics import Metrics
+from slow_profiler import SlowRequestProfiler
+from db_migrate import upgrade
+import trends
+import analytics
+from memory_report import process_memory, mapped_files
 
 app = Flask(__name__)
 import os
@@ -22,34 +34,82 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:/
 if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
     app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['PREDICT_BATCH_LIMIT'] = int(os.environ.get('PREDICT_BATCH_LIMIT', 1000))
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+# emails allowed to read population-level /analytics (comma-separated)
+app.config['ANALYTICS_ADMINS'] = {e.strip().lower() for e in os.environ.get('ANALYTICS_ADMINS', '').split(',') if e.strip()}
 
-@app.template_filter('from_json')
-def from_json_filter(s):
-    return json_module.loads(s)
-    
 # Initialize extensions
 db.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+# query count + latency per request: Server-Timing header and /health/requests
+request_stats = RequestStats(app, slow_ms=float(os.environ.get('SLOW_REQUEST_MS', 500)))
+# per-stage and per-endpoint latency histograms on /metrics; STAGE_METRICS=0 turns them off
+metrics = Metrics(app, enabled=os.environ.get('STAGE_METRICS', '1') != '0')
+# PROFILE_SLOW_MS=<ms> samples request stacks and dumps the top ones for slower requests
+slow_profiler = None
+if os.environ.get('PROFILE_SLOW_MS'):
+    slow_profiler = SlowRequestProfiler(app, slow_ms=float(os.environ['PROFILE_SLOW_MS']),
+                                        interval_ms=float(os.environ.get('PROFILE_INTERVAL_MS', 5)))
 
 # Load ML models
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-scaler = joblib.load(os.path.join(BASE_DIR, "models", "scaler.joblib"))
-imputer = joblib.load(os.path.join(BASE_DIR, "models", "imputer.joblib"))
-rf_model = joblib.load(os.path.join(BASE_DIR, "models", "rf_model.joblib"))
-knn_model = joblib.load(os.path.join(BASE_DIR, "models", "knn_model.joblib"))
-
-with open(os.path.join(BASE_DIR, "models", "label_map.json")) as f:
-    label_map = json.load(f)
-with open(os.path.join(BASE_DIR, "models", "feature_columns.json")) as f:
-    feature_columns = json.load(f)
-with open(os.path.join(BASE_DIR, "models", "rec_feature_columns.json")) as f:
-    rec_feature_columns = json.load(f)
-
-train_recs = pd.read_csv(os.path.join(BASE_DIR, "data", "train_recs.csv"))
-train_recs["Mechanisms"] = train_recs["Stress Coping Mechanisms"].str.split(",")
-inv_map = {int(k): v for k, v in label_map.items()}
+# MODEL_BUNDLE=models/bundle loads the fused memory-mapped artifact written by
+# model_bundle.py / retrain_models.py instead of the joblib pickles
+MODEL_BUNDLE = os.environ.get('MODEL_BUNDLE')
+# MODEL_REGISTRY=models/registry serves the registry's active version and
+# swaps to a newly activated one without a restart (see model_registry.py)
+MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY')
+prediction_cache = PredictionCache(int(os.environ.get('PREDICTION_CACHE_SIZE', 1024)))
+
+def attach_reference_store(m):
+    # REFERENCE_STORE=1 adds stored assessments to the recommendation kNN's
+    # reference set as they come in (see reference_store.py)
+    if os.environ.get('REFERENCE_STORE') == '1':
+        m.reference_store = ReferenceStore(app, db, m.encoder, m.transform, m.knn_index, m.knn_reference,
+                                           m.mechanism_table,
+                                           sync_interval=float(os.environ.get('REFERENCE_SYNC_SECONDS', 30)),
+                                           compact_rows=int(os.environ.get('REFERENCE_COMPACT_ROWS', 2000)))
+
+def load_models():
+    """What current_models() serves from: a ModelRegistry, or one ModelSet."""
+    if MODEL_REGISTRY:
+        return ModelRegistry(os.path.join(BASE_DIR, MODEL_REGISTRY),
+                             neighbor_index=os.environ.get('NEIGHBOR_INDEX', 'exact'),
+                             poll_interval=float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 10)),
+                             retry_backoff=float(os.environ.get('MODEL_REGISTRY_RETRY_SECONDS', 60)),
+                             on_load=attach_reference_store)
+    if MODEL_BUNDLE:
+        m = load_bundle_dir(os.path.join(BASE_DIR, MODEL_BUNDLE),
+                            os.environ.get('NEIGHBOR_INDEX', 'exact'), mmap=True)
+    else:
+        m = load_pickles(BASE_DIR, os.environ.get('FOREST_EVALUATOR', 'sklearn'),
+                         os.environ.get('NEIGHBOR_INDEX', 'sklearn'))
+    attach_reference_store(m)
+    return m
+
+def warm_models(loaded):
+    # one smoke batch through the served version, so the first request does not pay for cold pages
+    if not MODEL_REGISTRY:  # the registry already ran one when it loaded
+        validate(loaded)
+
+# Models load on first use, so db scripts and auth-only traffic never pay for
+# them. MODEL_LOADING=background starts loading at import without blocking it,
+# eager loads during import (gunicorn.conf.py picks eager with PRELOAD_MODELS,
+# background otherwise); /health/ready says when they are in.
+MODEL_LOADING = os.environ.get('MODEL_LOADING', 'lazy')
+models_loader = LazyModels(load_models, warm=warm_models)
+if MODEL_LOADING == 'eager':
+    models_loader.get()
+elif MODEL_LOADING == 'background':
+    models_loader.warm_up()
+
+def current_models():
+    """The ModelSet a request should use from start to finish."""
+    loaded = models_loader.get()
+    return loaded.current() if MODEL_REGISTRY else loaded
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -103,8 +163,17 @@ def index():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    profiles = Profile.query.filter_by(user_id=current_user.id).all()
-    return render_template('dashboard/dashboard.html', profiles=profiles)
+    # profiles and their assessment counts in one grouped query
+    rows = (db.session.query(Profile, func.count(Assessment.id))
+            .outerjoin(Assessment, Assessment.profile_id == Profile.id)
+            .filter(Profile.user_id == current_user.id)
+            .group_by(Profile.id)
+            .order_by(Profile.id)
+            .all())
+    profiles = [profile for profile, _ in rows]
+    assessment_counts = {profile.id: count for profile, count in rows}
+    return render_template('dashboard/dashboard.html', profiles=profiles,
+                           assessment_counts=assessment_counts)
 
 @app.route('/profile/create', methods=['GET', 'POST'])
 @login_required
@@ -132,8 +201,95 @@ def view_profile(profile_id):
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
-    assessments = Assessment.query.filter_by(profile_id=profile_id).order_by(Assessment.created_at.desc()).all()
-    return render_template('dashboard/profile.html', profile=profile, assessments=assessments)
+    if assessment_writer is not None:
+        # show the assessment the user just submitted, even if not flushed yet
+        assessment_writer.flush()
+    # keyset pagination, newest first: ?before=<created_at>_<id> of the last card shown
+    page_size = app.config['HISTORY_PAGE_SIZE']
+    query = Assessment.query.filter_by(profile_id=profile_id)
+    before = parse_history_cursor(request.args.get('before'))
+    if before:
+        created_at, assessment_id = before
+        query = query.filter(or_(Assessment.created_at < created_at,
+                                 and_(Assessment.created_at == created_at, Assessment.id < assessment_id)))
+    assessments = (query.order_by(Assessment.created_at.desc(), Assessment.id.desc())
+                   .limit(page_size + 1).all())
+    next_cursor = None
+    if len(assessments) > page_size:
+        assessments = assessments[:page_size]
+        next_cursor = history_cursor(assessments[-1])
+    summary = trends.summary(profile_id)
+    recommendations = recommendations_for(a.id for a in assessments)
+    return render_template('dashboard/profile.html', profile=profile, assessments=assessments,
+                           recommendations=recommendations, total_assessments=summary['count'],
+                           summary=summary, next_cursor=next_cursor, paged=before is not None)
+
+@app.route('/profile/<int:profile_id>/trend')
+@login_required
+def profile_trend(profile_id):
+    """Stress trend in day/week/month buckets, read from the precomputed aggregates only."""
+    profile = Profile.query.get_or_404(profile_id)
+    if profile.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in trends.BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(trends.BUCKETS)}"}), 400
+    if assessment_writer is not None:
+        assessment_writer.flush()
+    return jsonify({'profile_id': profile_id, 'bucket': bucket,
+                    'summary': trends.summary(profile_id),
+                    'buckets': trends.trend(profile_id, bucket)})
+
+# Analytics Routes (counseling staff only)
+def analytics_allowed():
+    return current_user.email.lower() in app.config['ANALYTICS_ADMINS']
+
+def parse_date_arg(name):
+    value = request.args.get(name)
+    return datetime.fromisoformat(value) if value else None
+
+@app.route('/analytics/distribution')
+@login_required
+def analytics_distribution():
+    """Stress category distribution across all assessments, by age band and/or gender."""
+    if not analytics_allowed():
+        return jsonify({'error': 'Access denied'}), 403
+    try:
+        by = tuple(request.args.get('by', 'age_band,gender').split(','))
+        if not set(by) <= {'age_band', 'gender'}:
+            raise ValueError('by must be age_band and/or gender')
+        return jsonify(analytics.category_distribution(by, parse_date_arg('start'), parse_date_arg('end')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/analytics/mechanisms')
+@login_required
+def analytics_mechanisms():
+    """Most-recommended (or, with kind=current, most-used) mechanisms per day/week/month."""
+    if not analytics_allowed():
+        return jsonify({'error': 'Access denied'}), 403
+    try:
+        kind = request.args.get('kind', 'recommended')
+        if kind not in ('recommended', 'current'):
+            raise ValueError('kind must be recommended or current')
+        return jsonify(analytics.top_mechanisms(request.args.get('period', 'month'),
+                                                int(request.args.get('limit', 5)), kind,
+                                                parse_date_arg('start'), parse_date_arg('end')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def history_cursor(assessment):
+    return f"{assessment.created_at.isoformat()}_{assessment.id}"
+
+def parse_history_cursor(cursor):
+    """(created_at, id) from history_cursor(), or None if absent or malformed."""
+    if not cursor:
+        return None
+    created_at, _, assessment_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(assessment_id)
+    except ValueError:
+        return None
 
 @app.route('/profile/<int:profile_id>/assess')
 @login_required
@@ -153,149 +309,434 @@ def delete_profile(profile_id):
         flash('Access denied', 'danger')
         return redirect(url_for('dashboard'))
     
+    if assessment_writer is not None:
+        # queued assessments must land before the cascade, not after it
+        assessment_writer.flush()
     db.session.delete(profile)
     db.session.commit()
     flash('Profile deleted successfully', 'success')
     return redirect(url_for('dashboard'))
 
 # Assessment Routes
-@app.route('/predict', methods=['POST'])
-@login_required
-def predict():
+def classify(X, m=None):
+    """Class probabilities for encoded feature rows (imputer -> scaler -> forest)."""
+    m = m or current_models()
+    with metrics.stage('impute_scale'):
+        Z = m.transform(X)
+    with metrics.stage('forest'):
+        return m.predict_proba(Z)
+
+def score_rows(X, k=50, m=None):
+    """
+    (class probabilities, kNN neighbor indices, their mechanism table, model
+    version) per encoded row, one vectorized pass.
+    """
+    m = m or current_models()
+    with metrics.stage('impute_scale'):
+        Z = m.transform(X)
+    with metrics.stage('forest'):
+        probs = m.predict_proba(Z)
+    refs = m.references()
+    with metrics.stage('knn'):
+        # the kNN was fit on imputed, scaled rows; query it in the same space
+        _, idxs = refs.kneighbors(m.encoder.rec_features(Z), n_neighbors=k)
+    return [(p, i, refs.table, m.version) for p, i in zip(probs, idxs)]
+
+# MICRO_BATCH=1 funnels concurrent /predict rows through one scoring thread,
+# up to MICRO_BATCH_MAX_ROWS rows or MICRO_BATCH_MAX_WAIT_MS per pass
+micro_batcher = None
+if os.environ.get('MICRO_BATCH') == '1':
+    micro_batcher = MicroBatcher(score_rows,
+                                 max_batch=int(os.environ.get('MICRO_BATCH_MAX_ROWS', 32)),
+                                 max_wait_ms=float(os.environ.get('MICRO_BATCH_MAX_WAIT_MS', 2)))
+
+# ASSESSMENT_WRITE_BEHIND=1 answers /predict before its Assessment is stored;
+# rows are bulk-inserted in the background (see assessment_writer.py)
+assessment_writer = None
+if os.environ.get('ASSESSMENT_WRITE_BEHIND') == '1':
+    assessment_writer = AssessmentWriter(app, db, Assessment.from_fields, on_write=trends.record,
+                                         flush_rows=int(os.environ.get('WRITE_BEHIND_FLUSH_ROWS', 100)),
+                                         flush_interval=float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', 0.5)),
+                                         max_queue=int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', 10000)))
+
+metrics.gauge('stress_prediction_cache_hits', 'Prediction cache hits.', lambda: prediction_cache.hits)
+metrics.gauge('stress_prediction_cache_misses', 'Prediction cache misses.', lambda: prediction_cache.misses)
+metrics.gauge('stress_prediction_cache_size', 'Entries in the prediction cache.', prediction_cache.size)
+# a scrape must not be what loads the models; no sample until they are in
+metrics.gauge('stress_reference_generation', 'Reference set generation being served.',
+              lambda: current_models().references().generation if models_loader.ready else None)
+if micro_batcher is not None:
+    metrics.gauge('stress_micro_batch_queued', 'Rows waiting for the scoring thread.', micro_batcher.depth)
+if assessment_writer is not None:
+    metrics.gauge('stress_write_behind_queued', 'Assessments waiting to be written.', assessment_writer.depth)
+
+# /predict allows each user RATE_LIMIT_PER_MINUTE requests (bursts of
+# RATE_LIMIT_BURST; /predict/batch rows count one each), 0 to turn off; RATE_LIMIT_STORE=database shares the
+# buckets between workers. Identical requests from one user within
+# COALESCE_WINDOW_MS share one result (0 to turn off). See rate_limit.py.
+rate_limiter = RateLimiter(DatabaseBucketStore(db) if os.environ.get('RATE_LIMIT_STORE') == 'database'
+                           else MemoryBucketStore(),
+                           per_minute=float(os.environ.get('RATE_LIMIT_PER_MINUTE', 60)),
+                           burst=float(os.environ.get('RATE_LIMIT_BURST', 20)))
+predict_coalescer = None
+if float(os.environ.get('COALESCE_WINDOW_MS', 2000)) > 0:
+    predict_coalescer = Coalescer(window=float(os.environ.get('COALESCE_WINDOW_MS', 2000)) / 1000)
+metrics.counter('stress_rate_limited_total', '/predict and /predict/batch requests rejected by the rate limiter.',
+                lambda: rate_limiter.rejected)
+if predict_coalescer is not None:
+    metrics.counter('stress_coalesced_total', '/predict requests answered with a concurrent or just-finished '
+                    'identical request\'s result.', lambda: predict_coalescer.coalesced + predict_coalescer.replayed)
+
+def predict_one(X, m, k=50):
+    """score_rows() for one row encoded by ``m``, through the LRU cache."""
+    key = PredictionCache.key(X)
+    # entries live as long as the model version; probabilities depend on
+    # nothing else, so a growing reference set only redoes the neighbor search
+    refs = m.references()
+    cached = prediction_cache.get(key, m.version)
+    if cached is None:
+        if micro_batcher is not None and k == 50:
+            cached = micro_batcher(X)
+        if cached is None or cached[3] != m.version:
+            # no batcher, or it picked up a newer model mid-swap
+            cached = score_rows(X, k, m)[0]
+        prediction_cache.put(key, cached, m.version)
+    elif cached[2] is not refs.table:
+        # neighbors from an older reference snapshot (each publish brings a new table)
+        with metrics.stage('knn'):
+            _, idxs = refs.kneighbors(m.neighbor_features(X), n_neighbors=k)
+        cached = (cached[0], idxs[0], refs.table, m.version)
+        prediction_cache.put(key, cached, m.version)
+    return cached
+
+def drop_probability(pred_int, probs):
+    if pred_int == 2:
+        return float(probs[0] + probs[1])
+    elif pred_int == 1:
+        return float(probs[0])
+    return 0.0
+
+def parse_profile_id(value):
+    """A JSON profile_id as an int (numbers or digit strings); None if absent, ValueError if malformed."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and value.strip().isascii() and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError('Invalid profile_id')
+    return value
+
+def assessment_fields(profile_id, data, current_mechanisms, pred_label, probs, p_drop, recommendations):
+    return dict(
+        profile_id=profile_id,
+        age=data['age'],
+        gender=data['gender'],
+        gpa=data['gpa'],
+        study_hours=data['study_hours'],
+        social_media=data['social_media'],
+        sleep=data['sleep'],
+        exercise=data['exercise'],
+        family_support=data['family_support'],
+        financial_stress=data['financial_stress'],
+        peer_pressure=data['peer_pressure'],
+        relationship_stress=data['relationship_stress'],
+        counseling=data['counseling'],
+        diet_quality=data['diet_quality'],
+        cognitive_distortions=data['cognitive_distortions'],
+        family_mental_history=data['family_mental_history'],
+        medical_condition=data['medical_condition'],
+        substance_use=data['substance_use'],
+        current_mechanisms=current_mechanisms,
+        predicted_stress=pred_label,
+        prob_low=float(probs[0]),
+        prob_medium=float(probs[1]),
+        prob_high=float(probs[2]),
+        drop_probability=p_drop,
+        recommendations=recommendations
+    )
+
+def build_assessment(*args):
+    return Assessment.from_fields(assessment_fields(*args))
+
+def prediction_result(pred_label, probs, p_drop, recommendations, version):
+    return {
+        'model_version': version,
+        'prediction': pred_label,
+        'probabilities': {
+            'Low': float(probs[0]),
+            'Medium': float(probs[1]),
+            'High': float(probs[2])
+        },
+        'drop_probability': p_drop,
+        'recommendations': recommendations
+    }
+
+def run_prediction():
+    """Score the request's assessment and store it; (response body, status)."""
     try:
-        data = request.json
+        with metrics.stage('parse'):
+            data = request.json
         profile_id = data.get('profile_id')
+        m = current_models()
         
-        # Build input
-        input_dict = {
-            'Age': float(data['age']),
-            'Academic Performance (GPA)': float(data['gpa']),
-            'Study Hours Per Week': float(data['study_hours']),
-            'Social_Media_Usage_per_week': float(data['social_media']) * 7,
-            'Sleep Duration (Hours per night)': float(data['sleep']),
-            'Physical Exercise (Hours per week)': float(data['exercise']),
-            'Family Support': int(data['family_support']),
-            'Financial Stress': int(data['financial_stress']),
-            'Peer Pressure': int(data['peer_pressure']),
-            'Relationship Stress': int(data['relationship_stress']),
-            'Counseling Attendance': 1 if data['counseling'] == 'Yes' else 0,
-            'Diet Quality': int(data['diet_quality']),
-            'Cognitive Distortions': int(data['cognitive_distortions']),
-            'Family Mental Health History': 1 if data['family_mental_history'] == 'Yes' else 0,
-            'Medical Condition': 1 if data['medical_condition'] == 'Yes' else 0,
-            'Substance Use': int(data['substance_use']),
-            'Gender_Female': 1 if data['gender'] == 'Female' else 0,
-            'Gender_Male': 1 if data['gender'] == 'Male' else 0,
-            'Gender_Other': 1 if data['gender'] == 'Other' else 0
-        }
+        with metrics.stage('encode'):
+            X = m.encoder.encode(data)
+        probs, neighbor_idx, table, _ = predict_one(X, m)
+        pred_int = int(probs.argmax())
+        pred_label = m.inv_map[pred_int]
         
-        numerator = (input_dict['Financial Stress'] + input_dict['Peer Pressure'] + input_dict['Relationship Stress'])
-        denominator = (input_dict['Family Support'] + input_dict['Diet Quality'] + input_dict['Physical Exercise (Hours per week)'])
-        if denominator == 0:
-            denominator = 0.001
-        input_dict['Stress_Ratio'] = numerator / denominator
+        current_mechanisms = known_mechanisms(data.get('current_mechanisms', []))
+        with metrics.stage('mechanisms'):
+            recommendations = table.rank(neighbor_idx, current_mechanisms)
         
-        X_df = pd.DataFrame([input_dict])[feature_columns]
-        X_imp = imputer.transform(X_df.values)
-        X_scaled = scaler.transform(X_imp)
-        probs = rf_model.predict_proba(X_scaled)[0]
-        pred_int = int(probs.argmax())
-        pred_label = inv_map[pred_int]
+        p_drop = drop_probability(pred_int, probs)
+        
+        # Save assessment to database
+        if profile_id and assessment_writer is not None:
+            assessment_writer.submit(assessment_fields(profile_id, data, current_mechanisms,
+                                                       pred_label, probs, p_drop, recommendations))
+        elif profile_id:
+            with metrics.stage('db_commit'):
+                assessment = build_assessment(profile_id, data, current_mechanisms,
+                                              pred_label, probs, p_drop, recommendations)
+                db.session.add(assessment)
+                trends.record([assessment])
+                db.session.commit()
         
-        current_mechanisms = data.get('current_mechanisms', [])
-        recommendations = get_recommendations(input_dict, pred_int, probs, current_mechanisms)
+        return prediction_result(pred_label, probs, p_drop, recommendations, m.version), 200
         
-        if pred_int == 2:
-            p_drop = float(probs[0] + probs[1])
-        elif pred_int == 1:
-            p_drop = float(probs[0])
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e)}, 400
+
+def rate_limited(cost=1):
+    """The 429 response if the current user is over the assessment rate limit, else None."""
+    user_id = getattr(current_user, 'id', None)  # None with LOGIN_DISABLED
+    if user_id is None or not rate_limiter.enabled:
+        return None
+    allowed, retry_after = rate_limiter.take(user_id, cost)
+    if allowed:
+        return None
+    return (jsonify({'error': 'Too many assessments, please wait a moment', 'retry_after': round(retry_after, 2)}),
+            429, {'Retry-After': str(math.ceil(retry_after))})
+
+@app.route('/predict', methods=['POST'])
+@login_required
+def predict():
+    limited = rate_limited()
+    if limited is not None:
+        return limited
+    user_id = getattr(current_user, 'id', None)
+    if user_id is not None and predict_coalescer is not None:
+        # a double-submit or a retry of the same answers shares one model pass and one insert
+        body, status = predict_coalescer.run((user_id, request.get_data()), run_prediction,
+                                             share=lambda result: result[1] == 200)
+    else:
+        body, status = run_prediction()
+    with metrics.stage('serialize'):
+        return jsonify(body), status
+
+@app.route('/predict/batch', methods=['POST'])
+@login_required
+def predict_batch():
+    """Score a whole cohort with one imputer/scaler/forest pass and one kNN query.
+
+    Accepts either a JSON list of assessments or ``{"profile_id": ...,
+    "assessments": [...]}``; a row's own ``profile_id`` (an int or a digit
+    string) overrides the shared one. Rows that fail to parse, or name a
+    malformed or someone else's profile, are reported per index and do not
+    abort the rest of the batch.
+    """
+    try:
+        data = request.json
+        if isinstance(data, list):
+            rows, default_profile_id = data, None
         else:
-            p_drop = 0.0
+            rows, default_profile_id = data['assessments'], data.get('profile_id')
+        if len(rows) > app.config['PREDICT_BATCH_LIMIT']:
+            return jsonify({'error': f"batch exceeds {app.config['PREDICT_BATCH_LIMIT']} assessments"}), 413
+        # same per-user budget as /predict, one token per row
+        limited = rate_limited(cost=len(rows))
+        if limited is not None:
+            return limited
         
-        # Save assessment to database
-        if profile_id:
-            assessment = Assessment(
-                profile_id=profile_id,
-                age=data['age'],
-                gender=data['gender'],
-                gpa=data['gpa'],
-                study_hours=data['study_hours'],
-                social_media=data['social_media'],
-                sleep=data['sleep'],
-                exercise=data['exercise'],
-                family_support=data['family_support'],
-                financial_stress=data['financial_stress'],
-                peer_pressure=data['peer_pressure'],
-                relationship_stress=data['relationship_stress'],
-                counseling=data['counseling'],
-                diet_quality=data['diet_quality'],
-                cognitive_distortions=data['cognitive_distortions'],
-                family_mental_history=data['family_mental_history'],
-                medical_condition=data['medical_condition'],
-                substance_use=data['substance_use'],
-                current_mechanisms=json.dumps(current_mechanisms),
-                predicted_stress=pred_label,
-                prob_low=float(probs[0]),
-                prob_medium=float(probs[1]),
-                prob_high=float(probs[2]),
-                drop_probability=p_drop,
-                recommendations=json.dumps(recommendations)
-            )
-            db.session.add(assessment)
+        m = current_models()
+        results = [None] * len(rows)
+        X, valid, errors = m.encoder.encode_many(rows)
+        for i, e in errors.items():
+            results[i] = {'index': i, 'error': str(e)}
+        
+        # Profiles must belong to the caller; checked with one query for the batch
+        profile_ids, bad_profile_ids = {}, set()
+        for i in valid:
+            try:
+                profile_id = parse_profile_id(rows[i].get('profile_id', default_profile_id))
+            except ValueError:
+                bad_profile_ids.add(i)
+                continue
+            if profile_id is not None:
+                profile_ids[i] = profile_id
+        owned = set()
+        if profile_ids:
+            owned = {pid for (pid,) in db.session.query(Profile.id).filter(
+                Profile.id.in_(set(profile_ids.values())), Profile.user_id == current_user.id)}
+        
+        assessments = []
+        if valid:
+            all_probs = classify(X, m)
+            pred_ints = all_probs.argmax(axis=1)
+            
+            current = [known_mechanisms(rows[i].get('current_mechanisms', [])) for i in valid]
+            all_recs = get_recommendations_batch(m.neighbor_features(X), current, m=m)
+            
+            for j, i in enumerate(valid):
+                probs = all_probs[j]
+                pred_int = int(pred_ints[j])
+                pred_label = m.inv_map[pred_int]
+                p_drop = drop_probability(pred_int, probs)
+                result = prediction_result(pred_label, probs, p_drop, all_recs[j], m.version)
+                result['index'] = i
+                
+                profile_id = profile_ids.get(i)
+                if i in bad_profile_ids:
+                    result['error'] = 'Invalid profile_id'
+                elif profile_id is not None and profile_id not in owned:
+                    result['error'] = 'Access denied for profile'
+                elif profile_id is not None:
+                    assessments.append(build_assessment(profile_id, rows[i], current[j],
+                                                        pred_label, probs, p_drop, all_recs[j]))
+                results[i] = result
+        
+        # One bulk insert for the whole batch
+        if assessments:
+            if assessment_writer is not None:
+                # queued single assessments are older; trends fold in write order
+                assessment_writer.flush()
+            db.session.add_all(assessments)
+            trends.record(assessments)
             db.session.commit()
         
-        return jsonify({
-            'prediction': pred_label,
-            'probabilities': {
-                'Low': float(probs[0]),
-                'Medium': float(probs[1]),
-                'High': float(probs[2])
-            },
-            'drop_probability': p_drop,
-            'recommendations': recommendations
-        })
+        return jsonify({'results': results, 'saved': len(assessments), 'model_version': m.version})
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-def get_recommendations(input_dict, pred_int, probs, current_mechanisms, k=50, m=5):
-    X_rec = pd.DataFrame([input_dict])[rec_feature_columns].values.reshape(1, -1)
-    _, idxs = knn_model.kneighbors(X_rec, n_neighbors=k)
-    neighbors = train_recs.iloc[idxs[0]]
-    
-    stats = {}
-    for mechs, stress_level in zip(neighbors["Mechanisms"], neighbors["Stress Level Category"]):
-        success = 1 if stress_level == "Low" else 0
-        for mech in mechs:
-            mech = mech.strip()
-            if mech not in stats:
-                stats[mech] = {"used": 0, "success": 0}
-            stats[mech]["used"] += 1
-            stats[mech]["success"] += success
-    
-    mech_list = []
-    for mech, v in stats.items():
-        if v["used"] > 0:
-            mech_list.append({"mechanism": mech, "success_rate": v["success"] / v["used"]})
-    
-    current_set = set(m.strip() for m in current_mechanisms)
-    mech_list = [m for m in mech_list if m["mechanism"] not in current_set]
-    mech_list.sort(key=lambda x: x["success_rate"], reverse=True)
-    return mech_list[:m]
+def get_recommendations(X_rec, pred_int, probs, current_mechanisms, k=50, top=5, m=None):
+    refs = (m or current_models()).references()
+    _, idxs = refs.kneighbors(X_rec, n_neighbors=k)
+    return refs.table.rank(idxs[0], current_mechanisms, top)
+
+def get_recommendations_batch(X_rec, current_mechanisms, k=50, top=5, m=None):
+    """Recommendations for every row of ``X_rec`` (ModelSet.neighbor_features rows) from a single kneighbors call."""
+    refs = (m or current_models()).references()
+    with metrics.stage('knn'):
+        _, idxs = refs.kneighbors(X_rec, n_neighbors=k)
+    with metrics.stage('mechanisms'):
+        return refs.table.rank_batch(idxs, current_mechanisms, top)
 
 @app.route('/health')
 def health():
     return jsonify({'status': 'healthy'})
+
+@app.route('/health/memory')
+def health_memory():
+    """This worker's memory; model_files shows how much of the mapped models is shared."""
+    report = process_memory()
+    files = mapped_files(under=os.path.join(BASE_DIR, 'models'))
+    report['model_files'] = {
+        'count': len(files),
+        'rss_mb': sum(f['rss_mb'] for f in files.values()),
+        'pss_mb': sum(f['pss_mb'] for f in files.values()),
+    }
+    report['model_bundle'] = MODEL_BUNDLE
+    return jsonify(report)
+
+def models_pending():
+    """
+    Health and diagnostic endpoints never start the lazy model load (only
+    /health/ready does): until the models are in, they report this instead.
+    """
+    return None if models_loader.ready else {'models': models_loader.state}
+
+@app.route('/health/cache')
+def health_cache():
+    pending = models_pending()
+    if pending is not None:
+        return jsonify(dict(prediction_cache.stats(), model_version=None, **pending))
+    return jsonify(dict(prediction_cache.stats(), model_version=current_models().version))
+
+@app.route('/health/writes')
+def health_writes():
+    if assessment_writer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(assessment_writer.stats(), enabled=True))
+
+@app.route('/health/requests')
+def health_requests():
+    return jsonify(request_stats.stats())
+
+@app.route('/health/references')
+def health_references():
+    pending = models_pending()
+    if pending is not None:
+        return jsonify(dict(pending, enabled=os.environ.get('REFERENCE_STORE') == '1'))
+    m = current_models()
+    if m.reference_store is None:
+        return jsonify({'enabled': False, 'base_rows': len(m.mechanism_table.success)})
+    return jsonify(dict(m.reference_store.stats(), enabled=True))
+
+@app.route('/health/models')
+def health_models():
+    pending = models_pending()
+    if pending is not None:
+        return jsonify(dict(pending, registry=bool(MODEL_REGISTRY)))
+    if not MODEL_REGISTRY:
+        return jsonify({'registry': False, 'version': current_models().version})
+    return jsonify(dict(models_loader.get().stats(), registry=True))
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness probe: 200 once the models are loaded, 503 (and loading started) until then."""
+    if not models_loader.ready:
+        models_loader.warm_up()
+        return jsonify(dict(models_loader.stats(), mode=MODEL_LOADING)), 503
+    m = current_models()
+    return jsonify(dict(models_loader.stats(), mode=MODEL_LOADING, version=m.version,
+                        load_timings_ms=getattr(m, 'load_timings', {})))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target: stage/request histograms and cache, queue and model gauges."""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/health/profiles')
+def health_profiles():
+    if slow_profiler is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(slow_profiler.stats(), enabled=True))
+
+@app.route('/health/limits')
+def health_limits():
+    return jsonify({'rate_limit': rate_limiter.stats(),
+                    'coalescing': predict_coalescer.stats() if predict_coalescer is not None else {'enabled': False}})
+
+@app.route('/health/batching')
+def health_batching():
+    if micro_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(micro_batcher.stats(), enabled=True))
     
 @app.route('/init-db')
 def init_database():
     """Initialize database tables - remove this endpoint after first use"""
     try:
-        db.create_all()
+        added = upgrade()
         return jsonify({
             'status': 'success',
             'message': 'Database tables created successfully!',
-            'tables': ['stress_users', 'stress_profiles', 'stress_assessments']
+            'tables': ['stress_users', 'stress_profiles', 'stress_assessments'],
+            'added': added
         })
     except Exception as e:
         return jsonify({
@@ -305,5 +746,6 @@ def init_database():
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        # like init_db.py: new tables, missing indexes, trend backfill and legacy mechanism rows
+        upgrade()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,172 @@
+# assessment_writer.py
+"""
+Write-behind persistence for Assessment rows.
+
+/predict hands the row's column values to submit() and answers straight
+away. A background thread flushes queued rows in one transaction per batch
+(the ORM batches the INSERTs), as soon as flush_rows rows are waiting and otherwise every
+flush_interval seconds. On SQLite that turns one locked write
+transaction per request into one per batch; on Postgres one round trip
+and fsync per batch.
+
+The queue is bounded (max_queue). When it is full, submit() blocks for up
+to block_timeout seconds and then writes the row itself, synchronously, so
+a stalled database slows requests down instead of dropping assessments.
+stats() counts how often that happens.
+
+Pending rows are flushed by close(), which runs at interpreter exit and
+from gunicorn's worker_exit hook, and by flush(), which the history page
+calls so a user always sees the assessment they just submitted.
+
+A row whose batch fails (e.g. its profile was deleted in the meantime) is
+retried on its own; rows that still fail are logged and counted, not
+retried forever.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+
+class AssessmentWriter:
+    def __init__(self, app, db, build, flush_rows=100, flush_interval=0.5,
+                 max_queue=10_000, block_timeout=1.0, on_write=None):
+        """
+        build(fields) turns one submitted dict into the ORM object to add;
+        on_write(objects), if given, runs in the same transaction before commit.
+        """
+        self.app = app
+        self.db = db
+        self.build = build
+        self.on_write = on_write
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = float(flush_interval)
+        self.max_queue = int(max_queue)
+        self.block_timeout = float(block_timeout)
+        self._queue = queue.Queue(self.max_queue)
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._pid = None
+        self.submitted = self.written = self.flushes = self.failed = 0
+        self.blocked = self.sync_writes = self.high_water = 0
+        self.last_flush_ms = 0.0
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                # a forked child inherits the queue object but not the thread
+                self._queue = queue.Queue(self.max_queue)
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="assessment-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, fields):
+        """Queue one Assessment's column values; created_at is stamped now, not at flush."""
+        fields.setdefault("created_at", datetime.utcnow())
+        if self._closed:
+            self._write([fields])
+            return
+        self._ensure_thread()
+        self.submitted += 1
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.blocked += 1
+            try:
+                self._queue.put(fields, timeout=self.block_timeout)
+            except queue.Full:
+                self.sync_writes += 1
+                self._write([fields])
+                return
+        depth = self._queue.qsize()
+        self.high_water = max(self.high_water, depth)
+        if depth >= self.flush_rows:
+            self._wake.set()
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written."""
+        with self._flush_lock:
+            rows = self._drain()
+            if rows:
+                self._write(rows)
+            return len(rows)
+
+    def _write(self, rows):
+        if not self._insert(rows) and len(rows) > 1:
+            for row in rows:
+                self._insert([row])
+
+    def _insert(self, rows):
+        t0 = time.perf_counter()
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                objects = [self.build(row) for row in rows]
+                session.add_all(objects)
+                if self.on_write is not None:
+                    self.on_write(objects)
+                session.commit()
+            except Exception:
+                session.rollback()
+                if len(rows) == 1:
+                    self.failed += 1
+                    log.exception("Dropping assessment for profile %s", rows[0].get("profile_id"))
+                return False
+            finally:
+                session.remove()
+        self.written += len(rows)
+        self.flushes += 1
+        self.last_flush_ms = (time.perf_counter() - t0) * 1000
+        return True
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Assessment flush failed")
+
+    def close(self):
+        """Stop taking queued writes and flush what is pending."""
+        self._closed = True
+        self._wake.set()
+        return self.flush()
+
+    def depth(self):
+        """Assessments waiting to be written."""
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queued": self.depth(),
+            "max_queue": self.max_queue,
+            "high_water": self.high_water,
+            "submitted": self.submitted,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "sync_writes": self.sync_writes,
+            "last_flush_ms": self.last_flush_ms,
+        }
@@ -0,0 +1,117 @@
+# benchmarks/bench_analytics.py
+"""
+analytics.py on a throwaway SQLite database filled with --assessments
+synthetic rows (five recommended mechanisms each):
+
+- category distribution by age band and gender, and top mechanisms per
+  month, in SQL vs the same numbers from an ORM row-by-row loop,
+- export to every available columnar format: time, file size and peak
+  Python memory (tracemalloc) at two chunk sizes, to show memory tracks
+  the chunk rather than the table.
+
+    python benchmarks/bench_analytics.py --assessments 200000
+"""
+from common import print_row, time_call
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import analytics
+import app as app_module
+from models import Assessment, AssessmentMechanism, Profile, RECOMMENDED, User, db, mechanism_ids
+
+MECHANISMS = ["Yoga", "Meditation", "Reading", "Exercise", "Travelling", "Watching Sports",
+              "Spending Time Alone", "Talking to Friends", "Walking or Nature Walks"]
+
+
+def seed(n, seed=0, chunk=20_000):
+    rng = np.random.default_rng(seed)
+    db.drop_all()
+    db.create_all()
+    user = User(username="bench", email="bench@example.com", password_hash="-")
+    db.session.add(user)
+    db.session.commit()
+    profile = Profile(user_id=user.id, profile_name="bench")
+    db.session.add(profile)
+    db.session.commit()
+    ids = mechanism_ids(MECHANISMS)
+    start = datetime(2025, 1, 1)
+    for lo in range(0, n, chunk):
+        m = min(chunk, n - lo)
+        probs = rng.dirichlet([2, 2, 2], m)
+        rows = [dict(id=lo + i + 1, profile_id=profile.id, age=int(rng.integers(16, 33)),
+                     gender=str(rng.choice(["Female", "Male", "Other"])),
+                     predicted_stress=["Low", "Medium", "High"][int(probs[i].argmax())],
+                     prob_low=probs[i, 0], prob_medium=probs[i, 1], prob_high=probs[i, 2],
+                     drop_probability=float(probs[i, 0]),
+                     created_at=start + timedelta(minutes=int(rng.integers(0, 600 * 24 * 60))))
+                for i in range(m)]
+        db.session.execute(Assessment.__table__.insert(), rows)
+        mech = [dict(assessment_id=row["id"], kind=RECOMMENDED, position=p, mechanism_id=ids[name],
+                     success_rate=0.5)
+                for row in rows for p, name in enumerate(rng.choice(MECHANISMS, 5, replace=False))]
+        db.session.execute(AssessmentMechanism.__table__.insert(), mech)
+        db.session.commit()
+
+
+def orm_distribution():
+    counts = Counter()
+    for a in Assessment.query.all():
+        counts[(a.age, a.gender, a.predicted_stress)] += 1
+    return counts
+
+
+def orm_mechanisms():
+    counts = Counter()
+    for a in Assessment.query.all():
+        for m in a.mechanisms:
+            if m.kind == RECOMMENDED:
+                counts[(a.created_at.strftime("%Y-%m"), m.mechanism.name)] += 1
+    return counts
+
+
+def export_run(fmt, chunk_rows, path):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    _, rows = analytics.export(path, fmt, chunk_rows)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak, os.path.getsize(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assessments", type=int, default=200_000)
+    parser.add_argument("--orm-limit", type=int, default=50_000,
+                        help="skip the ORM comparison above this many rows")
+    args = parser.parse_args()
+
+    with app_module.app.app_context():
+        t0 = time.perf_counter()
+        seed(args.assessments)
+        print(f"seeded {args.assessments} assessments in {time.perf_counter() - t0:.1f}s")
+
+        print_row("  distribution, SQL", time_call(analytics.category_distribution, 3, 1) / 1000, "ms")
+        print_row("  top mechanisms/month, SQL", time_call(analytics.top_mechanisms, 3, 1) / 1000, "ms")
+        if args.assessments <= args.orm_limit:
+            print_row("  distribution, ORM loop", time_call(orm_distribution, 1, 0) / 1000, "ms")
+            print_row("  top mechanisms/month, ORM loop", time_call(orm_mechanisms, 1, 0) / 1000, "ms")
+
+        formats = ["npz"] + (["arrow"] if analytics.pa is not None else []) + \
+                  (["parquet"] if analytics.pq is not None else [])
+        out = tempfile.mkdtemp()
+        for fmt in formats:
+            for chunk_rows in (5_000, 50_000):
+                rows, elapsed, peak, size = export_run(fmt, chunk_rows, os.path.join(out, f"export.{fmt}"))
+                print(f"  export {fmt:<8} chunk {chunk_rows:>6}  {rows} rows  {elapsed:6.2f}s  "
+                      f"{size / 2**20:7.1f}MB file  peak {peak / 2**20:7.1f}MB")
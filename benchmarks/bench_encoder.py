@@ -0,0 +1,78 @@
+# benchmarks/bench_encoder.py
+"""
+Per-request latency of the single-assessment inference path, before
+(pandas DataFrame per model) and after (FeatureEncoder row), on the
+artifacts in models/.
+"""
+from common import SAMPLE_ASSESSMENT, print_row, time_call
+
+import numpy as np
+import pandas as pd
+
+import app
+
+model_set = app.current_models()
+
+
+def legacy_input_dict(data):
+    # the dict that /predict used to build before FeatureEncoder
+    d = {
+        'Age': float(data['age']),
+        'Academic Performance (GPA)': float(data['gpa']),
+        'Study Hours Per Week': float(data['study_hours']),
+        'Social_Media_Usage_per_week': float(data['social_media']) * 7,
+        'Sleep Duration (Hours per night)': float(data['sleep']),
+        'Physical Exercise (Hours per week)': float(data['exercise']),
+        'Family Support': int(data['family_support']),
+        'Financial Stress': int(data['financial_stress']),
+        'Peer Pressure': int(data['peer_pressure']),
+        'Relationship Stress': int(data['relationship_stress']),
+        'Counseling Attendance': 1 if data['counseling'] == 'Yes' else 0,
+        'Diet Quality': int(data['diet_quality']),
+        'Cognitive Distortions': int(data['cognitive_distortions']),
+        'Family Mental Health History': 1 if data['family_mental_history'] == 'Yes' else 0,
+        'Medical Condition': 1 if data['medical_condition'] == 'Yes' else 0,
+        'Substance Use': int(data['substance_use']),
+        'Gender_Female': 1 if data['gender'] == 'Female' else 0,
+        'Gender_Male': 1 if data['gender'] == 'Male' else 0,
+        'Gender_Other': 1 if data['gender'] == 'Other' else 0,
+    }
+    numerator = d['Financial Stress'] + d['Peer Pressure'] + d['Relationship Stress']
+    denominator = d['Family Support'] + d['Diet Quality'] + d['Physical Exercise (Hours per week)']
+    d['Stress_Ratio'] = numerator / (denominator or 0.001)
+    return d
+
+
+def legacy_encode(data):
+    d = legacy_input_dict(data)
+    X = pd.DataFrame([d])[model_set.feature_columns].values
+    X_rec = pd.DataFrame([d])[model_set.rec_feature_columns].values.reshape(1, -1)
+    return X, X_rec
+
+
+def encoder_encode(data):
+    X = model_set.encoder.encode(data)
+    return X, model_set.encoder.rec_features(X)
+
+
+def full_request(encode):
+    def run():
+        X, X_rec = encode(SAMPLE_ASSESSMENT)
+        probs = app.classify(X)[0]
+        # both encoders give the same columns; the kNN is queried in the scaled space
+        X_rec = model_set.encoder.rec_features(model_set.transform(X_rec))
+        app.get_recommendations(X_rec, int(probs.argmax()), probs, SAMPLE_ASSESSMENT["current_mechanisms"])
+    return run
+
+
+if __name__ == "__main__":
+    X_old, R_old = legacy_encode(SAMPLE_ASSESSMENT)
+    X_new, R_new = encoder_encode(SAMPLE_ASSESSMENT)
+    assert np.array_equal(X_old, X_new) and np.array_equal(R_old, R_new), "encoders disagree"
+
+    print("feature encoding only")
+    print_row("  pandas DataFrame x2", time_call(lambda: legacy_encode(SAMPLE_ASSESSMENT), repeat=2000))
+    print_row("  FeatureEncoder", time_call(lambda: encoder_encode(SAMPLE_ASSESSMENT), repeat=2000))
+    print("encode + impute/scale + forest + kNN + scoring")
+    print_row("  pandas DataFrame x2", time_call(full_request(legacy_encode)))
+    print_row("  FeatureEncoder", time_call(full_request(encoder_encode)))
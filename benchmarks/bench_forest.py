@@ -0,0 +1,52 @@
+# benchmarks/bench_forest.py
+"""
+RandomForestClassifier.predict_proba vs the lockstep FlatForest evaluator
+across batch sizes, on models/rf_model.joblib.
+
+    python benchmarks/bench_forest.py --sizes 1 32 1000 100000
+"""
+from common import ROOT, print_row, time_call
+
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from forest import FlatForest
+
+
+def scaled_rows(n, seed=0):
+    # realistic inputs: train_recs rows, jittered, through the real imputer/scaler
+    with open(os.path.join(ROOT, "models", "feature_columns.json")) as f:
+        columns = json.load(f)
+    recs = pd.read_csv(os.path.join(ROOT, "data", "train_recs.csv"))
+    rng = np.random.default_rng(seed)
+    X = recs[columns].values.astype(float)[rng.integers(0, len(recs), n)]
+    X += rng.normal(0, 0.5, X.shape)
+    imputer = joblib.load(os.path.join(ROOT, "models", "imputer.joblib"))
+    scaler = joblib.load(os.path.join(ROOT, "models", "scaler.joblib"))
+    return scaler.transform(imputer.transform(X))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 32, 1000, 100_000])
+    args = parser.parse_args()
+
+    rf = joblib.load(os.path.join(ROOT, "models", "rf_model.joblib"))
+    flat = FlatForest.from_sklearn(rf)
+    print(f"{flat.n_trees} trees, {len(flat.feature)} nodes, max depth {flat.max_depth}")
+
+    for n in args.sizes:
+        X = scaled_rows(n)
+        err = np.abs(rf.predict_proba(X) - flat.predict_proba(X)).max()
+        repeat = max(3, min(200, 20_000 // n))
+        print(f"batch {n} rows (max |diff| {err:.1e})")
+        sk = time_call(lambda: rf.predict_proba(X), repeat=repeat, warmup=2)
+        ff = time_call(lambda: flat.predict_proba(X), repeat=repeat, warmup=2)
+        print_row("  sklearn predict_proba", sk)
+        print_row("  FlatForest lockstep", ff)
+        print(f"  {'rows/s':<32} sklearn {n / np.median(sk) * 1e6:>12.0f}  flat {n / np.median(ff) * 1e6:>12.0f}")
@@ -0,0 +1,79 @@
+# benchmarks/bench_mechanisms.py
+"""
+Mechanism scoring for k=50 neighbors: the per-request pandas/dict loop the
+app used before vs MechanismTable.rank / rank_batch, and the train_recs
+DataFrame the app used to hold vs compact_recs.CompactRecs: memory, the
+per-neighbor lookups (mechanism lists, categories) and building the
+MechanismTable from each.
+"""
+from common import ROOT, SAMPLE_ASSESSMENT, print_row, time_call
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import app
+from compact_recs import CompactRecs
+from mechanisms import MechanismTable
+
+model_set = app.current_models()
+train_recs = pd.read_csv(os.path.join(ROOT, "data", "train_recs.csv"))
+train_recs["Mechanisms"] = train_recs["Stress Coping Mechanisms"].str.split(",")
+compact = CompactRecs.read_csv(os.path.join(ROOT, "data", "train_recs.csv"), model_set.rec_feature_columns)
+
+
+def legacy_rank(neighbor_idx, current_mechanisms, m=5):
+    neighbors = train_recs.iloc[neighbor_idx]
+    stats = {}
+    for mechs, stress_level in zip(neighbors["Mechanisms"], neighbors["Stress Level Category"]):
+        success = 1 if stress_level == "Low" else 0
+        for mech in mechs:
+            mech = mech.strip()
+            if mech not in stats:
+                stats[mech] = {"used": 0, "success": 0}
+            stats[mech]["used"] += 1
+            stats[mech]["success"] += success
+    mech_list = [{"mechanism": k, "success_rate": v["success"] / v["used"]} for k, v in stats.items()]
+    current_set = set(c.strip() for c in current_mechanisms)
+    mech_list = [x for x in mech_list if x["mechanism"] not in current_set]
+    mech_list.sort(key=lambda x: x["success_rate"], reverse=True)
+    return mech_list[:m]
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    n_ref = len(model_set.knn_reference)
+    idx = np.argsort(rng.random((1000, n_ref)), axis=1)[:, :50]
+    current = [SAMPLE_ASSESSMENT["current_mechanisms"]] * len(idx)
+
+    mismatches = sum(legacy_rank(i, c) != model_set.mechanism_table.rank(i, c) for i, c in zip(idx, current))
+    print(f"top-5 mismatches vs legacy scoring over {len(idx)} neighbor sets: {mismatches}")
+
+    print("one request (k=50)")
+    print_row("  pandas iloc + dict loop", time_call(lambda: legacy_rank(idx[0], current[0])))
+    print_row("  MechanismTable.rank", time_call(lambda: model_set.mechanism_table.rank(idx[0], current[0])))
+
+    for name, fn in [("pandas iloc + dict loop", lambda: [legacy_rank(i, c) for i, c in zip(idx, current)]),
+                     ("MechanismTable.rank_batch", lambda: model_set.mechanism_table.rank_batch(idx, current))]:
+        t0 = time.perf_counter()
+        fn()
+        print(f"  {len(idx)} rows, {name:<26} {len(idx) / (time.perf_counter() - t0):>10.0f} rows/s")
+
+    print("train_recs in memory")
+    print(f"  DataFrame (deep)           {train_recs.memory_usage(deep=True).sum() / 1024:>8.0f}KB")
+    print(f"  CompactRecs                {compact.nbytes / 1024:>8.0f}KB")
+    print_row("  neighbor mechanisms, iloc", time_call(lambda: train_recs["Mechanisms"].iloc[idx[0]].tolist()))
+    print_row("  neighbor mechanisms, CSR", time_call(lambda: compact.mechanisms_of(idx[0])))
+    print_row("  neighbor categories, iloc",
+              time_call(lambda: train_recs["Stress Level Category"].iloc[idx[0]].tolist()))
+    print_row("  neighbor categories, codes", time_call(lambda: compact.labels(idx[0])))
+    print_row("  MechanismTable from DataFrame",
+              time_call(lambda: MechanismTable.from_train_recs(train_recs), 20, 2) / 1000, "ms")
+    print_row("  MechanismTable from CSR", time_call(compact.mechanism_table, 20, 2) / 1000, "ms")
+    same = compact.mechanism_table()
+    legacy = MechanismTable.from_train_recs(train_recs)
+    identical = same.names == legacy.names and all(
+        np.array_equal(getattr(same, a), getattr(legacy, a)) for a in ("counts", "first", "success"))
+    print(f"  tables identical: {identical}")
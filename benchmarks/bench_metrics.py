@@ -0,0 +1,100 @@
+# benchmarks/bench_metrics.py
+"""
+Overhead of metrics.py stage timers and the slow_profiler.py sampler on
+/predict. Each configuration runs in its own process (the hooks are wired
+up at import time from the environment), sends --requests sequential
+/predict calls with different answers (prediction cache off, login
+bypassed, no profile_id so no DB write), and reports latency; the
+difference between rows is the instrumentation cost. It also times one
+bare stage() enter/exit, enabled and disabled.
+
+    python benchmarks/bench_metrics.py --requests 3000
+"""
+from common import ROOT, SAMPLE_ASSESSMENT, print_row, summarize, time_call
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+CONFIGS = [
+    ("instrumentation off", {"STAGE_METRICS": "0"}),
+    ("stage metrics", {"STAGE_METRICS": "1"}),
+    # threshold never reached: every request is sampled, nothing is dumped
+    ("stage metrics + profiler 5ms", {"STAGE_METRICS": "1", "PROFILE_SLOW_MS": "1e9",
+                                      "PROFILE_INTERVAL_MS": "5"}),
+]
+
+
+def payloads(n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        p = dict(SAMPLE_ASSESSMENT)
+        p["age"] = int(rng.integers(18, 30))
+        p["gpa"] = round(float(rng.uniform(2.0, 4.0)), 2)
+        p["study_hours"] = int(rng.integers(5, 50))
+        p["sleep"] = round(float(rng.uniform(4, 10)), 1)
+        out.append(p)
+    return out
+
+
+def child(n):
+    """Run inside one configured process; prints per-request latencies (ms) as JSON."""
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    os.environ.pop("MICRO_BATCH", None)
+    import app as app_module
+
+    app_module.app.config["LOGIN_DISABLED"] = True
+    client = app_module.app.test_client()
+    bodies = payloads(n)
+    for body in bodies[:200]:
+        client.post("/predict", json=body)
+    latencies = []
+    for body in bodies:
+        t0 = time.perf_counter()
+        r = client.post("/predict", json=body)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        assert r.status_code == 200, r.get_json()
+    print(json.dumps({"latencies": latencies, "stages": app_module.metrics.summary()}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests)
+        sys.exit()
+
+    from metrics import Metrics
+
+    on, off = Metrics(enabled=True), Metrics(enabled=False)
+
+    def timed(m):
+        with m.stage("bench"):
+            pass
+
+    print_row("stage() enter/exit, enabled", time_call(lambda: timed(on), 100_000, 1000))
+    print_row("stage() enter/exit, disabled", time_call(lambda: timed(off), 100_000, 1000))
+
+    baseline = None
+    for name, env in CONFIGS:
+        out = subprocess.run([sys.executable, __file__, "--child", "--requests", str(args.requests)],
+                             env=dict(os.environ, **env), cwd=ROOT, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        lat = np.array(result["latencies"])
+        print_row(f"/predict, {name}", lat, "ms")
+        mean = summarize(lat)["mean"]
+        if baseline is None:
+            baseline = mean
+        else:
+            print(f"  overhead vs off: {mean - baseline:+.3f}ms ({(mean - baseline) / baseline:+.1%})")
+        if result["stages"]:
+            for stage, s in sorted(result["stages"].items(), key=lambda kv: -kv[1]["mean_ms"]):
+                print(f"    {stage:<14} mean {s['mean_ms']:8.3f}ms  p99 <= {s['p99_ms']:8.3f}ms")
@@ -0,0 +1,87 @@
+# benchmarks/bench_microbatch.py
+"""
+Load test of /predict with and without the MICRO_BATCH scheduler: N client
+threads in a closed loop against one app process (as one gthread gunicorn
+worker would see them), reporting p50/p99 latency and throughput.
+
+The prediction cache is off and every request carries different answers,
+so each one really reaches the models. Login is bypassed and no
+profile_id is sent, so nothing touches the database.
+
+    python benchmarks/bench_microbatch.py --clients 1 8 32 --requests 2000
+"""
+from common import SAMPLE_ASSESSMENT, summarize
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+os.environ.pop("MICRO_BATCH", None)
+
+import app as app_module
+from micro_batch import MicroBatcher
+
+
+def payloads(n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        p = dict(SAMPLE_ASSESSMENT)
+        p["age"] = int(rng.integers(18, 30))
+        p["gpa"] = round(float(rng.uniform(2.0, 4.0)), 2)
+        p["study_hours"] = int(rng.integers(5, 50))
+        p["sleep"] = round(float(rng.uniform(4, 10)), 1)
+        p["financial_stress"] = int(rng.integers(1, 6))
+        out.append(p)
+    return out
+
+
+def load_test(clients, bodies):
+    """Closed loop: each client sends its share of bodies back to back."""
+    latencies = np.empty(len(bodies))
+    shares = np.array_split(np.arange(len(bodies)), clients)
+
+    def client(idx):
+        c = app_module.app.test_client()
+        for i in idx:
+            t0 = time.perf_counter()
+            r = c.post("/predict", json=bodies[i])
+            latencies[i] = time.perf_counter() - t0
+            assert r.status_code == 200, r.get_json()
+
+    threads = [threading.Thread(target=client, args=(s,)) for s in shares]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies * 1000, len(bodies) / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[1, 5])
+    args = parser.parse_args()
+
+    app_module.app.config["LOGIN_DISABLED"] = True
+    bodies = payloads(args.requests)
+    configs = [("direct", None)] + [
+        (f"batch {b:>3} rows / {w:g}ms", (b, w)) for b in args.max_batch for w in args.max_wait_ms]
+
+    load_test(4, bodies[:100])  # warm up
+    for clients in args.clients:
+        print(f"{clients} concurrent clients, {args.requests} requests")
+        for name, config in configs:
+            app_module.micro_batcher = config and MicroBatcher(app_module.score_rows, *config)
+            lat, rps = load_test(clients, bodies)
+            s = summarize(lat)
+            mean_batch = app_module.micro_batcher.stats()["mean_batch"] if config else 1.0
+            print(f"  {name:<24} p50 {s['p50']:>7.2f}ms  p99 {s['p99']:>7.2f}ms  "
+                  f"{rps:>7.0f} req/s  mean batch {mean_batch:>5.1f}")
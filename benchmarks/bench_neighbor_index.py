@@ -0,0 +1,72 @@
+# benchmarks/bench_neighbor_index.py
+"""
+Recall@k and latency of each neighbor_index backend against the exact
+result, on the shipped kNN reference set and on a synthetic reference set
+grown to --reference-size rows (jittered copies of the shipped one).
+
+    python benchmarks/bench_neighbor_index.py --reference-size 200000
+"""
+from common import ROOT
+
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+from neighbor_index import BACKENDS, ExactIndex, build_index, evaluate, load_reference
+
+
+def queries_from_train_recs(columns, n, seed=0):
+    # the app queries with encoded form rows, which look like train_recs rows
+    recs = pd.read_csv(os.path.join(ROOT, "data", "train_recs.csv"))
+    rng = np.random.default_rng(seed)
+    X = recs[columns].values.astype(float)[rng.integers(0, len(recs), n)]
+    return X + rng.normal(0, 0.25, X.shape)
+
+
+def queries_near_reference(reference, n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = reference[rng.integers(0, len(reference), n)]
+    return X + rng.normal(0, 0.3, X.shape)
+
+
+def report(knn_model, reference, query_sets, k):
+    exact = ExactIndex(reference)
+    indexes = [build_index(kind, knn_model, reference) for kind in BACKENDS]
+    for label, queries in query_sets:
+        print(f"reference rows: {len(reference)}, {len(queries)} {label}, k={k}")
+        for index in indexes:
+            r = evaluate(index, exact, queries, k)
+            print(f"  {r['backend']:<8} recall@{k} {r['recall_at_k']:.3f}  p50 {r['p50_us']:>9.1f}us  "
+                  f"p99 {r['p99_us']:>9.1f}us  batch {r['batch_qps']:>9.0f} q/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=50)
+    parser.add_argument("--reference-size", type=int, default=200_000)
+    args = parser.parse_args()
+
+    knn = joblib.load(os.path.join(ROOT, "models", "knn_model.joblib"))
+    reference = load_reference(os.path.join(ROOT, "models"))
+    with open(os.path.join(ROOT, "models", "rec_feature_columns.json")) as f:
+        columns = json.load(f)
+    # /predict sends encoded form rows as-is, while the reference matrix was
+    # fit on scaled features, so app queries sit far outside the reference
+    # cloud; approximate backends are also measured on queries near it
+    query_sets = [
+        ("app-style queries", queries_from_train_recs(columns, args.queries)),
+        ("queries near the reference set", queries_near_reference(reference, args.queries)),
+    ]
+    report(knn, reference, query_sets, args.k)
+
+    if args.reference_size > len(reference):
+        rng = np.random.default_rng(1)
+        big = reference[rng.integers(0, len(reference), args.reference_size)]
+        big = big + rng.normal(0, 0.1, big.shape)
+        report(NearestNeighbors(n_neighbors=args.k).fit(big), big, query_sets, args.k)
@@ -0,0 +1,65 @@
+# benchmarks/bench_parallel.py
+"""
+Throughput of parallel_scoring for 1..N worker processes on
+data/train_recs.csv: classification over the file repeated --repeat times,
+recommendation over the file itself (scored against itself as train set).
+
+The scripts load artifacts from their working directory, so this builds a
+temporary one from --artifacts (models/ by default) plus a
+predictions.csv for train_recs.
+
+    python benchmarks/bench_parallel.py --max-workers 8
+"""
+from common import ROOT
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+ARTIFACTS = ["scaler.joblib", "imputer.joblib", "rf_model.joblib", "knn_model.joblib", "knn_reference.npy",
+             "label_map.json", "feature_columns.json", "rec_feature_columns.json"]
+
+
+def make_workdir(artifacts, repeat):
+    work = tempfile.mkdtemp()
+    for name in ARTIFACTS:
+        os.symlink(os.path.abspath(os.path.join(artifacts, name)), os.path.join(work, name))
+    recs = pd.read_csv(os.path.join(ROOT, "data", "train_recs.csv"))
+    recs.to_csv(os.path.join(work, "train_recs.csv"), index=False)
+    recs.to_csv(os.path.join(work, "test_recs.csv"), index=False)
+    pd.concat([recs] * repeat).to_csv(os.path.join(work, "classify_input.csv"), index=False)
+
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        import predict_classification
+        preds = predict_classification.load_and_classify("train_recs.csv")
+    finally:
+        os.chdir(cwd)
+    preds.insert(0, "Student_id", recs["Student_id"])
+    preds.to_csv(os.path.join(work, "predictions.csv"), index=False)
+    return work, len(recs) * repeat, len(recs)
+
+
+if __name__ == "__main__":
+    from parallel_scoring import run_parallel
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=25, help="copies of train_recs to classify")
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "models"))
+    args = parser.parse_args()
+
+    work, n_classify, n_recommend = make_workdir(args.artifacts, args.repeat)
+    print(f"cores: {os.cpu_count()}; classify {n_classify} rows, recommend {n_recommend} rows")
+    for task, csv, n in [("classify", "classify_input.csv", n_classify), ("recommend", "test_recs.csv", n_recommend)]:
+        base = None
+        for workers in range(1, args.max_workers + 1):
+            t0 = time.perf_counter()
+            run_parallel(task, os.path.join(work, csv), workers=workers, workdir=work)
+            rate = n / (time.perf_counter() - t0)
+            base = base or rate
+            print(f"  {task:<10} workers {workers:>2}  {rate:>10.0f} rows/s  x{rate / base:.2f}")
@@ -0,0 +1,105 @@
+# benchmarks/bench_profile_page.py
+"""
+Profile-page cost of reading recommendations from JSON strings (parsed by
+a from_json template filter on every render, as the page used to) vs from
+stress_assessment_mechanisms rows, for one profile with --assessments
+stored assessments, on a throwaway SQLite database.
+
+Both variants query all of the profile's assessments and render the
+recommendation list of each card; the legacy rows are then converted with
+db_migrate.migrate_mechanism_blobs() and the structured variant is timed.
+Finally the real /profile page (keyset-paginated) is timed end to end.
+
+    python benchmarks/bench_profile_page.py --assessments 500
+"""
+from common import SAMPLE_ASSESSMENT, print_row, time_call
+
+import argparse
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+from flask import render_template_string
+
+import app as app_module
+from db_migrate import migrate_mechanism_blobs
+from models import Assessment, Profile, User, db, recommendations_for
+
+MECHANISMS = ["Yoga", "Meditation", "Reading", "Exercise", "Travelling", "Watching Sports",
+              "Spending Time Alone", "Talking to Friends", "Walking or Nature Walks"]
+
+LEGACY = """{% for a in assessments %}{% if a.recommendations %}
+{% for rec in a.recommendations|safe|from_json %}<div class="rec-item">{{ rec.mechanism }} ({{ (rec.success_rate * 100)|round(0) }}%)</div>{% endfor %}
+{% endif %}{% endfor %}"""
+
+STRUCTURED = """{% for a in assessments %}{% set recs = recommendations.get(a.id) %}{% if recs %}
+{% for rec in recs %}<div class="rec-item">{{ rec.mechanism }} ({{ (rec.success_rate * 100)|round(0) }}%)</div>{% endfor %}
+{% endif %}{% endfor %}"""
+
+
+def seed(n, seed=0):
+    rng = np.random.default_rng(seed)
+    with app_module.app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username="bench", email="bench@example.com")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.commit()
+        profile = Profile(user_id=user.id, profile_name="bench", age=22, gender="Female")
+        db.session.add(profile)
+        db.session.commit()
+        rows = []
+        for i in range(n):
+            recs = [{"mechanism": m, "success_rate": float(rng.uniform())}
+                    for m in rng.choice(MECHANISMS, 5, replace=False)]
+            rows.append(dict(profile_id=profile.id, predicted_stress="Medium", prob_low=0.3,
+                             prob_medium=0.4, prob_high=0.3, drop_probability=0.3,
+                             gpa=SAMPLE_ASSESSMENT["gpa"], sleep=SAMPLE_ASSESSMENT["sleep"],
+                             current_mechanisms=json.dumps(SAMPLE_ASSESSMENT["current_mechanisms"]),
+                             recommendations=json.dumps(recs),
+                             created_at=datetime(2026, 1, 1) + timedelta(hours=i)))
+        db.session.execute(Assessment.__table__.insert(), rows)
+        db.session.commit()
+        return profile.id
+
+
+def render(profile_id, template, structured=False):
+    with app_module.app.test_request_context():
+        assessments = (Assessment.query.filter_by(profile_id=profile_id)
+                       .order_by(Assessment.created_at.desc()).all())
+        recommendations = recommendations_for(a.id for a in assessments) if structured else None
+        return render_template_string(template, assessments=assessments, recommendations=recommendations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--assessments", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    app = app_module.app
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.jinja_env.filters["from_json"] = json.loads  # what the page used to register
+    profile_id = seed(args.assessments)
+    print(f"{args.assessments} assessments on one profile")
+
+    legacy = render(profile_id, LEGACY)
+    print_row("  all cards, JSON strings", time_call(lambda: render(profile_id, LEGACY), args.repeat, 2), "us")
+
+    with app.app_context():
+        moved = migrate_mechanism_blobs()
+    structured = render(profile_id, STRUCTURED, True)
+    print_row("  all cards, mechanism rows", time_call(lambda: render(profile_id, STRUCTURED, True), args.repeat, 2), "us")
+    print(f"  migrated {moved} assessments; identical markup: {legacy == structured}")
+
+    client = app.test_client()
+    client.post("/login", data={"email": "bench@example.com", "password": "bench"})
+    page = lambda: client.get(f"/profile/{profile_id}")
+    print(f"  /profile page ({page().headers['Server-Timing']})")
+    print_row(f"  /profile page of {app.config['HISTORY_PAGE_SIZE']}", time_call(page, args.repeat, 2), "us")
@@ -0,0 +1,63 @@
+# benchmarks/bench_recommend.py
+"""
+Rows per second of predict_recommendation.recommend against the per-row
+loop it replaced (one kneighbors call, one small DataFrame and one
+sort_values per row), on data/train_recs.csv scored against itself. The
+legacy loop only runs over the first --legacy-rows rows. That the two agree
+exactly is checked by test_recommend.py.
+
+    python benchmarks/bench_recommend.py
+"""
+from common import ROOT
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from bench_parallel import make_workdir
+
+
+def legacy_recommend(df, train, knn, feature_cols, m=5, k=50):
+    def _rec(row):
+        x = row[feature_cols].values.reshape(1, -1)
+        _, idxs = knn.kneighbors(x, n_neighbors=k)
+        neigh = train.iloc[idxs[0]]
+        stats = {}
+        for mechs, succ in zip(neigh["Mechanisms"], neigh["Success"]):
+            for mech in mechs:
+                stats.setdefault(mech, {"used": 0, "succ": 0})
+                stats[mech]["used"] += 1
+                stats[mech]["succ"] += succ
+        mech_df = pd.DataFrame([{"Mechanism": m, "SuccessRate": v["succ"] / v["used"]}
+                                for m, v in stats.items()])
+        mech_df = mech_df[~mech_df["Mechanism"].isin(set(row["Mechanisms"]))]
+        return ",".join(mech_df.sort_values("SuccessRate", ascending=False).head(m)["Mechanism"])
+
+    return df.apply(_rec, axis=1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--legacy-rows", type=int, default=500)
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "models"))
+    args = parser.parse_args()
+
+    work, _, n = make_workdir(args.artifacts, repeat=1)
+    os.chdir(work)
+    import predict_recommendation as pr
+
+    t0 = time.perf_counter()
+    out = pr.recommend("test_recs.csv")
+    fast = n / (time.perf_counter() - t0)
+
+    preds = pr._load_predictions()
+    train, test = pr._load_train(preds), pr._load_test("test_recs.csv", preds).head(args.legacy_rows)
+    t0 = time.perf_counter()
+    legacy_recommend(test, train, pr.KNN, pr.FEATURE_COLS)
+    slow = len(test) / (time.perf_counter() - t0)
+
+    print(f"recommend {n} rows")
+    print(f"  per-row loop   {slow:>10.0f} rows/s  (first {len(test)} rows)")
+    print(f"  vectorized     {fast:>10.0f} rows/s  x{fast / slow:.0f}  (whole file, incl. CSV reads)")
@@ -0,0 +1,91 @@
+# benchmarks/bench_reference_store.py
+"""
+reference_store.py on a throwaway SQLite database: single-query and
+64-row kNN latency over the base index plus a delta segment of 0 ..
+--max-delta stored assessments, the cost of syncing them in, and the
+compaction that folds the delta into a rebuilt index, per backend.
+
+    python benchmarks/bench_reference_store.py --max-delta 20000
+"""
+from common import SAMPLE_ASSESSMENT, print_row, time_call
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import app as app_module
+from models import Assessment, AssessmentMechanism, CURRENT, Profile, User, db, mechanism_ids
+from neighbor_index import build_index
+from reference_store import ReferenceStore
+
+MECHANISMS = ["Yoga", "Meditation", "Reading", "Exercise", "Travelling", "Watching Sports"]
+
+
+def seed(n, start_id, profile_id, ids, rng):
+    rows = []
+    for i in range(n):
+        row = {k: v for k, v in SAMPLE_ASSESSMENT.items() if k != "current_mechanisms"}
+        row.update(id=start_id + i, profile_id=profile_id, age=int(rng.integers(18, 30)),
+                   gpa=float(rng.uniform(2, 4)), sleep=float(rng.uniform(4, 9)),
+                   study_hours=float(rng.uniform(5, 40)),
+                   predicted_stress=str(rng.choice(["Low", "Medium", "High"])))
+        rows.append(row)
+    db.session.execute(Assessment.__table__.insert(), rows)
+    mech = [dict(assessment_id=row["id"], kind=CURRENT, position=p, mechanism_id=ids[name])
+            for row in rows for p, name in enumerate(rng.choice(MECHANISMS, 2, replace=False))]
+    db.session.execute(AssessmentMechanism.__table__.insert(), mech)
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-delta", type=int, default=20_000)
+    args = parser.parse_args()
+
+    app = app_module.app
+    model_set = app_module.current_models()
+    reference = model_set.knn_reference
+    rng = np.random.default_rng(0)
+    queries = reference[rng.integers(0, len(reference), 64)] + rng.normal(0, 0.3, (64, reference.shape[1]))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username="bench", email="bench@example.com", password_hash="-")
+        db.session.add(user)
+        db.session.commit()
+        profile = Profile(user_id=user.id, profile_name="bench")
+        db.session.add(profile)
+        db.session.commit()
+        profile_id, ids = profile.id, mechanism_ids(MECHANISMS)
+
+    for kind in ("sklearn", "exact", "ivf"):
+        print(kind)
+        store = ReferenceStore(app, db, model_set.encoder, model_set.transform, build_index(kind, reference=reference),
+                               reference, model_set.mechanism_table, compact_rows=10**9)
+        stored = 0
+        for delta in (0, 1_000, 5_000, args.max_delta):
+            if delta > stored:
+                with app.app_context():
+                    seed(delta - stored, stored + 1, profile_id, ids, rng)
+                t0 = time.perf_counter()
+                store.sync()
+                print(f"  sync of {delta - stored} rows: {(time.perf_counter() - t0) * 1000:.0f}ms")
+                stored = delta
+            snap = store._snapshot
+            print_row(f"  delta {delta:>6}, 1 query", time_call(lambda: snap.kneighbors(queries[:1]), 200, 10))
+            print_row(f"  delta {delta:>6}, 64 queries", time_call(lambda: snap.kneighbors(queries), 50, 3))
+        store.compact_rows = 1
+        store.sync()
+        snap = store._snapshot
+        print(f"  compaction into {snap.n_indexed} indexed rows: {store.last_compact_ms:.0f}ms")
+        print_row("  compacted, 1 query", time_call(lambda: snap.kneighbors(queries[:1]), 200, 10))
+        print_row("  compacted, 64 queries", time_call(lambda: snap.kneighbors(queries), 50, 3))
+        with app.app_context():
+            AssessmentMechanism.query.delete()
+            Assessment.query.delete()
+            db.session.commit()
@@ -0,0 +1,84 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of `import app` in a fresh interpreter, and of loading the
+models it now defers to first use (MODEL_LOADING=lazy): joblib pickles +
+pandas train_recs (default) vs the memory-mapped bundle (MODEL_BUNDLE).
+Per-artifact load times come from the ModelSet's load_timings, and
+`-X importtime` gives the import cost of each module app.py imports.
+
+Build the bundle first with `python model_bundle.py`.
+
+    python benchmarks/bench_startup.py [runs]
+"""
+from common import ROOT
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+CHILD = r"""
+import json, time, warnings
+warnings.filterwarnings("ignore")
+t0 = time.perf_counter()
+import app
+elapsed = time.perf_counter() - t0
+t0 = time.perf_counter()
+models = app.current_models()
+load_s = time.perf_counter() - t0
+mem = {}
+with open("/proc/self/smaps_rollup") as f:
+    for line in f:
+        key, _, rest = line.partition(":")
+        if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+            mem[key] = int(rest.split()[0]) / 1024
+print(json.dumps({"import_s": elapsed, "load_s": load_s, "rss_mb": mem["Rss"], "pss_mb": mem["Pss"],
+                  "private_mb": mem["Private_Clean"] + mem["Private_Dirty"],
+                  "artifacts": models.load_timings}))
+"""
+
+
+def measure(env_extra, runs):
+    env = dict(os.environ, MODEL_LOADING="lazy", **env_extra)
+    out = []
+    for _ in range(runs):
+        res = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        out.append(json.loads(res.stdout.strip().splitlines()[-1]))
+    result = {k: float(np.median([o[k] for o in out])) for k in out[0] if k != "artifacts"}
+    result["artifacts"] = {k: float(np.median([o["artifacts"][k] for o in out])) for k in out[0]["artifacts"]}
+    return result
+
+
+def module_breakdown(top=12):
+    """Cumulative import time (ms) of each module app.py imports directly, from -X importtime."""
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT,
+                         env=dict(os.environ, MODEL_LOADING="lazy"), capture_output=True, text=True, check=True)
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        # direct children of app are indented by exactly two spaces
+        if name.startswith("   ") or not name.startswith("  ") or not cumulative.strip().isdigit():
+            continue
+        rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    modes = [("joblib pickles + pandas", {}), ("mmap bundle", {"MODEL_BUNDLE": "models/bundle"})]
+    print(f"median of {runs} fresh interpreters")
+    for name, env in modes:
+        r = measure(env, runs)
+        print(f"  {name:<24} import {r['import_s']:.2f}s  first-use load {r['load_s']:.2f}s  "
+              f"RSS {r['rss_mb']:.0f}MB  PSS {r['pss_mb']:.0f}MB  private {r['private_mb']:.0f}MB")
+        for artifact, ms in sorted(r["artifacts"].items(), key=lambda kv: -kv[1]):
+            print(f"      {artifact:<26} {ms:8.1f}ms")
+    print("import app, by module it imports (cumulative)")
+    for ms, module in module_breakdown():
+        print(f"  {module:<28} {ms:8.1f}ms")
@@ -0,0 +1,70 @@
+# benchmarks/bench_streaming.py
+"""
+Peak memory of predict_classification.load_and_classify (whole file) vs
+classify_to_csv (fixed-size chunks) on a synthetic export built by
+repeating data/train_recs.csv.
+
+predict_classification loads its artifacts from the working directory, so
+point --artifacts at a folder holding scaler/imputer/rf_model joblibs and
+label_map/feature_columns JSON (models/ by default).
+
+    python benchmarks/bench_streaming.py --rows 1000000 --chunksize 50000
+"""
+from common import ROOT
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pandas as pd
+
+CHILD = r"""
+import json, resource, sys, time, warnings
+warnings.filterwarnings("ignore")
+sys.path.insert(0, {root!r})
+import predict_classification as pc
+t0 = time.perf_counter()
+if {mode!r} == "whole":
+    pc.load_and_classify({src!r}).to_csv({dst!r}, index=False)
+else:
+    pc.classify_to_csv({src!r}, {dst!r}, chunksize={chunksize})
+print(json.dumps({{"seconds": time.perf_counter() - t0,
+                  "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def make_input(path, rows):
+    recs = pd.read_csv(os.path.join(ROOT, "data", "train_recs.csv"))
+    reps = -(-rows // len(recs))
+    for i in range(reps):
+        part = recs.head(rows - i * len(recs))
+        part.to_csv(path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+
+
+def run(mode, src, dst, chunksize, artifacts):
+    code = CHILD.format(root=ROOT, mode=mode, src=src, dst=dst, chunksize=chunksize)
+    res = subprocess.run([sys.executable, "-c", code], cwd=artifacts, capture_output=True, text=True, check=True)
+    return json.loads(res.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "models"))
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    src = os.path.join(tmp, "export.csv")
+    make_input(src, args.rows)
+    print(f"input: {args.rows} rows, {os.path.getsize(src) / 2**20:.0f}MB")
+
+    whole = run("whole", src, os.path.join(tmp, "whole.csv"), args.chunksize, args.artifacts)
+    stream = run("stream", src, os.path.join(tmp, "stream.csv"), args.chunksize, args.artifacts)
+    same = pd.read_csv(os.path.join(tmp, "whole.csv")).equals(pd.read_csv(os.path.join(tmp, "stream.csv")))
+    for name, r in [("load_and_classify", whole), (f"classify_to_csv ({args.chunksize})", stream)]:
+        print(f"  {name:<28} {r['seconds']:6.1f}s  peak RSS {r['peak_rss_mb']:7.0f}MB")
+    print(f"  identical output: {same}")
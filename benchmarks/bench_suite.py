@@ -0,0 +1,232 @@
+# benchmarks/bench_suite.py
+"""
+Reproducible offline benchmark of the assessment service, with a baseline
+to catch regressions. Nothing needs to be running: the Flask app is driven
+through its test client (login bypassed, prediction cache off, throwaway
+SQLite database) and the model layer is called directly. Inputs are
+synthetic assessments drawn from data/train_recs.csv (synthetic.py) with a
+fixed --seed.
+
+Cases, each at several batch sizes:
+
+- predict            POST /predict, one assessment per call (1) and with a
+                     profile_id so the assessment is stored (1+save)
+- predict_batch      POST /predict/batch
+- get_recommendations   app.get_recommendations (1) / get_recommendations_batch
+- load_and_classify  predict_classification.load_and_classify on a CSV
+- recommend          predict_recommendation.recommend on a CSV
+
+Each reports calls, mean/p50/p95/p99 latency per call and rows/s. Results go
+to --out; if --baseline exists the run is compared against it and any case
+whose p50 or p95 grew by more than --tolerance (and --min-delta-ms) is a
+regression, which makes the script exit 1. --update-baseline saves this
+run as the new baseline. Baselines are per machine: compare runs from the
+same host.
+
+    python benchmarks/bench_suite.py --update-baseline      # once
+    python benchmarks/bench_suite.py                        # after a change
+"""
+from common import ROOT, summarize
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_parallel import make_workdir
+from synthetic import synthetic_assessments, synthetic_recs
+
+RESULTS = os.path.join(ROOT, "benchmarks", "results")
+
+
+def run_case(fn, calls, rows, warmup=2):
+    """Call fn() `calls` times after `warmup` untimed calls; latency summary in ms plus rows/s."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(calls)
+    for i in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - t0
+    s = {f"{k}_ms": v * 1000 for k, v in summarize(samples).items()}
+    return dict(s, calls=calls, rows=rows, rows_per_s=rows * calls / samples.sum())
+
+
+def environment():
+    import sklearn
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "sklearn": sklearn.__version__, "commit": commit}
+
+
+def app_cases(args, calls):
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    for name in ("MICRO_BATCH", "ASSESSMENT_WRITE_BEHIND", "PROFILE_SLOW_MS"):
+        os.environ.pop(name, None)
+    import app as app_module
+    from models import Profile, User, db
+
+    app = app_module.app
+    app.config["LOGIN_DISABLED"] = True
+    app.config["PREDICT_BATCH_LIMIT"] = max(app.config["PREDICT_BATCH_LIMIT"], max(args.batch_sizes))
+    with app.app_context():
+        db.create_all()
+        user = User(username="bench", email="bench@example.com", password_hash="-")
+        db.session.add(user)
+        db.session.commit()
+        profile = Profile(user_id=user.id, profile_name="bench")
+        db.session.add(profile)
+        db.session.commit()
+        profile_id = profile.id
+
+    client = app.test_client()
+    payloads = synthetic_assessments(max(calls * 2, max(args.batch_sizes)), args.seed)
+    results = {}
+
+    def post(path, body):
+        r = client.post(path, json=body)
+        assert r.status_code == 200, r.get_json()
+
+    stream = itertools.cycle(payloads)
+    results["predict[1]"] = run_case(lambda: post("/predict", next(stream)), calls, 1)
+    saved = itertools.cycle([dict(p, profile_id=profile_id) for p in payloads])
+    results["predict[1+save]"] = run_case(lambda: post("/predict", next(saved)), calls, 1)
+    for size in args.batch_sizes:
+        body = payloads[:size]
+        results[f"predict_batch[{size}]"] = run_case(lambda: post("/predict/batch", body),
+                                                     max(3, calls // size), size)
+
+    m = app_module.current_models()
+    X, _, _ = m.encoder.encode_many(payloads)
+    X_rec = m.neighbor_features(X)
+    probs = m.classify(X)
+    current = [p["current_mechanisms"] for p in payloads]
+    rows = itertools.cycle(range(len(payloads)))
+
+    def one():
+        i = next(rows)
+        app_module.get_recommendations(X_rec[i:i + 1], int(probs[i].argmax()), probs[i], current[i], m=m)
+
+    results["get_recommendations[1]"] = run_case(one, calls, 1)
+    for size in args.batch_sizes:
+        results[f"get_recommendations[{size}]"] = run_case(
+            lambda: app_module.get_recommendations_batch(X_rec[:size], current[:size], m=m),
+            max(3, calls // size), size)
+    return results
+
+
+def csv_cases(args):
+    """The offline scripts read their artifacts from the working directory; run them in a scratch one."""
+    work, _, _ = make_workdir(args.artifacts, repeat=1)
+    largest = max(args.csv_sizes)
+    recs = synthetic_recs(largest, args.seed)
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        import predict_classification
+        import predict_recommendation
+
+        recs.to_csv("synthetic.csv", index=False)
+        preds = predict_classification.load_and_classify("synthetic.csv")
+        preds.insert(0, "Student_id", recs["Student_id"])
+        preds.to_csv("predictions.csv", mode="a", header=False, index=False,
+                     columns=["Student_id", "pred_int", "pred_label", "P_low", "P_med", "P_high"])
+        results = {}
+        for size in args.csv_sizes:
+            path = f"synthetic_{size}.csv"
+            recs.iloc[:size].to_csv(path, index=False)
+            calls = max(3, args.csv_calls * min(args.csv_sizes) // size)
+            results[f"load_and_classify[{size}]"] = run_case(
+                lambda: predict_classification.load_and_classify(path), calls, size, warmup=1)
+            results[f"recommend[{size}]"] = run_case(
+                lambda: predict_recommendation.recommend(path), calls, size, warmup=1)
+        return results
+    finally:
+        os.chdir(cwd)
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Print each case against the baseline; returns the names of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<28}{'p50 ms':>10}{'base':>10}{'p95 ms':>10}{'base':>10}{'rows/s':>12}{'change':>9}")
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            print(f"{name:<28}{r['p50_ms']:>10.3f}{'-':>10}{r['p95_ms']:>10.3f}{'-':>10}{r['rows_per_s']:>12.0f}"
+                  f"{'new':>9}")
+            continue
+        worse = [k for k in ("p50_ms", "p95_ms")
+                 if r[k] > b[k] * (1 + tolerance) and r[k] - b[k] > min_delta_ms]
+        change = r["rows_per_s"] / b["rows_per_s"] - 1
+        flag = "  REGRESSION (" + ", ".join(worse) + ")" if worse else ""
+        print(f"{name:<28}{r['p50_ms']:>10.3f}{b['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{b['p95_ms']:>10.3f}"
+              f"{r['rows_per_s']:>12.0f}{change:>+9.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calls", type=int, default=500, help="calls per single-row case")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[8, 64, 512])
+    parser.add_argument("--csv-sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--csv-calls", type=int, default=10, help="calls for the smallest CSV; fewer for larger")
+    parser.add_argument("--artifacts", default=os.path.join(ROOT, "models"),
+                        help="pickles for the CSV scripts (the app loads models/ itself)")
+    parser.add_argument("--quick", action="store_true", help="a tenth of the calls, for a smoke run")
+    parser.add_argument("--out", default=os.path.join(RESULTS, "latest.json"))
+    parser.add_argument("--baseline", default=os.path.join(RESULTS, "baseline.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p50/p95 growth")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore smaller absolute growth")
+    args = parser.parse_args()
+    if args.quick:
+        args.calls = max(20, args.calls // 10)
+        args.csv_calls = max(3, args.csv_calls // 10)
+
+    t0 = time.perf_counter()
+    results = app_cases(args, args.calls)
+    results.update(csv_cases(args))
+    run = {"environment": environment(), "seed": args.seed, "created_at": time.time(),
+           "elapsed_s": time.perf_counter() - t0, "results": results}
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"wrote {args.out} ({run['elapsed_s']:.0f}s)")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        changed = {k: (base["environment"].get(k), v) for k, v in run["environment"].items()
+                   if k != "commit" and base["environment"].get(k) != v}
+        if changed:
+            print(f"warning: baseline was recorded on a different setup: {changed}")
+        print(f"baseline: commit {base['environment'].get('commit')}, seed {base['seed']}")
+        regressions = compare(results, base["results"], args.tolerance, args.min_delta_ms)
+    else:
+        compare(results, {}, args.tolerance, args.min_delta_ms)
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"saved baseline {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
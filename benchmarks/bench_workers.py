@@ -0,0 +1,100 @@
+# benchmarks/bench_workers.py
+"""
+Memory per gunicorn worker with and without PRELOAD_MODELS / MODEL_BUNDLE.
+
+Starts `gunicorn app:app -w N` for each configuration, waits until every
+worker is up, sends a round of logged-in /predict requests so the models
+are actually touched, and prints memory_report for the master and workers.
+
+    python benchmarks/bench_workers.py --workers 3
+"""
+from common import ROOT, SAMPLE_ASSESSMENT
+
+import argparse
+import http.cookiejar
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+
+from flask import Flask
+
+from memory_report import children, report
+from models import User, db
+
+EMAIL, PASSWORD = "bench@example.com", "bench-password"
+
+CONFIGS = [
+    ("pickles, no preload", {}),
+    ("pickles, preload", {"PRELOAD_MODELS": "1", "MODEL_BUNDLE": ""}),
+    ("mmap bundle, preload", {"PRELOAD_MODELS": "1", "MODEL_BUNDLE": "models/bundle"}),
+]
+
+
+def seed_database(url):
+    seed = Flask("seed")
+    seed.config["SQLALCHEMY_DATABASE_URI"] = url
+    db.init_app(seed)
+    with seed.app_context():
+        db.create_all()
+        user = User(username="bench", email=EMAIL)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+
+def send_predictions(base, n):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = opener.open(f"{base}/login").read().decode()
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    form = urllib.parse.urlencode({"csrf_token": token, "email": EMAIL, "password": PASSWORD}).encode()
+    opener.open(f"{base}/login", form)
+    body = json.dumps(SAMPLE_ASSESSMENT).encode()
+    for _ in range(n):
+        req = urllib.request.Request(f"{base}/predict", body, {"Content-Type": "application/json"})
+        json.loads(opener.open(req).read())
+
+
+def run(env_extra, workers, port, requests):
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed_database(url)
+    # every request has to reach a model, so no rate limiting or coalescing
+    env = dict(os.environ, DATABASE_URL=url, RATE_LIMIT_PER_MINUTE="0", COALESCE_WINDOW_MS="0", **env_extra)
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                             "app:app"], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 120
+        seen = set()
+        while len(seen) < workers and time.time() < deadline:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=5):
+                    pass
+                seen = set(children(proc.pid))
+            except OSError:
+                time.sleep(0.5)
+        send_predictions(f"http://127.0.0.1:{port}", requests)
+        return report(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--requests", type=int, default=60)
+    args = parser.parse_args()
+
+    for name, env in CONFIGS:
+        rows = run(env, args.workers, args.port, args.requests)
+        workers = [r for r in rows if r["role"] == "worker"]
+        print(f"{name:<22} per worker: RSS {sum(r['rss_mb'] for r in workers) / len(workers):6.1f}MB  "
+              f"PSS {sum(r['pss_mb'] for r in workers) / len(workers):6.1f}MB  "
+              f"private {sum(r['private_mb'] for r in workers) / len(workers):6.1f}MB  |  "
+              f"total PSS incl. master {sum(r['pss_mb'] for r in rows):6.1f}MB")
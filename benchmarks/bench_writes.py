@@ -0,0 +1,76 @@
+# benchmarks/bench_writes.py
+"""
+End-to-end /predict latency with a profile_id (so every request stores an
+Assessment): synchronous commit per request vs the ASSESSMENT_WRITE_BEHIND
+queue, on a throwaway SQLite database, with N client threads in a closed
+loop. After each run the writer is flushed and the stored row count is
+checked against the number of requests.
+
+    python benchmarks/bench_writes.py --clients 1 8 --requests 1000
+    python benchmarks/bench_writes.py --database-url postgresql://...
+"""
+from common import summarize
+
+import argparse
+import os
+import tempfile
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--clients", type=int, nargs="+", default=[1, 8])
+parser.add_argument("--requests", type=int, default=1000)
+parser.add_argument("--database-url", default=None, help="default: a temporary SQLite file")
+args = parser.parse_args()
+
+# the app reads its settings at import
+os.environ["DATABASE_URL"] = args.database_url or "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+os.environ.pop("ASSESSMENT_WRITE_BEHIND", None)
+
+import app as app_module
+from assessment_writer import AssessmentWriter
+from bench_microbatch import load_test, payloads
+from models import Assessment, Profile, User, db
+
+
+def setup_profile():
+    with app_module.app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username="bench", email="bench@example.com", password_hash="-")
+        db.session.add(user)
+        db.session.commit()
+        profile = Profile(user_id=user.id, profile_name="bench", age=22, gender="Female")
+        db.session.add(profile)
+        db.session.commit()
+        return profile.id
+
+
+def stored():
+    with app_module.app.app_context():
+        return db.session.query(Assessment).count()
+
+
+if __name__ == "__main__":
+    app_module.app.config["LOGIN_DISABLED"] = True
+    profile_id = setup_profile()
+    bodies = [dict(p, profile_id=profile_id) for p in payloads(args.requests)]
+    print(f"database: {app_module.app.config['SQLALCHEMY_DATABASE_URI']}")
+
+    for clients in args.clients:
+        print(f"{clients} concurrent clients, {args.requests} requests")
+        for name in ("synchronous commit", "write-behind"):
+            before = stored()
+            writer = None
+            if name == "write-behind":
+                writer = AssessmentWriter(app_module.app, db, Assessment.from_fields)
+            app_module.assessment_writer = writer
+            lat, rps = load_test(clients, bodies)
+            extra = ""
+            if writer is not None:
+                writer.close()
+                st = writer.stats()
+                extra = f"  {st['flushes']} flushes, high water {st['high_water']}, sync fallbacks {st['sync_writes']}"
+            ok = stored() - before == len(bodies)
+            s = summarize(lat)
+            print(f"  {name:<20} p50 {s['p50']:>7.2f}ms  p99 {s['p99']:>7.2f}ms  {rps:>6.0f} req/s"
+                  f"  all stored: {ok}{extra}")
@@ -0,0 +1,61 @@
+# benchmarks/common.py
+"""
+Shared helpers for the scripts in benchmarks/. Run them from the repo root,
+e.g. `python benchmarks/bench_encoder.py`.
+"""
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# the shipped pickles were written by a different scikit-learn patch release
+warnings.filterwarnings("ignore", category=UserWarning)
+
+SAMPLE_ASSESSMENT = {
+    "age": 22,
+    "gpa": 3.5,
+    "study_hours": 25,
+    "social_media": 3,
+    "sleep": 7,
+    "exercise": 5,
+    "family_support": 4,
+    "financial_stress": 2,
+    "peer_pressure": 3,
+    "relationship_stress": 2,
+    "counseling": "No",
+    "diet_quality": 4,
+    "cognitive_distortions": 2,
+    "family_mental_history": "No",
+    "medical_condition": "No",
+    "substance_use": 1,
+    "gender": "Female",
+    "current_mechanisms": ["Exercise", "Reading"],
+}
+
+
+def time_call(fn, repeat=200, warmup=10):
+    """Run fn() repeatedly; return per-call latencies in microseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - t0
+    return samples * 1e6
+
+
+def summarize(samples):
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {"mean": float(samples.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+
+def print_row(name, samples, unit="us"):
+    s = summarize(samples)
+    print(f"{name:<34} mean {s['mean']:>10.1f}{unit}  p50 {s['p50']:>10.1f}{unit}  p99 {s['p99']:>10.1f}{unit}")
@@ -0,0 +1,70 @@
+# benchmarks/synthetic.py
+"""
+Synthetic assessments drawn from data/train_recs.csv.
+
+Every answer is sampled independently from that column's empirical
+distribution (gender as one categorical, the coping mechanism as a whole
+string), with a fixed seed, so the same seed always gives the same rows.
+They come out either as /predict JSON payloads or as rows in the
+train_recs.csv schema (features recomputed from the payload with
+feature_encoder.source_values, so both forms describe the same students)
+for the CSV scripts.
+"""
+from common import ROOT
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from feature_encoder import SOURCE_COLUMNS, source_values
+
+SOURCE = os.path.join(ROOT, "data", "train_recs.csv")
+
+# form field -> (train_recs column, csv value -> form value)
+_FORM = {
+    "age": ("Age", int),
+    "gpa": ("Academic Performance (GPA)", float),
+    "study_hours": ("Study Hours Per Week", int),
+    # the form asks for hours per day (FeatureEncoder multiplies by 7)
+    "social_media": ("Social_Media_Usage_per_week", lambda v: round(v / 7, 4)),
+    "sleep": ("Sleep Duration (Hours per night)", float),
+    "exercise": ("Physical Exercise (Hours per week)", float),
+    "family_support": ("Family Support", int),
+    "financial_stress": ("Financial Stress", int),
+    "peer_pressure": ("Peer Pressure", int),
+    "relationship_stress": ("Relationship Stress", int),
+    "counseling": ("Counseling Attendance", lambda v: "Yes" if v else "No"),
+    "diet_quality": ("Diet Quality", int),
+    "cognitive_distortions": ("Cognitive Distortions", int),
+    "family_mental_history": ("Family Mental Health History", lambda v: "Yes" if v else "No"),
+    "medical_condition": ("Medical Condition", lambda v: "Yes" if v else "No"),
+    "substance_use": ("Substance Use", int),
+}
+_GENDERS = ("Female", "Male", "Other")
+
+
+def _sample(values, n, rng):
+    return values[rng.integers(0, len(values), n)]
+
+
+def synthetic_assessments(n, seed=0, source=SOURCE):
+    """n /predict payloads (no profile_id)."""
+    recs = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    columns = {field: [conv(v) for v in _sample(recs[col].to_numpy(), n, rng).tolist()]
+               for field, (col, conv) in _FORM.items()}
+    gender_idx = recs[[f"Gender_{g}" for g in _GENDERS]].to_numpy().argmax(axis=1)
+    columns["gender"] = [_GENDERS[i] for i in _sample(gender_idx, n, rng)]
+    mechanisms = _sample(recs["Stress Coping Mechanisms"].to_numpy(), n, rng)
+    columns["current_mechanisms"] = [m.split(",") for m in mechanisms]
+    return [{field: values[i] for field, values in columns.items()} for i in range(n)]
+
+
+def synthetic_recs(n, seed=0, source=SOURCE, first_id=1_000_000):
+    """The same students as synthetic_assessments(n, seed) in the train_recs.csv schema."""
+    payloads = synthetic_assessments(n, seed, source)
+    df = pd.DataFrame([source_values(p) for p in payloads], columns=SOURCE_COLUMNS)
+    df.insert(0, "Student_id", np.arange(first_id, first_id + n))
+    df.insert(1, "Stress Coping Mechanisms", [",".join(p["current_mechanisms"]) for p in payloads])
+    return df
@@ -7,10 +7,16 @@ pip install -r requirements.txt
 
 echo "Initializing database..."
 python << END
-from app import app, db
+from app import app
+from db_migrate import upgrade
 with app.app_context():
-    db.create_all()
-    print("Tables created successfully!")
+    added = upgrade()
+    print("Tables created successfully!", ("Added: " + ", ".join(added)) if added else "")
 END
 
+if [ -n "$MODEL_BUNDLE" ]; then
+    echo "Building inference bundle..."
+    python model_bundle.py
+fi
+
 echo "Build completed!"
\ No newline at end of file
@@ -0,0 +1,146 @@
+# compact_recs.py
+"""
+train_recs.csv as flat NumPy arrays instead of a pandas DataFrame.
+
+The app only ever needs three things per reference row: which coping
+mechanisms the student listed (in order), their stress category and their
+recommendation features. The DataFrame the app used to keep held those
+as one Python list of raw strings per row, an object column of category
+strings and 20 int64 / float64 columns. Here:
+
+    names               mechanism vocabulary, stripped, in first-seen order
+    offsets[n + 1]      int32; row s lists ids[offsets[s]:offsets[s + 1]]
+    ids                 uint8 mechanism ids (CSR layout)
+    category[n]         uint8 code into `categories`
+    features[n, F]      float32, in feature_columns order
+    student_id[n]       int32
+
+mechanism_table() builds the MechanismTable get_recommendations scores
+with straight from the CSR arrays, identical to
+MechanismTable.from_train_recs on the DataFrame.
+"""
+import numpy as np
+
+from mechanisms import MechanismTable
+
+MECHANISMS = "Stress Coping Mechanisms"
+CATEGORY = "Stress Level Category"
+STUDENT_ID = "Student_id"
+
+
+class CompactRecs:
+    def __init__(self, names, offsets, ids, categories, category, feature_columns, features, student_id):
+        self.names = list(names)
+        self.index = {name: j for j, name in enumerate(self.names)}
+        self.offsets = offsets
+        self.ids = ids
+        self.categories = list(categories)
+        self.category = category
+        self.feature_columns = list(feature_columns)
+        self.features = features
+        self.student_id = student_id
+
+    @classmethod
+    def from_frame(cls, df, feature_columns, strip=True):
+        """From a frame with train_recs.csv's columns (Mechanisms as the raw comma-separated string)."""
+        names, index = [], {}
+        lengths = np.empty(len(df), dtype=np.int32)
+        ids = []
+        for s, raw in enumerate(df[MECHANISMS].tolist()):
+            mechs = raw.split(",") if isinstance(raw, str) else []
+            for mech in mechs:
+                mech = mech.strip() if strip else mech
+                j = index.get(mech)
+                if j is None:
+                    j = index[mech] = len(names)
+                    names.append(mech)
+                ids.append(j)
+            lengths[s] = len(mechs)
+        offsets = np.zeros(len(df) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=offsets[1:])
+        id_dtype = np.uint8 if len(names) <= 256 else np.uint16
+
+        codes, categories = _factorize(df[CATEGORY].tolist())
+        features = np.ascontiguousarray(df[list(feature_columns)].to_numpy(dtype=np.float32))
+        student_id = df[STUDENT_ID].to_numpy(dtype=np.int32) if STUDENT_ID in df else \
+            np.arange(len(df), dtype=np.int32)
+        return cls(names, offsets, np.asarray(ids, dtype=id_dtype), categories, codes,
+                   feature_columns, features, student_id)
+
+    @classmethod
+    def read_csv(cls, path, feature_columns, strip=True):
+        import pandas as pd
+
+        columns = [STUDENT_ID, MECHANISMS, CATEGORY] + list(feature_columns)
+        df = pd.read_csv(path, usecols=columns, dtype={c: np.float32 for c in feature_columns})
+        return cls.from_frame(df, feature_columns, strip)
+
+    def __len__(self):
+        return len(self.category)
+
+    # ── lookups ──────────────────────────────────────────────────────────────
+
+    def mechanism_ids(self, s):
+        return self.ids[self.offsets[s]:self.offsets[s + 1]]
+
+    def mechanisms(self, s):
+        """Mechanism names student s listed, in order."""
+        return [self.names[j] for j in self.mechanism_ids(s)]
+
+    def mechanisms_of(self, idx):
+        """mechanisms() for each row index in idx (e.g. one row of kNN neighbors), one gather."""
+        idx = np.asarray(idx).ravel()
+        lo = self.offsets[idx]
+        lengths = self.offsets[idx + 1] - lo
+        # positions of every selected row's ids, row after row
+        take = np.repeat(lo - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        flat = [self.names[j] for j in self.ids[take].tolist()]
+        out, p = [], 0
+        for n in lengths.tolist():
+            out.append(flat[p:p + n])
+            p += n
+        return out
+
+    def code(self, label):
+        return self.categories.index(label)
+
+    def labels(self, idx):
+        """Stress category names for the rows in idx."""
+        return [self.categories[c] for c in self.category[np.asarray(idx).ravel()].tolist()]
+
+    def success(self, label="Low"):
+        """uint8 per row: 1 where the category is `label` (what the tables count as a success)."""
+        if label not in self.categories:
+            return np.zeros(len(self), dtype=np.uint8)
+        return (self.category == self.code(label)).astype(np.uint8)
+
+    def mechanism_table(self):
+        """The MechanismTable for these rows (success = Low)."""
+        n, n_mech = len(self), len(self.names)
+        lengths = np.diff(self.offsets)
+        rows = np.repeat(np.arange(n), lengths)
+        positions = np.arange(len(self.ids)) - self.offsets[rows]
+        ids = self.ids.astype(np.intp)
+        counts = np.zeros((n, n_mech), dtype=np.uint8)
+        np.add.at(counts, (rows, ids), 1)
+        first = np.full((n, n_mech), np.iinfo(np.int16).max, dtype=np.int16)
+        np.minimum.at(first, (rows, ids), positions.astype(np.int16))
+        first[counts == 0] = 0
+        width = int(lengths.max(initial=0)) or 1
+        return MechanismTable.from_arrays(self.names, counts, first, self.success(), width)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.offsets, self.ids, self.category, self.features, self.student_id))
+
+
+def _factorize(values):
+    categories, codes = [], np.empty(len(values), dtype=np.uint8)
+    index = {}
+    for i, v in enumerate(values):
+        c = index.get(v)
+        if c is None:
+            c = index[v] = len(categories)
+            categories.append(v)
+        codes[i] = c
+    return codes, categories
@@ -0,0 +1,64 @@
+# conftest.py
+"""
+Shared fixtures. models/rf_model.joblib is not in the repository, so tests
+that need the pickles or a bundle get a copy of models/ with a small forest
+fitted on data/train_recs.csv in its place.
+"""
+import json
+import os
+
+import joblib
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from mechanisms import MechanismTable
+from model_bundle import write_bundle
+from neighbor_index import REFERENCE_FILE, load_reference
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS = os.path.join(BASE_DIR, "models")
+TRAIN_RECS = os.path.join(BASE_DIR, "data", "train_recs.csv")
+SHARED_ARTIFACTS = ("scaler.joblib", "imputer.joblib", "knn_model.joblib", REFERENCE_FILE,
+                    "label_map.json", "feature_columns.json", "rec_feature_columns.json")
+
+
+def read_json(name):
+    with open(os.path.join(MODELS, name)) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="session")
+def model_dir(tmp_path_factory):
+    """A base_dir for load_pickles: models/ (with a 10-tree forest) and data/train_recs.csv."""
+    base = tmp_path_factory.mktemp("artifacts")
+    os.makedirs(base / "models")
+    os.makedirs(base / "data")
+    for name in SHARED_ARTIFACTS:
+        os.symlink(os.path.join(MODELS, name), base / "models" / name)
+    os.symlink(TRAIN_RECS, base / "data" / "train_recs.csv")
+
+    recs = pd.read_csv(TRAIN_RECS)
+    labels = {v: int(k) for k, v in read_json("label_map.json").items()}
+    scaler = joblib.load(os.path.join(MODELS, "scaler.joblib"))
+    imputer = joblib.load(os.path.join(MODELS, "imputer.joblib"))
+    X = scaler.transform(imputer.transform(recs[read_json("feature_columns.json")].values))
+    forest = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0)
+    forest.fit(X, recs["Stress Level Category"].map(labels).values)
+    joblib.dump(forest, base / "models" / "rf_model.joblib")
+    return str(base)
+
+
+@pytest.fixture(scope="session")
+def bundle_dir(model_dir):
+    """model_bundle.py's bundle built from model_dir's artifacts."""
+    models = os.path.join(model_dir, "models")
+    recs = pd.read_csv(TRAIN_RECS)
+    recs["Mechanisms"] = recs["Stress Coping Mechanisms"].str.split(",")
+    path = os.path.join(model_dir, "bundle")
+    write_bundle(path, joblib.load(os.path.join(models, "imputer.joblib")),
+                 joblib.load(os.path.join(models, "scaler.joblib")),
+                 joblib.load(os.path.join(models, "rf_model.joblib")), load_reference(models),
+                 read_json("feature_columns.json"), read_json("rec_feature_columns.json"),
+                 read_json("label_map.json"), MechanismTable.from_train_recs(recs))
+    return path
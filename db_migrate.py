@@ -0,0 +1,77 @@
+# db_migrate.py
+"""
+In-place upgrades for databases created by an earlier version of models.py.
+
+db.create_all() only creates missing tables; it never touches a table that
+already exists. upgrade() additionally creates any index declared in
+models.py that an existing table lacks. Every step checks before it acts,
+so running it repeatedly (init_db.py, /init-db, build.sh) is safe.
+
+    python db_migrate.py
+
+When the trend tables (trends.py) are new it fills them from the existing
+assessments. It also moves the legacy JSON recommendations/current_mechanisms strings
+of older assessments into stress_assessment_mechanisms rows, clearing the
+strings as it goes so no row is converted twice.
+"""
+import json
+
+from sqlalchemy import inspect, or_
+
+import trends
+from models import Assessment, ProfileStats, db, mechanism_ids, mechanism_rows
+
+# assessments converted per transaction
+_CHUNK = 500
+
+
+def upgrade():
+    """Create missing tables and indexes, convert legacy rows; returns what was added. Needs an app context."""
+    added = []
+    existing = set(inspect(db.engine).get_table_names())
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            added.append(table.name)
+            continue
+        have = {ix["name"] for ix in inspect(db.engine).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in have:
+                index.create(db.engine)
+                added.append(index.name)
+    if ProfileStats.__tablename__ in added:
+        # aggregates start out empty for databases with history
+        trends.rebuild()
+    moved = migrate_mechanism_blobs()
+    if moved:
+        added.append(f"{moved} assessments' mechanisms")
+    return added
+
+
+def migrate_mechanism_blobs():
+    """Convert legacy JSON mechanism strings to AssessmentMechanism rows; returns assessments converted."""
+    moved = 0
+    while True:
+        batch = (Assessment.query
+                 .filter(or_(Assessment.recommendations.isnot(None), Assessment.current_mechanisms.isnot(None)))
+                 .order_by(Assessment.id).limit(_CHUNK).all())
+        if not batch:
+            return moved
+        parsed = [(json.loads(a.current_mechanisms or "[]"), json.loads(a.recommendations or "[]"))
+                  for a in batch]
+        # register new names before this transaction starts writing
+        mechanism_ids([name for current, recs in parsed for name in current]
+                      + [r["mechanism"] for _, recs in parsed for r in recs])
+        for assessment, (current, recommendations) in zip(batch, parsed):
+            assessment.mechanisms = mechanism_rows(current, recommendations)
+            assessment.current_mechanisms = assessment.recommendations = None
+        db.session.commit()
+        moved += len(batch)
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        added = upgrade()
+    print("Added: " + ", ".join(added) if added else "Database is up to date")
@@ -0,0 +1,123 @@
+# feature_encoder.py
+"""
+Precompiled encoder from a submitted assessment (the JSON sent by
+assess.html) to the model's feature row, without going through pandas.
+
+The column order comes from feature_columns.json / rec_feature_columns.json
+and is resolved to integer positions once, at construction time.
+"""
+import threading
+
+import numpy as np
+
+
+def _per_week(v):
+    # the form asks for hours per day, the models were trained per week
+    return float(v) * 7
+
+
+def _yes_no(v):
+    return 1 if v == 'Yes' else 0
+
+
+# (feature column, form field, conversion) in the order the form is read
+_FIELDS = (
+    ('Age', 'age', float),
+    ('Academic Performance (GPA)', 'gpa', float),
+    ('Study Hours Per Week', 'study_hours', float),
+    ('Social_Media_Usage_per_week', 'social_media', _per_week),
+    ('Sleep Duration (Hours per night)', 'sleep', float),
+    ('Physical Exercise (Hours per week)', 'exercise', float),
+    ('Family Support', 'family_support', int),
+    ('Financial Stress', 'financial_stress', int),
+    ('Peer Pressure', 'peer_pressure', int),
+    ('Relationship Stress', 'relationship_stress', int),
+    ('Counseling Attendance', 'counseling', _yes_no),
+    ('Diet Quality', 'diet_quality', int),
+    ('Cognitive Distortions', 'cognitive_distortions', int),
+    ('Family Mental Health History', 'family_mental_history', _yes_no),
+    ('Medical Condition', 'medical_condition', _yes_no),
+    ('Substance Use', 'substance_use', int),
+)
+_GENDERS = (('Gender_Female', 'Female'), ('Gender_Male', 'Male'), ('Gender_Other', 'Other'))
+
+SOURCE_COLUMNS = [c for c, _, _ in _FIELDS] + [c for c, _ in _GENDERS] + ['Stress_Ratio']
+_POS = {c: i for i, c in enumerate(SOURCE_COLUMNS)}
+_STRESSORS = [_POS[c] for c in ('Financial Stress', 'Peer Pressure', 'Relationship Stress')]
+_SUPPORTS = [_POS[c] for c in ('Family Support', 'Diet Quality', 'Physical Exercise (Hours per week)')]
+
+
+def source_values(data):
+    """All SOURCE_COLUMNS values for one assessment, as a Python list."""
+    vals = [conv(data[key]) for _, key, conv in _FIELDS]
+    gender = data['gender']
+    vals += [1 if gender == g else 0 for _, g in _GENDERS]
+
+    numerator = vals[_STRESSORS[0]] + vals[_STRESSORS[1]] + vals[_STRESSORS[2]]
+    denominator = vals[_SUPPORTS[0]] + vals[_SUPPORTS[1]] + vals[_SUPPORTS[2]]
+    if denominator == 0:
+        denominator = 0.001
+    vals.append(numerator / denominator)
+    return vals
+
+
+class FeatureEncoder:
+    """
+    Writes assessments straight into NumPy rows ordered by feature_columns.
+
+    encode() reuses a per-thread preallocated (1, n_features) buffer, so the
+    returned row is only valid until the next encode() on the same thread;
+    copy it if it has to outlive the request.
+    """
+
+    def __init__(self, feature_columns, rec_feature_columns=None):
+        unknown = [c for c in feature_columns if c not in _POS]
+        if unknown:
+            raise ValueError(f"no form field produces feature(s) {unknown}")
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self._take = np.array([_POS[c] for c in self.feature_columns], dtype=np.intp)
+
+        rec_feature_columns = list(rec_feature_columns or feature_columns)
+        if rec_feature_columns == self.feature_columns:
+            self._rec_take = None
+        else:
+            index = {c: i for i, c in enumerate(self.feature_columns)}
+            self._rec_take = np.array([index[c] for c in rec_feature_columns], dtype=np.intp)
+        self._local = threading.local()
+
+    def _buffer(self):
+        row = getattr(self._local, 'row', None)
+        if row is None:
+            row = self._local.row = np.empty((1, self.n_features))
+        return row
+
+    def encode(self, data, out=None):
+        """
+        Encode one assessment into `out` (a 1-D row of length n_features) or
+        into the thread's preallocated (1, n_features) buffer.
+        """
+        row = self._buffer() if out is None else out
+        np.take(source_values(data), self._take, out=row.reshape(-1))
+        return row
+
+    def encode_many(self, rows):
+        """
+        Encode a list of assessments into one matrix. Returns
+        (X, valid, errors): X has one row per entry of `valid` (the indices
+        that encoded cleanly) and errors maps every other index to its error.
+        """
+        X = np.empty((len(rows), self.n_features))
+        valid, errors = [], {}
+        for i, data in enumerate(rows):
+            try:
+                self.encode(data, out=X[len(valid)])
+            except Exception as e:
+                errors[i] = e
+                continue
+            valid.append(i)
+        return X[:len(valid)], valid, errors
+
+    def rec_features(self, X):
+        """The recommendation model's view of encoded rows."""
+        return X if self._rec_take is None else X[:, self._rec_take]
@@ -0,0 +1,110 @@
+# forest.py
+"""
+A fitted RandomForestClassifier flattened into contiguous node arrays, so it
+can be stored as plain .npy files and evaluated without scikit-learn.
+
+All trees share one set of arrays; tree t's root is node roots[t]. Leaves
+point to themselves (left == right == own index), so a traversal can simply
+keep stepping until every row has reached a fixed point.
+
+predict_proba walks every tree for every row in lockstep: one (rows, trees)
+array of current nodes, advanced one level per vectorized step. That skips
+sklearn's per-call validation and per-tree dispatch, which dominate the
+one-row and small-batch calls the app makes.
+"""
+import numpy as np
+
+_TREE_LEAF = -1  # sklearn.tree._tree.TREE_LEAF
+
+# cap on (rows x trees) node slots walked at once, bounds predict_proba memory
+_LOCKSTEP_BLOCK = 1 << 19
+
+# above this many rows sklearn's compiled traversal overtakes the lockstep
+# walk (benchmarks/bench_forest.py), so "auto" hands larger batches to it
+FLAT_MAX_ROWS = 256
+
+
+class FlatForest:
+    ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        self.feature = feature        # (nodes,) int32, 0 at leaves
+        self.threshold = threshold    # (nodes,) float64, go left if x <= threshold
+        self.left = left              # (nodes,) int32 global node index
+        self.right = right            # (nodes,) int32 global node index
+        self.value = value            # (nodes, classes) float64 class fractions
+        self.roots = roots            # (trees,) int32
+        self.max_depth = int(max_depth)
+        self.n_classes = value.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, rf_model):
+        trees = [est.tree_ for est in rf_model.estimators_]
+        sizes = np.array([t.node_count for t in trees])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+
+        feature, threshold, left, right, value = [], [], [], [], []
+        for root, t in zip(roots, trees):
+            own = np.arange(t.node_count, dtype=np.int32) + root
+            leaf = t.children_left == _TREE_LEAF
+            feature.append(np.where(leaf, 0, t.feature).astype(np.int32))
+            threshold.append(np.where(leaf, 0.0, t.threshold))
+            left.append(np.where(leaf, own, t.children_left + root).astype(np.int32))
+            right.append(np.where(leaf, own, t.children_right + root).astype(np.int32))
+            v = t.value[:, 0, :]
+            value.append(v / v.sum(axis=1, keepdims=True))
+        return cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+                   np.concatenate(right), np.concatenate(value), roots,
+                   max(t.max_depth for t in trees))
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def apply(self, X):
+        """Leaf reached in every tree, as a (rows, trees) array of global node ids."""
+        # sklearn compares float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_base = (np.arange(n_rows) * n_features)[:, None]
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.max_depth):
+            go_left = flat_X[row_base + self.feature[node]] <= self.threshold[node]
+            step = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(step, node):
+                break
+            node = step
+        return node
+
+    def predict_proba(self, X):
+        """Mean of the trees' leaf class fractions, like RandomForestClassifier.predict_proba."""
+        X = np.asarray(X)
+        proba = np.empty((len(X), self.n_classes))
+        chunk = max(1, _LOCKSTEP_BLOCK // self.n_trees)
+        for lo in range(0, len(X), chunk):
+            leaves = self.apply(X[lo:lo + chunk])
+            proba[lo:lo + chunk] = self.value[leaves].sum(axis=1)
+        proba /= self.n_trees
+        return proba
+
+
+def forest_predictor(rf_model, evaluator="sklearn", flat_max_rows=FLAT_MAX_ROWS):
+    """
+    predict_proba callable for a fitted forest, per FOREST_EVALUATOR:
+    "sklearn" (the model's own), "flat" (FlatForest) or "auto" (FlatForest
+    up to flat_max_rows rows, sklearn above).
+    """
+    if evaluator == "sklearn":
+        return rf_model.predict_proba
+    flat = FlatForest.from_sklearn(rf_model)
+    if evaluator == "flat":
+        return flat.predict_proba
+    if evaluator == "auto":
+        def predict_proba(X):
+            return flat.predict_proba(X) if len(X) <= flat_max_rows else rf_model.predict_proba(X)
+        return predict_proba
+    raise ValueError(f"unknown forest evaluator {evaluator!r}; choose sklearn, flat or auto")
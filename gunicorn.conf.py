@@ -0,0 +1,46 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn app:app` (see Procfile)
+import gc
+import os
+import sys
+
+# PRELOAD_MODELS=1 imports app.py once in the master and forks workers from
+# it, so all workers share one copy of the model memory. Shared pages only
+# stay shared if nothing writes to them: serving from the memory-mapped
+# bundle keeps the model arrays in read-only file pages, and freezing the GC
+# stops collections from touching the objects inherited from the master.
+preload_app = os.environ.get('PRELOAD_MODELS') == '1'
+
+# serve from the bundle when one is built, unless MODEL_BUNDLE is set (even to '')
+if preload_app and 'MODEL_BUNDLE' not in os.environ and os.path.exists(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'bundle', 'meta.json')):
+    os.environ['MODEL_BUNDLE'] = 'models/bundle'
+
+# preloaded models have to be in the master before it forks; without preload
+# each worker starts loading at import and reports on /health/ready when done
+os.environ.setdefault('MODEL_LOADING', 'eager' if preload_app else 'background')
+
+# micro-batching only sees concurrent requests within one process, so give
+# workers threads (gunicorn switches to its gthread worker when threads > 1)
+if os.environ.get('MICRO_BATCH') == '1':
+    threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+        server.log.info("Models preloaded in master; %d objects frozen", gc.get_freeze_count())
+
+
+def post_worker_init(worker):
+    from memory_report import process_memory
+    mem = process_memory()
+    worker.log.info("Worker %s memory: RSS %.1fMB PSS %.1fMB private %.1fMB",
+                    worker.pid, mem['rss_mb'], mem['pss_mb'], mem['private_mb'])
+
+
+def worker_exit(server, worker):
+    # flush assessments still queued by the write-behind writer
+    app = sys.modules.get('app')
+    if app is not None and app.assessment_writer is not None:
+        app.assessment_writer.close()
@@ -1,9 +1,10 @@
 from app import app, db
 from models import User, Profile, Assessment
+from db_migrate import upgrade
 
 with app.app_context():
-    # Create all tables
-    db.create_all()
+    # Create all tables, plus indexes missing from tables created earlier
+    upgrade()
     print("Database tables created successfully!")
     print("Tables created:")
     print("- stress_users")
@@ -0,0 +1,144 @@
+# mechanisms.py
+"""
+Coping-mechanism statistics over the kNN reference set, precomputed once so
+that scoring a request is a gather-and-sum over its neighbor indices.
+
+The vocabulary is small (a dozen mechanisms) so the incidence matrix is a
+dense uint8 array: 4k students x 10 mechanisms is ~40KB, cheaper to gather
+from than any sparse format.
+"""
+import numpy as np
+
+# rows scored per chunk in rank_batch; bounds the (rows, k, mechanisms) gather
+_BATCH_CHUNK = 4096
+
+# the coping mechanisms train_recs lists and the assessment form offers
+MECHANISMS = ("Meditation", "Exercise", "Yoga", "Reading", "Social Media Engagement", "Talking to Friends",
+              "Walking or Nature Walks", "Watching Sports", "Travelling", "Spending Time Alone")
+_CANONICAL = {name.lower(): name for name in MECHANISMS}
+
+
+def known_mechanisms(names):
+    """
+    The entries of a client's current_mechanisms list that name a known
+    mechanism, in MECHANISMS' spelling (whitespace and case ignored), each
+    once; anything else is dropped, so free text never reaches the
+    database or the reference set.
+    """
+    if not isinstance(names, (list, tuple)):
+        return []
+    out = []
+    for name in names:
+        name = _CANONICAL.get(name.strip().lower()) if isinstance(name, str) else None
+        if name is not None and name not in out:
+            out.append(name)
+    return out
+
+
+class MechanismTable:
+    """
+    counts[s, j]  how many times student s lists mechanism j
+    first[s, j]   position of mechanism j in student s's list (only where counts > 0)
+    success[s]    1 if student s counts as a success (ended in Low stress)
+
+    rank() reproduces the dict-based scoring the app used before: success
+    rate per mechanism over the neighbors, ties kept in the order mechanisms
+    are first met walking the neighbors nearest-first.
+    """
+
+    def __init__(self, mechanism_lists, success, strip=True):
+        self.strip = strip
+        self.names = []
+        index = {}
+        rows = []
+        for mechs in mechanism_lists:
+            row = []
+            for mech in mechs:
+                mech = mech.strip() if strip else mech
+                j = index.get(mech)
+                if j is None:
+                    j = index[mech] = len(self.names)
+                    self.names.append(mech)
+                row.append(j)
+            rows.append(row)
+        self.index = index
+
+        n, n_mech = len(rows), len(self.names)
+        self.width = max((len(r) for r in rows), default=1) or 1
+        self.counts = np.zeros((n, n_mech), dtype=np.uint8)
+        self.first = np.zeros((n, n_mech), dtype=np.int16)
+        for s, row in enumerate(rows):
+            for pos in range(len(row) - 1, -1, -1):
+                self.counts[s, row[pos]] += 1
+                self.first[s, row[pos]] = pos
+        self.success = np.asarray(success, dtype=np.uint8)
+
+    @classmethod
+    def from_arrays(cls, names, counts, first, success, width, strip=True):
+        """Rebuild a table from arrays saved by arrays() (e.g. memory-mapped)."""
+        table = cls.__new__(cls)
+        table.strip = strip
+        table.names = list(names)
+        table.index = {name: j for j, name in enumerate(table.names)}
+        table.width = int(width)
+        table.counts, table.first, table.success = counts, first, success
+        return table
+
+    def arrays(self):
+        return {"counts": self.counts, "first": self.first, "success": self.success}
+
+    @classmethod
+    def from_train_recs(cls, train_recs):
+        """Build from the app's train_recs frame (Mechanisms + Stress Level Category)."""
+        return cls(train_recs["Mechanisms"], train_recs["Stress Level Category"].values == "Low")
+
+    def scores(self, idx):
+        """
+        Per-mechanism stats for a (rows, k) neighbor index matrix, nearest first:
+        times used, success rate (nan where unused) and a first-seen sort key
+        (unique among the used mechanisms of a row).
+        """
+        G = self.counts[idx]                                    # (rows, k, M)
+        used = G.sum(axis=1, dtype=np.int64)
+        succ = np.einsum("rk,rkm->rm", self.success[idx], G, dtype=np.int64)
+        seen = G > 0
+        first_rank = seen.argmax(axis=1)                        # (rows, M)
+        first_student = np.take_along_axis(idx, first_rank, axis=1)
+        order_key = first_rank * self.width + self.first[first_student, np.arange(len(self.names))]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rate = succ / used
+        return used, rate, order_key
+
+    def _score(self, idx):
+        used, rate, order_key = self.scores(idx)
+        # by success rate, then first-seen order; unused mechanisms sort last
+        order = np.lexsort((order_key, -np.where(used > 0, rate, -1.0)), axis=1)
+        return used, rate, order
+
+    def _top(self, used, rate, order, current_mechanisms, m):
+        current = set(c.strip() for c in current_mechanisms) if self.strip else set(current_mechanisms)
+        out = []
+        for j in order:
+            if used[j] == 0:
+                break
+            if self.names[j] in current:
+                continue
+            out.append({"mechanism": self.names[j], "success_rate": float(rate[j])})
+            if len(out) == m:
+                break
+        return out
+
+    def rank(self, neighbor_idx, current_mechanisms, m=5):
+        """Top-m mechanisms not already in current_mechanisms, for one row of neighbors."""
+        used, rate, order = self._score(np.asarray(neighbor_idx).reshape(1, -1))
+        return self._top(used[0], rate[0], order[0], current_mechanisms, m)
+
+    def rank_batch(self, neighbor_idx, current_mechanisms, m=5):
+        """rank() for every row of a (rows, k) neighbor index matrix."""
+        neighbor_idx = np.asarray(neighbor_idx)
+        out = []
+        for lo in range(0, len(neighbor_idx), _BATCH_CHUNK):
+            used, rate, order = self._score(neighbor_idx[lo:lo + _BATCH_CHUNK])
+            for r in range(len(used)):
+                out.append(self._top(used[r], rate[r], order[r], current_mechanisms[lo + r], m))
+        return out
@@ -0,0 +1,80 @@
+# memory_report.py
+"""
+Per-process memory accounting from /proc (Linux only).
+
+RSS counts every resident page, including the ones shared with other
+workers, so it overstates what each gunicorn worker costs. PSS splits
+shared pages evenly between the processes mapping them and private is what
+the worker alone holds; those two are what to watch when sizing
+WEB_CONCURRENCY.
+
+    python memory_report.py <gunicorn master pid>
+
+prints one line per worker plus totals.
+"""
+import os
+import sys
+
+_ROLLUP_KEYS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb",
+}
+
+
+def process_memory(pid="self"):
+    """RSS/PSS/shared/private in MB for one process, from smaps_rollup."""
+    out = {"pid": os.getpid() if pid == "self" else int(pid)}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in _ROLLUP_KEYS:
+                out[_ROLLUP_KEYS[key]] = int(rest.split()[0]) / 1024
+    out["private_mb"] = out["private_clean_mb"] + out["private_dirty_mb"]
+    return out
+
+
+def mapped_files(pid="self", under=None):
+    """
+    Resident/PSS MB per file-backed mapping (optionally only paths under
+    `under`), e.g. to confirm the model bundle's .npy pages are shared.
+    """
+    files = {}
+    current = None
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            head = line.split(None, 5)
+            if "-" in head[0] and len(head) >= 5 and ":" not in head[0]:
+                path = head[5].strip() if len(head) == 6 else ""
+                current = path if path.startswith("/") and (under is None or path.startswith(under)) else None
+                if current:
+                    files.setdefault(current, {"rss_mb": 0.0, "pss_mb": 0.0})
+            elif current and head[0] in ("Rss:", "Pss:"):
+                files[current][head[0][:-1].lower() + "_mb"] += int(head[1]) / 1024
+    return files
+
+
+def children(pid):
+    kids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            kids += [int(k) for k in f.read().split()]
+    return kids
+
+
+def report(master_pid):
+    rows = [dict(process_memory(master_pid), role="master")]
+    rows += [dict(process_memory(pid), role="worker") for pid in children(master_pid)]
+    return rows
+
+
+if __name__ == "__main__":
+    rows = report(int(sys.argv[1]))
+    print(f"{'role':<8}{'pid':>8}{'RSS MB':>10}{'PSS MB':>10}{'shared MB':>11}{'private MB':>12}")
+    for r in rows:
+        shared = r["shared_clean_mb"] + r["shared_dirty_mb"]
+        print(f"{r['role']:<8}{r['pid']:>8}{r['rss_mb']:>10.1f}{r['pss_mb']:>10.1f}{shared:>11.1f}{r['private_mb']:>12.1f}")
+    print(f"{'total':<16}{sum(r['rss_mb'] for r in rows):>10.1f}{sum(r['pss_mb'] for r in rows):>10.1f}")
@@ -0,0 +1,193 @@
+# metrics.py
+"""
+In-process latency histograms, served in Prometheus text format.
+
+Request code wraps each step of the hot path in `metrics.stage(name)`:
+
+    with metrics.stage("encode"):
+        X = m.encoder.encode(data)
+
+which observes the step's duration into the `stress_stage_seconds`
+histogram (label stage=name) and, inside a request, adds it to
+g.stage_ms so request_stats.py can list it in the Server-Timing header.
+Whole requests go into `stress_request_seconds` (label endpoint), and
+gauges and counters are callbacks read only when /metrics is scraped.
+
+Histograms are cumulative since the process started, one set per worker
+(the usual Prometheus client model: scrape each worker, or sum them).
+Observing is a bisect and two increments under a lock; Metrics(enabled=False)
+makes stage() a shared no-op context manager.
+"""
+import bisect
+import threading
+import time
+from contextlib import nullcontext
+
+from flask import g, has_request_context, request
+
+# 10us .. ~10s in x2.5 steps: covers a cached hit through a slow DB commit
+DEFAULT_BUCKETS = tuple(round(1e-5 * 2.5 ** i, 8) for i in range(16))
+
+_NOOP = nullcontext()
+
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts incl. +Inf, sum, count)."""
+        with self._lock:
+            counts, total, n = list(self.counts), self.sum, self.count
+        running, cumulative = 0, []
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, n
+
+    def quantile(self, q):
+        """Upper bucket bound holding the q-th observation (what histogram_quantile would bracket)."""
+        cumulative, _, n = self.snapshot()
+        if not n:
+            return 0.0
+        i = bisect.bisect_left(cumulative, q * n)
+        return self.buckets[i] if i < len(self.buckets) else float("inf")
+
+
+class _StageTimer:
+    __slots__ = ("hist", "name", "start")
+
+    def __init__(self, hist, name):
+        self.hist = hist
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.hist.observe(seconds)
+        if has_request_context():
+            stages = g.get("stage_ms")
+            if stages is None:
+                stages = g.stage_ms = {}
+            stages[self.name] = stages.get(self.name, 0.0) + seconds * 1000
+        return False
+
+
+class Metrics:
+    HELP = {
+        "stress_stage_seconds": "Time spent in one step of the scoring path.",
+        "stress_request_seconds": "Request latency by Flask endpoint.",
+    }
+
+    def __init__(self, app=None, enabled=True, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms = {}   # name -> {sorted label tuple: Histogram}
+        self._gauges = []       # (name, help, fn, type)
+        self._stages = {}       # stage name -> its Histogram, skipping the label lookup
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.enabled:
+            app.before_request(self._start)
+            app.after_request(self._finish)
+
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+
+    def _finish(self, response):
+        if "metrics_start" in g:
+            self.histogram("stress_request_seconds", endpoint=request.endpoint or "unknown") \
+                .observe(time.perf_counter() - g.metrics_start)
+        return response
+
+    def histogram(self, name, **labels):
+        key = tuple(sorted(labels.items()))
+        family = self._histograms.get(name)
+        hist = family.get(key) if family is not None else None
+        if hist is None:
+            with self._lock:
+                family = self._histograms.setdefault(name, {})
+                hist = family.setdefault(key, Histogram(self.buckets))
+        return hist
+
+    def stage(self, name):
+        """Context manager timing one step into stress_stage_seconds{stage=name}."""
+        if not self.enabled:
+            return _NOOP
+        hist = self._stages.get(name)
+        if hist is None:
+            hist = self._stages[name] = self.histogram("stress_stage_seconds", stage=name)
+        return _StageTimer(hist, name)
+
+    def gauge(self, name, help, fn):
+        """Register fn() -> number, read at scrape time; None leaves the sample out."""
+        self._gauges.append((name, help, fn, "gauge"))
+
+    def counter(self, name, help, fn):
+        """Like gauge(), for a count that only goes up."""
+        self._gauges.append((name, help, fn, "counter"))
+
+    def render(self):
+        """Everything in Prometheus text exposition format 0.0.4."""
+        lines = []
+        with self._lock:
+            families = {name: dict(family) for name, family in self._histograms.items()}
+        for name in sorted(families):
+            lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in sorted(families[name].items()):
+                cumulative, total, n = hist.snapshot()
+                bounds = [repr(float(b)) for b in hist.buckets] + ["+Inf"]
+                for bound, c in zip(bounds, cumulative):
+                    lines.append(f"{name}_bucket{_label_str(labels + (('le', bound),))} {c}")
+                lines.append(f"{name}_sum{_label_str(labels)} {total!r}")
+                lines.append(f"{name}_count{_label_str(labels)} {n}")
+        for name, help, fn, kind in self._gauges:
+            try:
+                value = fn()
+                if value is None:
+                    continue
+                value = float(value)
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value!r}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, name="stress_stage_seconds"):
+        """{label value: {count, mean_ms, p50_ms, p99_ms}} for one histogram family (bucket-resolution)."""
+        out = {}
+        for labels, hist in list(self._histograms.get(name, {}).items()):
+            _, total, n = hist.snapshot()
+            key = ",".join(str(v) for _, v in labels) or name
+            out[key] = {"count": n, "mean_ms": total / n * 1000 if n else 0.0,
+                        "p50_ms": hist.quantile(0.5) * 1000, "p99_ms": hist.quantile(0.99) * 1000}
+        return out
@@ -0,0 +1,101 @@
+# micro_batch.py
+"""
+Micro-batching scheduler for one-row model calls.
+
+Request threads submit a single encoded feature row and block on a Future.
+One background thread collects rows until it has max_batch of them or the
+oldest has waited max_wait_ms, scores them with a single vectorized call
+and hands each waiting request its own row of the result.
+
+It only pays off when one process serves several requests at once, i.e.
+gunicorn's threaded worker (`--threads`, see gunicorn.conf.py); with one
+request at a time every batch is a single row that just waited max_wait_ms.
+
+The thread is started on first use and again after a fork, so the
+scheduler can be created at import time in a preloaded gunicorn master.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    def __init__(self, score_batch, max_batch=32, max_wait_ms=2.0):
+        """score_batch(X) takes a (rows, features) array and returns one result per row."""
+        self.score_batch = score_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = self.rows = self.full_batches = self.errors = 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                # a forked child inherits the queue object but not the thread
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        """Queue one feature row; the Future resolves to its score_batch result."""
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((np.asarray(row).ravel(), future))
+        return future
+
+    def __call__(self, row, timeout=None):
+        return self.submit(row).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            futures = [f for _, f in batch]
+            try:
+                results = self.score_batch(np.vstack([row for row, _ in batch]))
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            except Exception as e:
+                self.errors += 1
+                for future in futures:
+                    future.set_exception(e)
+            self.batches += 1
+            self.rows += len(batch)
+            self.full_batches += len(batch) == self.max_batch
+
+    def depth(self):
+        """Rows waiting for the scoring thread."""
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": self.rows / self.batches if self.batches else 0.0,
+            "full_batches": self.full_batches,
+            "errors": self.errors,
+            "queued": self.depth(),
+        }
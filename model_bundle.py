@@ -0,0 +1,142 @@
+# model_bundle.py
+"""
+One fused, memory-mappable inference artifact replacing the four joblib
+pickles, three JSON files and train_recs.csv the app loads at startup.
+
+Layout of a bundle directory (default models/bundle/):
+
+    meta.json               columns, label map, mechanism names, shapes
+    affine_scale.npy        imputer + scaler folded into x * scale + offset,
+    affine_offset.npy         with NaNs replaced by affine_fill
+    affine_fill.npy
+    forest_<array>.npy      FlatForest node arrays (see forest.py)
+    knn_reference.npy       matrix the recommendation kNN was fit on
+    mech_<array>.npy        MechanismTable arrays (see mechanisms.py)
+
+Everything is a raw .npy file so load_bundle(mmap=True) maps it read-only
+instead of unpickling; the pages are shared by every process that maps the
+same files.
+
+Build one from the current models/ and data/ with `python model_bundle.py`
+(retrain_models.py also writes it after training).
+"""
+import json
+import os
+
+import numpy as np
+
+from forest import FlatForest
+from mechanisms import MechanismTable
+from neighbor_index import build_index, load_reference
+
+BUNDLE_FORMAT = 1
+
+
+def _save(path, name, array):
+    np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+
+
+def write_bundle(path, imputer, scaler, rf_model, knn_reference, feature_columns,
+                 rec_feature_columns, label_map, mechanism_table):
+    os.makedirs(path, exist_ok=True)
+
+    # (where(isnan(x), mean, x) - mu) / sigma  ==  x * scale + offset, NaN -> fill
+    scale = 1.0 / scaler.scale_
+    offset = -scaler.mean_ * scale
+    _save(path, "affine_scale", scale)
+    _save(path, "affine_offset", offset)
+    _save(path, "affine_fill", imputer.statistics_ * scale + offset)
+
+    forest = FlatForest.from_sklearn(rf_model)
+    for name, array in forest.arrays().items():
+        _save(path, "forest_" + name, array)
+    _save(path, "knn_reference", knn_reference)
+    for name, array in mechanism_table.arrays().items():
+        _save(path, "mech_" + name, array)
+
+    meta = {
+        "format": BUNDLE_FORMAT,
+        "feature_columns": list(feature_columns),
+        "rec_feature_columns": list(rec_feature_columns),
+        "label_map": {str(k): v for k, v in label_map.items()},
+        "forest_max_depth": forest.max_depth,
+        "mechanism_names": mechanism_table.names,
+        "mechanism_width": mechanism_table.width,
+        "mechanism_strip": mechanism_table.strip,
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+
+class InferenceBundle:
+    def __init__(self, path, mmap=True):
+        self.path = path
+        mode = "r" if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode=mode)
+
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["format"] != BUNDLE_FORMAT:
+            raise ValueError(f"unsupported bundle format {meta['format']} in {path}")
+
+        self.feature_columns = meta["feature_columns"]
+        self.rec_feature_columns = meta["rec_feature_columns"]
+        self.label_map = meta["label_map"]
+        self.scale = load("affine_scale")
+        self.offset = load("affine_offset")
+        self.fill = load("affine_fill")
+        self.forest = FlatForest(*(load("forest_" + name) for name in FlatForest.ARRAYS),
+                                 max_depth=meta["forest_max_depth"])
+        self.knn_reference = load("knn_reference")
+        self.mechanism_table = MechanismTable.from_arrays(
+            meta["mechanism_names"], *(load("mech_" + name) for name in ("counts", "first", "success")),
+            width=meta["mechanism_width"], strip=meta["mechanism_strip"])
+
+    def transform(self, X):
+        """Impute + scale in one pass."""
+        Z = np.asarray(X, dtype=np.float64) * self.scale + self.offset
+        nan = np.isnan(Z)
+        if nan.any():
+            Z[nan] = np.broadcast_to(self.fill, Z.shape)[nan]
+        return Z
+
+    def predict_proba(self, X):
+        return self.forest.predict_proba(self.transform(X))
+
+    def neighbor_index(self, kind="exact"):
+        return build_index(kind, reference=self.knn_reference)
+
+
+def load_bundle(path, mmap=True):
+    return InferenceBundle(path, mmap=mmap)
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+
+    HERE = os.path.dirname(os.path.abspath(__file__))
+    MODELS = os.path.join(HERE, "models")
+    with open(os.path.join(MODELS, "feature_columns.json")) as f:
+        feature_columns = json.load(f)
+    with open(os.path.join(MODELS, "rec_feature_columns.json")) as f:
+        rec_feature_columns = json.load(f)
+    with open(os.path.join(MODELS, "label_map.json")) as f:
+        label_map = json.load(f)
+    train_recs = pd.read_csv(os.path.join(HERE, "data", "train_recs.csv"))
+    train_recs["Mechanisms"] = train_recs["Stress Coping Mechanisms"].str.split(",")
+
+    write_bundle(
+        os.path.join(MODELS, "bundle"),
+        imputer=joblib.load(os.path.join(MODELS, "imputer.joblib")),
+        scaler=joblib.load(os.path.join(MODELS, "scaler.joblib")),
+        rf_model=joblib.load(os.path.join(MODELS, "rf_model.joblib")),
+        knn_reference=load_reference(MODELS),
+        feature_columns=feature_columns,
+        rec_feature_columns=rec_feature_columns,
+        label_map=label_map,
+        mechanism_table=MechanismTable.from_train_recs(train_recs),
+    )
+    print("Wrote models/bundle/")
@@ -0,0 +1,481 @@
+# model_registry.py
+"""
+Model versions the app can switch between without restarting.
+
+ModelSet holds every artifact one version serves with - label map,
+feature encoder, classifier, kNN index and mechanism table - and is never
+changed after it is built. Request code takes one ModelSet at the start of
+a request and uses only that, so a request that is in flight during a swap
+finishes on the version it started with.
+
+A registry directory (e.g. models/registry) holds one model bundle
+(model_bundle.py layout) per version plus a pointer to the active one:
+
+    versions/<version>/     a bundle, written by publish()
+    ACTIVE                  the active version's name
+
+ModelRegistry serves the active version and watches ACTIVE from a
+background thread. When it names a different version, the thread loads it
+(memory-mapped), runs a smoke batch through it and, if that passes,
+replaces the served ModelSet with one assignment. A version that fails to
+load or validate is logged and skipped, and the old one keeps serving; it
+is tried again after a backoff, or as soon as its files change.
+The thread is started on first use and again after a fork.
+
+    python model_registry.py publish models/bundle        # copy in + activate
+    python model_registry.py activate 20261018-120000     # roll back / forward
+    python model_registry.py list
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from compact_recs import CompactRecs
+from feature_encoder import FeatureEncoder
+from model_bundle import load_bundle
+from neighbor_index import REFERENCE_FILE, build_index, load_reference
+from prediction_cache import artifact_version
+from reference_store import ReferenceSnapshot
+
+log = logging.getLogger(__name__)
+
+ACTIVE = "ACTIVE"
+VERSIONS = "versions"
+
+# run through every candidate version before it is served
+SMOKE_ASSESSMENTS = [
+    {"age": 22, "gpa": 3.5, "study_hours": 25, "social_media": 3, "sleep": 7, "exercise": 5,
+     "family_support": 4, "financial_stress": 2, "peer_pressure": 3, "relationship_stress": 2,
+     "counseling": "No", "diet_quality": 4, "cognitive_distortions": 2, "family_mental_history": "No",
+     "medical_condition": "No", "substance_use": 1, "gender": "Female",
+     "current_mechanisms": ["Exercise", "Reading"]},
+    {"age": 19, "gpa": 2.1, "study_hours": 45, "social_media": 7, "sleep": 4, "exercise": 0,
+     "family_support": 1, "financial_stress": 5, "peer_pressure": 5, "relationship_stress": 4,
+     "counseling": "Yes", "diet_quality": 1, "cognitive_distortions": 5, "family_mental_history": "Yes",
+     "medical_condition": "Yes", "substance_use": 3, "gender": "Male", "current_mechanisms": []},
+    {"age": 27, "gpa": 3.9, "study_hours": 10, "social_media": 1, "sleep": 9, "exercise": 10,
+     "family_support": 5, "financial_stress": 0, "peer_pressure": 0, "relationship_stress": 0,
+     "counseling": "No", "diet_quality": 5, "cognitive_distortions": 0, "family_mental_history": "No",
+     "medical_condition": "No", "substance_use": 0, "gender": "Other", "current_mechanisms": ["Yoga"]},
+]
+
+
+@contextmanager
+def _timed(timings, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = (time.perf_counter() - t0) * 1000
+
+
+class ModelSet:
+    def __init__(self, version, label_map, feature_columns, rec_feature_columns, transform, predict_proba,
+                 knn_index, knn_reference, mechanism_table, **extra):
+        """
+        transform(X) imputes and scales encoded rows, predict_proba(Z) runs the
+        forest on them; extra keeps loader-specific objects (bundle, knn_model,
+        train_recs) as attributes.
+        """
+        self.version = version
+        self.label_map = label_map
+        self.inv_map = {int(k): v for k, v in label_map.items()}
+        self.feature_columns = feature_columns
+        self.rec_feature_columns = rec_feature_columns
+        self.encoder = FeatureEncoder(feature_columns, rec_feature_columns)
+        self.transform = transform
+        self.predict_proba = predict_proba
+        self.knn_index = knn_index
+        self.knn_reference = knn_reference
+        self.mechanism_table = mechanism_table
+        self.reference_store = None
+        self.static_references = ReferenceSnapshot(knn_index, mechanism_table)
+        self.loaded_at = time.time()
+        self.__dict__.update(extra)
+
+    def classify(self, X):
+        """Class probabilities for encoded feature rows (imputer -> scaler -> forest)."""
+        return self.predict_proba(self.transform(X))
+
+    def neighbor_features(self, X):
+        """Encoded rows in the imputed, scaled space the kNN reference rows live in."""
+        return self.encoder.rec_features(self.transform(X))
+
+    def references(self):
+        """Neighbor search + mechanism table to use together for one request."""
+        if self.reference_store is not None:
+            return self.reference_store.snapshot()
+        return self.static_references
+
+
+def load_pickles(base_dir, forest_evaluator="sklearn", neighbor_index="sklearn"):
+    """The joblib pickles, JSON files and data/train_recs.csv under base_dir."""
+    timings = {}
+    # scikit-learn and the pickles are only needed when not serving from a bundle
+    with _timed(timings, "import joblib"):
+        import joblib
+
+        from forest import forest_predictor
+    with _timed(timings, "import sklearn"):
+        # what unpickling the scaler, imputer and forest would import anyway
+        import sklearn.ensemble
+        import sklearn.impute
+        import sklearn.neighbors
+        import sklearn.preprocessing  # noqa: F401
+
+    models = os.path.join(base_dir, "models")
+
+    def load(name):
+        with _timed(timings, name):
+            return joblib.load(os.path.join(models, name))
+
+    scaler = load("scaler.joblib")
+    imputer = load("imputer.joblib")
+    rf_model = load("rf_model.joblib")
+    with _timed(timings, "forest evaluator"):
+        # sklearn (default), flat or auto - see forest.py
+        forest_predict_proba = forest_predictor(rf_model, forest_evaluator)
+    knn_model = load("knn_model.joblib")
+    with _timed(timings, REFERENCE_FILE):
+        knn_reference = load_reference(models)
+
+    def read_json(name):
+        with _timed(timings, name), open(os.path.join(models, name)) as f:
+            return json.load(f)
+
+    with _timed(timings, "train_recs.csv"):
+        # flat arrays (compact_recs.py); the DataFrame is not kept
+        train_recs = CompactRecs.read_csv(os.path.join(base_dir, "data", "train_recs.csv"),
+                                          read_json("rec_feature_columns.json"))
+    with _timed(timings, "mechanism table"):
+        table = train_recs.mechanism_table()
+    with _timed(timings, "neighbor index"):
+        # sklearn (default), exact or ivf - see neighbor_index.py
+        index = build_index(neighbor_index, knn_model, knn_reference)
+    paths = [os.path.join(models, name) for name in (
+        "scaler.joblib", "imputer.joblib", "rf_model.joblib", "knn_model.joblib", REFERENCE_FILE,
+        "label_map.json", "feature_columns.json", "rec_feature_columns.json")]
+    paths.append(os.path.join(base_dir, "data", "train_recs.csv"))
+
+    def transform(X):
+        return scaler.transform(imputer.transform(X))
+
+    return ModelSet(artifact_version(paths), read_json("label_map.json"), read_json("feature_columns.json"),
+                    read_json("rec_feature_columns.json"), transform, forest_predict_proba,
+                    index, knn_reference, table, load_timings=timings,
+                    artifact_paths=paths, bundle=None, knn_model=knn_model, train_recs=train_recs)
+
+
+def load_bundle_dir(path, neighbor_index="exact", mmap=True, version=None):
+    """A model_bundle.py bundle; version defaults to a hash of its files."""
+    timings = {}
+    with _timed(timings, "bundle"):
+        bundle = load_bundle(path, mmap=mmap)
+    paths = [os.path.join(path, name) for name in os.listdir(path)]
+    with _timed(timings, "neighbor index"):
+        # the bundle keeps only the reference matrix, so "sklearn" means exact here
+        index = bundle.neighbor_index(neighbor_index.replace("sklearn", "exact"))
+    return ModelSet(version or artifact_version(paths), bundle.label_map, bundle.feature_columns,
+                    bundle.rec_feature_columns, bundle.transform, bundle.forest.predict_proba,
+                    index, bundle.knn_reference, bundle.mechanism_table, load_timings=timings,
+                    artifact_paths=paths, bundle=bundle, knn_model=None, train_recs=None)
+
+
+def validate(models, assessments=SMOKE_ASSESSMENTS, k=50):
+    """Score a smoke batch end to end; raises ValueError if anything looks wrong."""
+    X, valid, errors = models.encoder.encode_many(assessments)
+    if errors:
+        raise ValueError(f"smoke rows failed to encode: {errors}")
+    probs = np.asarray(models.classify(X))
+    if probs.shape != (len(valid), len(models.inv_map)):
+        raise ValueError(f"classifier returned shape {probs.shape}")
+    if not np.isfinite(probs).all() or not np.allclose(probs.sum(axis=1), 1, atol=1e-6):
+        raise ValueError("classifier probabilities are not finite distributions")
+    refs = models.references()
+    _, idxs = refs.kneighbors(models.neighbor_features(X), n_neighbors=k)
+    if idxs.shape != (len(valid), k) or idxs.min() < 0 or idxs.max() >= len(refs.table.success):
+        raise ValueError("neighbor indices fall outside the mechanism table")
+    recs = refs.table.rank_batch(idxs, [a.get("current_mechanisms", []) for a in assessments])
+    return {"rows": len(valid), "predictions": [models.inv_map[int(p)] for p in probs.argmax(axis=1)],
+            "recommendations": sum(len(r) for r in recs)}
+
+
+# ── registry directory ───────────────────────────────────────────────────────
+
+def list_versions(root):
+    path = os.path.join(root, VERSIONS)
+    if not os.path.isdir(path):
+        return []
+    return sorted(v for v in os.listdir(path) if not v.startswith("."))
+
+
+def active_version(root):
+    try:
+        with open(os.path.join(root, ACTIVE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_fingerprint(root, version):
+    """(name, size, mtime) of every file in a version, to notice it being rewritten; None if it is gone."""
+    path = os.path.join(root, VERSIONS, version)
+    try:
+        return tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                            for entry in os.scandir(path) if entry.is_file()))
+    except FileNotFoundError:
+        return None
+
+
+def activate(root, version):
+    """Point ACTIVE at `version`; running registries pick it up on their next poll."""
+    if version not in list_versions(root):
+        raise ValueError(f"no model version {version!r} in {root}")
+    tmp = os.path.join(root, f".{ACTIVE}.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(root, ACTIVE))
+
+
+def publish(root, bundle_dir, version=None, make_active=True):
+    """Copy a built bundle into the registry as a new version; returns its name."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = os.path.join(root, VERSIONS, version)
+    if os.path.exists(target):
+        raise ValueError(f"model version {version!r} already exists in {root}")
+    # copy under a hidden name first so a half-written version is never listed
+    staging = os.path.join(root, VERSIONS, f".{version}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.copytree(bundle_dir, staging)
+    os.rename(staging, target)
+    if make_active:
+        activate(root, version)
+    return version
+
+
+class ModelRegistry:
+    def __init__(self, root, neighbor_index="exact", poll_interval=10.0, on_load=None,
+                 retry_backoff=60.0, max_backoff=3600.0):
+        """
+        on_load(models), if given, runs on every newly loaded ModelSet
+        before it is validated (e.g. to attach a reference store). A version
+        that fails to load is tried again retry_backoff seconds later,
+        doubling up to max_backoff while it keeps failing, or on the next
+        poll after its files change.
+        """
+        self.root = root
+        self.neighbor_index = neighbor_index
+        self.poll_interval = float(poll_interval)
+        self.on_load = on_load
+        self.retry_backoff = float(retry_backoff)
+        self.max_backoff = float(max_backoff)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.swaps = self.failures = 0
+        self.failed_version = None
+        self.failed_attempts = 0
+        self._failed_fingerprint = None
+        self._retry_at = None
+        self.last_error = None
+        version = active_version(root)
+        if version is None:
+            raise ValueError(f"no active model version in {root}; run `python model_registry.py publish`")
+        self._current = self.load(version)
+
+    def load(self, version):
+        models = load_bundle_dir(os.path.join(self.root, VERSIONS, version), self.neighbor_index,
+                                 mmap=True, version=version)
+        try:
+            if self.on_load is not None:
+                self.on_load(models)
+            models.smoke = validate(models)
+        except Exception:
+            # validate() already started the store's sync thread; a rejected version must not keep it
+            if models.reference_store is not None:
+                models.reference_store.close()
+            raise
+        return models
+
+    def current(self):
+        """The ModelSet to serve this request with; starts the watcher in this process if needed."""
+        self._ensure_thread()
+        return self._current
+
+    def _retry_due(self, version):
+        # a transient failure (half-copied files, an I/O error) must not block the version for good
+        return time.monotonic() >= self._retry_at or \
+            version_fingerprint(self.root, version) != self._failed_fingerprint
+
+    def check(self):
+        """Load, validate and swap to the ACTIVE version if it changed; returns the served ModelSet."""
+        version = active_version(self.root)
+        if version is None or version == self._current.version:
+            return self._current
+        if version == self.failed_version and not self._retry_due(version):
+            return self._current
+        t0 = time.perf_counter()
+        fingerprint = version_fingerprint(self.root, version)
+        try:
+            models = self.load(version)
+        except Exception as e:
+            self.failures += 1
+            attempts = self.failed_attempts + 1 if version == self.failed_version else 1
+            backoff = min(self.retry_backoff * 2 ** (attempts - 1), self.max_backoff)
+            self.failed_version, self.failed_attempts = version, attempts
+            self._failed_fingerprint, self._retry_at = fingerprint, time.monotonic() + backoff
+            self.last_error = f"{type(e).__name__}: {e}"
+            log.exception("Model version %s rejected (attempt %d, next in %.0fs); still serving %s",
+                          version, attempts, backoff, self._current.version)
+            return self._current
+        old, self._current = self._current, models
+        self.swaps += 1
+        self.failed_version = self.last_error = self._failed_fingerprint = self._retry_at = None
+        self.failed_attempts = 0
+        log.info("Swapped model %s -> %s (loaded and validated in %.0fms)",
+                 old.version, version, (time.perf_counter() - t0) * 1000)
+        store = old.reference_store
+        if store is not None:
+            store.close()
+        return models
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check()
+            except Exception:
+                log.exception("Model registry check failed")
+
+    def stats(self):
+        current = self._current
+        return {
+            "version": current.version,
+            "active": active_version(self.root),
+            "versions": list_versions(self.root),
+            "loaded_at": current.loaded_at,
+            "swaps": self.swaps,
+            "failures": self.failures,
+            "failed_version": self.failed_version,
+            "failed_attempts": self.failed_attempts,
+            "retry_in_s": max(0.0, self._retry_at - time.monotonic()) if self._retry_at is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class LazyModels:
+    def __init__(self, load, warm=None):
+        """
+        load() builds what the app serves from (a ModelSet or a
+        ModelRegistry); it runs once, on the first get() or in the warm-up
+        thread, whichever comes first. warm(value), if given, runs after it
+        in the warm-up thread only (e.g. a smoke batch to fault pages in).
+        """
+        self._load = load
+        self._warm = warm
+        self._value = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.state = "not loaded"
+        self.load_ms = self.warm_ms = None
+        self.loaded_at = None
+        self.last_error = None
+
+    @property
+    def ready(self):
+        return self._value is not None
+
+    def get(self):
+        """The loaded value; the first caller loads it, concurrent callers wait for that load."""
+        value = self._value
+        if value is not None:
+            return value
+        with self._lock:
+            if self._value is None:
+                self.state = "loading"
+                t0 = time.perf_counter()
+                try:
+                    self._value = self._load()
+                except Exception as e:
+                    # the next get() tries again
+                    self.state, self.last_error = "failed", f"{type(e).__name__}: {e}"
+                    raise
+                self.load_ms = (time.perf_counter() - t0) * 1000
+                self.loaded_at = time.time()
+                self.state, self.last_error = "ready", None
+                log.info("Models loaded in %.0fms", self.load_ms)
+            return self._value
+
+    def warm_up(self):
+        """Load (and warm) from a background thread unless that is already done or under way."""
+        if self.ready or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._value is None and (self._thread is None or self._pid != os.getpid()):
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run_warm_up, name="model-warm-up", daemon=True)
+                self._thread.start()
+
+    def _run_warm_up(self):
+        try:
+            value = self.get()
+            if self._warm is not None:
+                t0 = time.perf_counter()
+                self._warm(value)
+                self.warm_ms = (time.perf_counter() - t0) * 1000
+        except Exception:
+            log.exception("Model warm-up failed")
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "load_ms": self.load_ms,
+            "warm_ms": self.warm_ms,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage versioned model bundles.")
+    parser.add_argument("--root", default=os.path.join("models", "registry"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="copy a built bundle in as a new version")
+    pub.add_argument("bundle_dir", nargs="?", default=os.path.join("models", "bundle"))
+    pub.add_argument("--version")
+    pub.add_argument("--no-activate", action="store_true")
+    act = sub.add_parser("activate")
+    act.add_argument("version")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        candidate = load_bundle_dir(args.bundle_dir)
+        print(f"Smoke batch: {validate(candidate)}")
+        version = publish(args.root, args.bundle_dir, args.version, not args.no_activate)
+        print(f"Published {version}" + ("" if args.no_activate else " (active)"))
+    elif args.command == "activate":
+        activate(args.root, args.version)
+        print(f"Activated {args.version}")
+    else:
+        active = active_version(args.root)
+        for version in list_versions(args.root):
+            print(("* " if version == active else "  ") + version)
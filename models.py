@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -27,7 +28,7 @@ class Profile(db.Model):
     __tablename__ = 'stress_profiles'  # Add prefix
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('stress_users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('stress_users.id'), nullable=False, index=True)
     profile_name = db.Column(db.String(100), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(20))
@@ -35,9 +36,15 @@ class Profile(db.Model):
     
     # Relationships
     assessments = db.relationship('Assessment', backref='profile', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('ProfileStats', uselist=False, lazy=True, cascade='all, delete-orphan')
+    trend_days = db.relationship('ProfileTrendDay', lazy=True, cascade='all, delete-orphan')
 
 class Assessment(db.Model):
     __tablename__ = 'stress_assessments'  # Add prefix
+    # profile history is always read newest-first for one profile
+    __table_args__ = (
+        db.Index('ix_stress_assessments_profile_created', 'profile_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     profile_id = db.Column(db.Integer, db.ForeignKey('stress_profiles.id'), nullable=False)
@@ -60,7 +67,7 @@ class Assessment(db.Model):
     family_mental_history = db.Column(db.String(10))
     medical_condition = db.Column(db.String(10))
     substance_use = db.Column(db.Integer)
-    current_mechanisms = db.Column(db.Text)  # JSON string
+    current_mechanisms = db.Column(db.Text)  # legacy JSON string, moved to `mechanisms` by db_migrate
     
     # Results
     predicted_stress = db.Column(db.String(20))
@@ -68,6 +75,164 @@ class Assessment(db.Model):
     prob_medium = db.Column(db.Float)
     prob_high = db.Column(db.Float)
     drop_probability = db.Column(db.Float)
-    recommendations = db.Column(db.Text)  # JSON string
+    recommendations = db.Column(db.Text)  # legacy JSON string, moved to `mechanisms` by db_migrate
     
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Recommended and current coping mechanisms, one row each
+    mechanisms = db.relationship('AssessmentMechanism', backref='assessment', lazy=True,
+                                 cascade='all, delete-orphan',
+                                 order_by='(AssessmentMechanism.kind, AssessmentMechanism.position)')
+    
+    @property
+    def recommended(self):
+        return [m for m in self.mechanisms if m.kind == RECOMMENDED]
+    
+    @property
+    def current(self):
+        return [m.mechanism.name for m in self.mechanisms if m.kind == CURRENT]
+    
+    @classmethod
+    def from_fields(cls, fields):
+        """
+        Build an Assessment from column values where current_mechanisms is a
+        list of names and recommendations a list of {mechanism, success_rate}.
+        """
+        fields = dict(fields)
+        current = fields.pop('current_mechanisms', None) or []
+        recommendations = fields.pop('recommendations', None) or []
+        assessment = cls(**fields)
+        assessment.mechanisms = mechanism_rows(current, recommendations)
+        return assessment
+
+class ProfileStats(db.Model):
+    """Running totals over all of a profile's assessments, maintained by trends.py."""
+    __tablename__ = 'stress_profile_stats'
+    
+    profile_id = db.Column(db.Integer, db.ForeignKey('stress_profiles.id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    count_low = db.Column(db.Integer, nullable=False, default=0)
+    count_medium = db.Column(db.Integer, nullable=False, default=0)
+    count_high = db.Column(db.Integer, nullable=False, default=0)
+    ewma_prob_high = db.Column(db.Float)  # exponentially weighted, newest heaviest
+    last_drop_probability = db.Column(db.Float)
+    prev_drop_probability = db.Column(db.Float)
+    last_at = db.Column(db.DateTime)
+
+class ProfileTrendDay(db.Model):
+    """One profile's assessments of one (UTC) day, summed; trends.py rolls these up."""
+    __tablename__ = 'stress_profile_trend_days'
+    
+    profile_id = db.Column(db.Integer, db.ForeignKey('stress_profiles.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    count_low = db.Column(db.Integer, nullable=False, default=0)
+    count_medium = db.Column(db.Integer, nullable=False, default=0)
+    count_high = db.Column(db.Integer, nullable=False, default=0)
+    sum_prob_high = db.Column(db.Float, nullable=False, default=0.0)
+    sum_drop_probability = db.Column(db.Float, nullable=False, default=0.0)
+    last_drop_probability = db.Column(db.Float)
+    last_at = db.Column(db.DateTime)
+
+class RateLimitBucket(db.Model):
+    """One token bucket of rate_limit.DatabaseBucketStore (shared by all workers)."""
+    __tablename__ = 'stress_rate_limits'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    updated = db.Column(db.Float, nullable=False)  # unix time
+
+RECOMMENDED = 'recommended'
+CURRENT = 'current'
+
+class Mechanism(db.Model):
+    __tablename__ = 'stress_mechanisms'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Text, unique=True, nullable=False)
+
+class AssessmentMechanism(db.Model):
+    __tablename__ = 'stress_assessment_mechanisms'
+    
+    assessment_id = db.Column(db.Integer, db.ForeignKey('stress_assessments.id', ondelete='CASCADE'),
+                              primary_key=True)
+    kind = db.Column(db.String(12), primary_key=True)  # RECOMMENDED or CURRENT
+    position = db.Column(db.Integer, primary_key=True)  # order within kind
+    mechanism_id = db.Column(db.Integer, db.ForeignKey('stress_mechanisms.id'), nullable=False, index=True)
+    success_rate = db.Column(db.Float)  # recommended rows only
+    
+    mechanism = db.relationship('Mechanism', lazy='joined')
+
+@db.event.listens_for(Mechanism.__table__, 'after_create')
+@db.event.listens_for(Mechanism.__table__, 'after_drop')
+def _forget_mechanism_ids(*args, **kwargs):
+    global _mechanism_ids
+    _mechanism_ids = {}
+
+# name -> Mechanism.id; after warm-up building an assessment's rows needs no
+# queries. /predict only passes names from mechanisms.MECHANISMS, but legacy
+# rows (db_migrate) may carry anything, so the cache is bounded. Request
+# threads and the write-behind thread share it: it is only ever added to or
+# replaced by a new dict, never cleared in place.
+_mechanism_ids = {}
+_MAX_CACHED_IDS = 1024
+
+def mechanism_ids(names):
+    """
+    {name: id} for mechanism names, inserting the ones not in
+    stress_mechanisms yet. New names are committed on their own connection,
+    so call this before the session has written anything (SQLite would be
+    locked by it).
+    """
+    global _mechanism_ids
+    cache = _mechanism_ids
+    ids, missing = {}, []
+    for name in dict.fromkeys(names):
+        mech_id = cache.get(name)
+        if mech_id is None:
+            missing.append(name)
+        else:
+            ids[name] = mech_id
+    if missing:
+        for mech in Mechanism.query.filter(Mechanism.name.in_(missing)):
+            ids[mech.name] = mech.id
+        for name in missing:
+            if name in ids:
+                continue
+            # own short transaction, so concurrent workers can race on the unique name
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(Mechanism.__table__.insert().values(name=name))
+            except IntegrityError:
+                pass
+            ids[name] = db.session.query(Mechanism.id).filter_by(name=name).scalar()
+        if len(cache) + len(missing) > _MAX_CACHED_IDS:
+            cache = _mechanism_ids = {}
+        cache.update((name, ids[name]) for name in missing)
+    return ids
+
+def recommendations_for(assessment_ids):
+    """
+    {assessment id: [(mechanism, success_rate), ...]} in rank order, from one
+    query returning plain rows; much cheaper to render than loading
+    AssessmentMechanism objects for every card.
+    """
+    rows = (db.session.query(AssessmentMechanism.assessment_id, Mechanism.name.label('mechanism'),
+                             AssessmentMechanism.success_rate)
+            .join(Mechanism, Mechanism.id == AssessmentMechanism.mechanism_id)
+            .filter(AssessmentMechanism.assessment_id.in_(list(assessment_ids)),
+                    AssessmentMechanism.kind == RECOMMENDED)
+            .order_by(AssessmentMechanism.assessment_id, AssessmentMechanism.position))
+    out = {}
+    for row in rows:
+        out.setdefault(row.assessment_id, []).append(row)
+    return out
+
+def mechanism_rows(current, recommendations):
+    ids = mechanism_ids(list(current) + [r['mechanism'] for r in recommendations])
+    rows = [AssessmentMechanism(kind=CURRENT, position=i, mechanism_id=ids[name])
+            for i, name in enumerate(current)]
+    rows += [AssessmentMechanism(kind=RECOMMENDED, position=i, mechanism_id=ids[r['mechanism']],
+                                 success_rate=r['success_rate'])
+             for i, r in enumerate(recommendations)]
+    return rows
\ No newline at end of file
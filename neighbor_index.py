@@ -0,0 +1,192 @@
+# neighbor_index.py
+"""
+Interchangeable nearest-neighbor backends for the recommendation kNN.
+
+Every backend answers kneighbors(X, n_neighbors) -> (distances, indices)
+like sklearn's NearestNeighbors, with indices into the reference matrix the
+kNN model was fit on (i.e. rows of train_recs), nearest first.
+
+    sklearn  the fitted NearestNeighbors from models/knn_model.joblib
+    exact    brute-force top-k with one BLAS matrix product per chunk
+    ivf      inverted-file index: k-means coarse lists, exact re-rank of the
+             n_probe closest lists (approximate)
+
+Pick one with build_index(kind, knn_model, reference); the app reads
+NEIGHBOR_INDEX. The reference matrix is saved next to the kNN pickle as
+knn_reference.npy (see load_reference) rather than read back out of the
+fitted model.
+"""
+import os
+import time
+
+import numpy as np
+
+REFERENCE_FILE = "knn_reference.npy"
+
+# cap on the (query rows x reference rows) distance block ExactIndex holds at once
+_EXACT_BLOCK = 1 << 22
+
+
+def _top_k(d2, k):
+    """Row-wise k smallest of a squared-distance matrix, sorted ascending."""
+    if k < d2.shape[1]:
+        part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(d2.shape[1]), d2.shape).copy()
+    part_d = np.take_along_axis(d2, part, axis=1)
+    order = np.argsort(part_d, axis=1, kind="stable")
+    idx = np.take_along_axis(part, order, axis=1)
+    dist = np.sqrt(np.maximum(np.take_along_axis(part_d, order, axis=1), 0))
+    return dist, idx
+
+
+class NeighborIndex:
+    name = "base"
+
+    def kneighbors(self, X, n_neighbors=50):
+        raise NotImplementedError
+
+
+class SklearnIndex(NeighborIndex):
+    name = "sklearn"
+
+    def __init__(self, knn_model):
+        self.model = knn_model
+
+    def kneighbors(self, X, n_neighbors=50):
+        return self.model.kneighbors(X, n_neighbors=n_neighbors)
+
+
+class ExactIndex(NeighborIndex):
+    """Exact Euclidean top-k: |x|^2 - 2 x.r + |r|^2 via a single GEMM per chunk."""
+    name = "exact"
+
+    def __init__(self, reference):
+        self.reference = np.ascontiguousarray(reference, dtype=np.float64)
+        self.ref_sq = np.einsum("ij,ij->i", self.reference, self.reference)
+
+    def kneighbors(self, X, n_neighbors=50):
+        X = np.asarray(X, dtype=np.float64)
+        dists, idxs = [], []
+        chunk = max(1, _EXACT_BLOCK // len(self.reference))
+        for lo in range(0, len(X), chunk):
+            Q = X[lo:lo + chunk]
+            d2 = Q @ self.reference.T
+            d2 *= -2
+            d2 += self.ref_sq
+            d2 += np.einsum("ij,ij->i", Q, Q)[:, None]
+            d, i = _top_k(d2, n_neighbors)
+            dists.append(d)
+            idxs.append(i)
+        return np.vstack(dists), np.vstack(idxs)
+
+
+class IVFIndex(NeighborIndex):
+    """
+    Approximate index: reference rows are bucketed by their nearest k-means
+    centroid; a query scans only its n_probe closest buckets, widening the
+    probe if those hold fewer than n_neighbors rows.
+    """
+    name = "ivf"
+
+    def __init__(self, reference, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        self.reference = np.ascontiguousarray(reference, dtype=np.float64)
+        n = len(self.reference)
+        self.n_lists = n_lists or max(1, int(np.sqrt(n)))
+        self.n_probe = n_probe
+        self.centroids, assign = self._kmeans(self.reference, self.n_lists, n_iter, seed)
+
+        # inverted lists as one CSR pair: members[offsets[c]:offsets[c + 1]]
+        self.members = np.argsort(assign, kind="stable")
+        self.offsets = np.zeros(self.n_lists + 1, dtype=np.intp)
+        np.cumsum(np.bincount(assign, minlength=self.n_lists), out=self.offsets[1:])
+        self.cent_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        self.ref_sq = np.einsum("ij,ij->i", self.reference, self.reference)
+
+    @staticmethod
+    def _kmeans(R, n_lists, n_iter, seed):
+        rng = np.random.default_rng(seed)
+        C = R[rng.choice(len(R), n_lists, replace=False)].copy()
+        r_sq = np.einsum("ij,ij->i", R, R)
+        for _ in range(n_iter + 1):
+            d2 = r_sq[:, None] - 2 * (R @ C.T) + np.einsum("ij,ij->i", C, C)
+            assign = d2.argmin(axis=1)
+            counts = np.bincount(assign, minlength=n_lists)
+            sums = np.zeros_like(C)
+            np.add.at(sums, assign, R)
+            nonempty = counts > 0
+            C[nonempty] = sums[nonempty] / counts[nonempty, None]
+        return C, assign
+
+    def kneighbors(self, X, n_neighbors=50):
+        X = np.asarray(X, dtype=np.float64)
+        x_sq = np.einsum("ij,ij->i", X, X)
+        cent_d2 = x_sq[:, None] - 2 * (X @ self.centroids.T) + self.cent_sq
+        probe_order = np.argsort(cent_d2, axis=1)
+        sizes = np.diff(self.offsets)
+
+        dists = np.empty((len(X), n_neighbors))
+        idxs = np.empty((len(X), n_neighbors), dtype=np.intp)
+        for r in range(len(X)):
+            n_probe = self.n_probe
+            while n_probe < self.n_lists and sizes[probe_order[r, :n_probe]].sum() < n_neighbors:
+                n_probe *= 2
+            lists = probe_order[r, :n_probe]
+            cand = np.concatenate([self.members[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            d2 = self.ref_sq[cand] - 2 * (self.reference[cand] @ X[r]) + x_sq[r]
+            d, i = _top_k(d2[None, :], n_neighbors)
+            dists[r], idxs[r] = d[0], cand[i[0]]
+        return dists, idxs
+
+
+BACKENDS = {"sklearn": SklearnIndex, "exact": ExactIndex, "ivf": IVFIndex}
+
+
+def load_reference(directory, mmap_mode=None):
+    """The scaled train_recs matrix the kNN in `directory` was fit on."""
+    return np.load(os.path.join(directory, REFERENCE_FILE), mmap_mode=mmap_mode)
+
+
+def build_index(kind, knn_model=None, reference=None, **params):
+    """
+    Build the requested backend over `reference`, the matrix the kNN was fit
+    on. "sklearn" wraps `knn_model` when one is given (no reference needed)
+    and otherwise fits a brute-force NearestNeighbors on the reference.
+    """
+    if kind not in BACKENDS:
+        raise ValueError(f"unknown neighbor index {kind!r}; choose from {sorted(BACKENDS)}")
+    if reference is None and not (kind == "sklearn" and knn_model is not None):
+        raise ValueError(f"the {kind!r} neighbor index needs the reference matrix (see load_reference)")
+    if kind == "sklearn":
+        if knn_model is None:
+            from sklearn.neighbors import NearestNeighbors
+            knn_model = NearestNeighbors(algorithm="brute").fit(reference)
+        return SklearnIndex(knn_model)
+    return BACKENDS[kind](reference, **params)
+
+
+def evaluate(index, exact, queries, k=50):
+    """
+    Recall@k of `index` against `exact` on `queries`, plus single-query
+    latency (p50/p99, microseconds) and batched throughput (queries/s).
+    """
+    _, truth = exact.kneighbors(queries, n_neighbors=k)
+
+    t0 = time.perf_counter()
+    _, found = index.kneighbors(queries, n_neighbors=k)
+    batch_s = time.perf_counter() - t0
+
+    hits = sum(len(np.intersect1d(a, b, assume_unique=True)) for a, b in zip(found, truth))
+    lat = np.empty(min(len(queries), 200))
+    for i in range(len(lat)):
+        t0 = time.perf_counter()
+        index.kneighbors(queries[i:i + 1], n_neighbors=k)
+        lat[i] = time.perf_counter() - t0
+    p50, p99 = np.percentile(lat * 1e6, [50, 99])
+    return {
+        "backend": index.name,
+        "recall_at_k": hits / truth.size,
+        "p50_us": float(p50),
+        "p99_us": float(p99),
+        "batch_qps": len(queries) / batch_s,
+    }
@@ -0,0 +1,104 @@
+# parallel_scoring.py
+"""
+Offline scoring across a process pool, for predict_classification and
+predict_recommendation.
+
+Each worker imports the scoring module once in its initializer (so the
+joblib artifacts are loaded once per worker, from `workdir` exactly as the
+single-process scripts do) and then scores shards of the input. Results
+come back in input order.
+
+    python parallel_scoring.py classify  input.csv predictions.csv --workers 4
+    python parallel_scoring.py recommend test_recs.csv knn_recommendations.csv --workers 4
+
+classify streams the input in --shard-rows chunks with at most two shards
+per worker in flight, so memory stays bounded; recommend needs
+predictions.csv and train_recs.csv in workdir, like recommend() itself.
+"""
+import argparse
+import os
+from collections import deque
+from multiprocessing import get_context
+
+import pandas as pd
+
+_worker = {}
+
+
+def _init_worker(task, workdir, csv_path, m, k):
+    # one core per worker: no forest threads or BLAS pools competing across processes
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    os.chdir(workdir)
+    if task == "classify":
+        import predict_classification
+        predict_classification.rf_model.n_jobs = 1
+        _worker["score"] = predict_classification._classify_frame
+    else:
+        import predict_recommendation
+        preds = predict_recommendation._load_predictions()
+        train = predict_recommendation._load_train(preds)
+        test = predict_recommendation._load_test(csv_path, preds)
+        table = predict_recommendation.mechanism_table(train)
+        _worker["score"] = lambda rows: predict_recommendation._recommend_frame(
+            test.iloc[rows[0]:rows[1]].copy(), train, m, k, table)
+
+
+def _score(shard):
+    return _worker["score"](shard)
+
+
+def _ordered_map(pool, shards, window):
+    """pool.imap with at most `window` shards in flight (imap reads its input eagerly)."""
+    pending = deque()
+    for shard in shards:
+        pending.append(pool.apply_async(_score, (shard,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def iter_parallel(task, csv_path, workers=None, shard_rows=None, workdir=None, m=5, k=50):
+    """Yield result frames for task ("classify" or "recommend") in input order."""
+    workers = workers or os.cpu_count() or 1
+    workdir = os.path.abspath(workdir or os.getcwd())
+    csv_path = os.path.abspath(csv_path)
+    if task == "classify":
+        shard_rows = shard_rows or 20_000
+        shards = pd.read_csv(csv_path, chunksize=shard_rows)
+    elif task == "recommend":
+        shard_rows = shard_rows or 500
+        n = len(pd.read_csv(csv_path, usecols=[0]))
+        shards = ((lo, min(lo + shard_rows, n)) for lo in range(0, n, shard_rows))
+    else:
+        raise ValueError(f"unknown task {task!r}; choose classify or recommend")
+
+    ctx = get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(task, workdir, csv_path, m, k)) as pool:
+        yield from _ordered_map(pool, shards, window=2 * workers)
+
+
+def run_parallel(task, csv_path, out_path=None, **kwargs):
+    """Merge iter_parallel's ordered shards into one frame, or stream them to out_path."""
+    if out_path is None:
+        return pd.concat(list(iter_parallel(task, csv_path, **kwargs)))
+    rows = 0
+    for i, result in enumerate(iter_parallel(task, csv_path, **kwargs)):
+        result.to_csv(out_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        rows += len(result)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score a CSV across a process pool.")
+    parser.add_argument("task", choices=["classify", "recommend"])
+    parser.add_argument("csv_path")
+    parser.add_argument("out_path")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--shard-rows", type=int, default=None)
+    parser.add_argument("--workdir", default=None, help="folder holding the artifacts (default: cwd)")
+    args = parser.parse_args()
+    n = run_parallel(args.task, args.csv_path, args.out_path, workers=args.workers,
+                     shard_rows=args.shard_rows, workdir=args.workdir)
+    print(f"Wrote {n} rows to {args.out_path}")
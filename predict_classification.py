@@ -5,12 +5,15 @@ import joblib
 import json
 import pandas as pd
 import warnings
+from forest import forest_predictor
 
 # ── 1) load artifacts at import time ─────────────────────────────────────────
 HERE            = os.getcwd()   # should be ML_Project folder
 scaler          = joblib.load(os.path.join(HERE, "scaler.joblib"))
 imputer         = joblib.load(os.path.join(HERE, "imputer.joblib"))
 rf_model        = joblib.load(os.path.join(HERE, "rf_model.joblib"))
+# sklearn (default), flat or auto - see forest.py
+predict_proba   = forest_predictor(rf_model, os.environ.get("FOREST_EVALUATOR", "sklearn"))
 
 _raw_label_map  = json.load(open(os.path.join(HERE, "label_map.json")))
 feature_columns = json.load(open(os.path.join(HERE, "feature_columns.json")))
@@ -26,37 +29,32 @@ else:
     inv_map = {int(k): v for k, v in _raw_label_map.items()}
 
 
-def load_and_classify(csv_path: str) -> pd.DataFrame:
-    """
-    1) Read csv_path
-    2) Reconstruct & drop any one-hot dummies of the target
-    3) Drop unused text/ID columns
-    4) Map Yes/No → 0/1
-    5) Select exactly feature_columns → impute → scale → predict_proba
-    6) Return DataFrame with pred_int, pred_label, P_low, P_med, P_high
-    """
-    df = pd.read_csv(csv_path)
+TARGET       = "Stress Level Category"
+YES_NO_COLS  = ["Counseling Attendance",
+                "Family Mental Health History",
+                "Medical Condition"]
+TEXT_ID_COLS = ["Stress Coping Mechanisms", "Student ID", "Unnamed: 0"]
 
+
+def _classify_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Steps 2-7 of load_and_classify on an already-read frame (or chunk)."""
     # 2) if one-hot dummies for the target exist, rebuild & drop them
-    target = "Stress Level Category"
-    dummies = [c for c in df.columns if c.startswith(f"{target}_")]
+    dummies = [c for c in df.columns if c.startswith(f"{TARGET}_")]
     if dummies:
-        df[target] = (
+        df[TARGET] = (
             df[dummies]
               .idxmax(axis=1)
-              .str.replace(f"{target}_", "", regex=False)
+              .str.replace(f"{TARGET}_", "", regex=False)
         )
         df.drop(columns=dummies, inplace=True)
 
     # 3) drop raw text/ID columns
-    for col in ["Stress Coping Mechanisms", "Student ID", "Unnamed: 0"]:
+    for col in TEXT_ID_COLS:
         if col in df.columns:
             df.drop(columns=col, inplace=True)
 
     # 4) map Yes/No → 0/1
-    for col in ["Counseling Attendance",
-                "Family Mental Health History",
-                "Medical Condition"]:
+    for col in YES_NO_COLS:
         if col in df.columns:
             df[col] = df[col].map({"Yes":1, "No":0})
 
@@ -70,7 +68,7 @@ def load_and_classify(csv_path: str) -> pd.DataFrame:
 
     # 6) scale & predict
     Xs    = scaler.transform(X_imp)
-    probs = rf_model.predict_proba(Xs)
+    probs = predict_proba(Xs)
     preds = probs.argmax(axis=1)
 
     # 7) build output DataFrame
@@ -80,4 +78,54 @@ def load_and_classify(csv_path: str) -> pd.DataFrame:
         "P_low"     : probs[:,0],
         "P_med"     : probs[:,1],
         "P_high"    : probs[:,2],
-    })
+    }, index=df.index)
+
+
+def load_and_classify(csv_path: str) -> pd.DataFrame:
+    """
+    1) Read csv_path
+    2) Reconstruct & drop any one-hot dummies of the target
+    3) Drop unused text/ID columns
+    4) Map Yes/No → 0/1
+    5) Select exactly feature_columns → impute → scale → predict_proba
+    6) Return DataFrame with pred_int, pred_label, P_low, P_med, P_high
+    """
+    df = pd.read_csv(csv_path)
+    return _classify_frame(df)
+
+
+def iter_classify(csv_path: str, chunksize: int = 50_000):
+    """
+    Streaming load_and_classify: read csv_path chunksize rows at a time and
+    yield one result DataFrame per chunk (indexed by input row), so peak
+    memory depends on chunksize rather than file size. Only the feature,
+    Yes/No and target-dummy columns are read.
+    """
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for c in header if c in feature_columns or c.startswith(f"{TARGET}_")]
+    missing = [c for c in feature_columns if c not in usecols]
+    if missing:
+        raise KeyError(f"{csv_path} is missing feature columns {missing}")
+    for chunk in pd.read_csv(csv_path, usecols=usecols, chunksize=chunksize):
+        yield _classify_frame(chunk)
+
+
+def classify_to_csv(csv_path: str, out_path: str, chunksize: int = 50_000) -> int:
+    """Stream csv_path through iter_classify into out_path; returns rows written."""
+    rows = 0
+    for i, result in enumerate(iter_classify(csv_path, chunksize)):
+        result.to_csv(out_path, mode="w" if i == 0 else "a", header=(i == 0), index=False)
+        rows += len(result)
+    return rows
+
+
+# when run as script, stream-score a CSV into an output file
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Score a CSV in fixed-size chunks.")
+    parser.add_argument("csv_path")
+    parser.add_argument("out_path", nargs="?", default="predictions.csv")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    args = parser.parse_args()
+    n = classify_to_csv(args.csv_path, args.out_path, args.chunksize)
+    print(f"Wrote {n} rows to {args.out_path}")
@@ -1,73 +1,108 @@
 # predict_recommendation.py
-import os, joblib, json, pandas as pd
+import os, joblib, json, numpy as np, pandas as pd
 from sklearn.neighbors import NearestNeighbors
+from mechanisms import MechanismTable
+from neighbor_index import build_index, load_reference
 
 # ── artifacts live right here ────────────────────────────────────────────────
 HERE          = os.getcwd()
 KNN           = joblib.load(os.path.join(HERE, "knn_model.joblib"))
 FEATURE_COLS  = json.load(open(os.path.join(HERE, "rec_feature_columns.json")))
+INDEX_KIND    = os.environ.get("NEIGHBOR_INDEX", "sklearn")
+# exact/ivf search knn_reference.npy themselves; sklearn only needs the pickle
+REFERENCE     = None if INDEX_KIND == "sklearn" else load_reference(HERE)
+INDEX         = build_index(INDEX_KIND, KNN, REFERENCE)
 
-def recommend(csv_path:str, m:int=5, k:int=50) -> pd.DataFrame:
-    """
-    1) load train_recs + predictions.csv → rebuild train Mechanisms & Success
-    2) load test_recs + predictions.csv → features + Mechanisms + pred_int/P_*
-    3) for each test row, find k neighbors, compute success‐rate per mechanism
-    4) return top‐m new recommendations + drop‐prob
-    """
-    # ── A) train side ─────────────────────────────────────────────────────────
+PRED_COLS     = ["Student_id","pred_int","P_low","P_med","P_high"]
+RANK_CHUNK    = 4096   # rows per neighbor gather, bounds the (rows, k, mechanisms) array
+
+
+def _load_predictions() -> pd.DataFrame:
+    return pd.read_csv("predictions.csv", usecols=PRED_COLS)
+
+
+def _load_train(preds:pd.DataFrame=None) -> pd.DataFrame:
+    """train_recs + predictions.csv → train Mechanisms & Success"""
+    if preds is None:
+        preds = _load_predictions()
     train = pd.read_csv("train_recs.csv")                   # must have Stress Coping Mechanisms
-    train_preds = pd.read_csv("predictions.csv")[[
-        "Student_id","pred_int","P_low","P_med","P_high"
-    ]]
-    train = train.merge(train_preds, on="Student_id", how="left")
+    train = train.merge(preds, on="Student_id", how="left")
     train["Mechanisms"] = train["Stress Coping Mechanisms"].str.split(",")
     # define “success” = ended in Low stress
     train["Success"] = (train["pred_int"] == 0).astype(int)
+    return train
 
-    # ── B) test side ──────────────────────────────────────────────────────────
-    test_recs = pd.read_csv("test_recs.csv")
-    test_preds= pd.read_csv("predictions.csv")[[
-        "Student_id","pred_int","P_low","P_med","P_high"
-    ]]
-    df = test_recs.merge(test_preds, on="Student_id", how="left")
+
+def _load_test(csv_path:str, preds:pd.DataFrame=None) -> pd.DataFrame:
+    """test_recs + predictions.csv → features + Mechanisms + pred_int/P_*"""
+    if preds is None:
+        preds = _load_predictions()
+    test_recs = pd.read_csv(csv_path)
+    df = test_recs.merge(preds, on="Student_id", how="left")
     df["Mechanisms"] = df["Stress Coping Mechanisms"].str.split(",")
+    return df
 
-    # ── C) recommendation helper ───────────────────────────────────────────────
-    def _rec(row):
-        x = row[FEATURE_COLS].values.reshape(1,-1)
-        _, idxs = KNN.kneighbors(x, n_neighbors=k)
-        neigh = train.iloc[idxs[0]]
-        stats = {}
-        for mechs, succ in zip(neigh["Mechanisms"], neigh["Success"]):
-            for mech in mechs:
-                stats.setdefault(mech, {"used":0,"succ":0})
-                stats[mech]["used"] += 1
-                stats[mech]["succ"]  += succ
-        mech_df = pd.DataFrame([
-            {"Mechanism":m, "SuccessRate":v["succ"]/v["used"]}
-            for m,v in stats.items()
-        ])
-        # exclude those they already use
-        already = set(row["Mechanisms"])
-        mech_df = mech_df[~mech_df["Mechanism"].isin(already)]
-        return ",".join(
-            mech_df.sort_values("SuccessRate", ascending=False)
-                  .head(m)["Mechanism"]
-        )
-
-    df["recommendations"] = df.apply(_rec, axis=1)
-
-    # ── D) compute drop probability ────────────────────────────────────────────
-    def _pdrop(r):
-        if r.pred_int == 2:  # High → P_low + P_med
-            return r.P_low + r.P_med
-        if r.pred_int == 1:  # Medium → P_low
-            return r.P_low
-        return 0.0             # Low → 0
-    df["P_category_drop"] = df.apply(_pdrop, axis=1)
+
+def mechanism_table(train:pd.DataFrame) -> MechanismTable:
+    """per-student mechanism incidence + Success, scored over neighbor indices"""
+    # names are used exactly as split (no strip), like the exclusion below
+    return MechanismTable(train["Mechanisms"], train["Success"].values, strip=False)
+
+
+def _top_m(table:MechanismTable, used, rate, seen, already, m:int) -> list:
+    """
+    top-m mechanism names for one row, excluding those they already use, in
+    exactly the order DataFrame.sort_values("SuccessRate", ascending=False)
+    gave over the first-seen mechanism list (pandas' nargsort, unstable ties
+    included)
+    """
+    cand = np.flatnonzero(used > 0)
+    cand = cand[np.argsort(seen[cand])]
+    already = set(already)
+    cand = np.array([j for j in cand if table.names[j] not in already], dtype=np.intp)
+    rates = rate[cand]
+    order = cand[::-1][rates[::-1].argsort(kind="quicksort")][::-1]
+    return [table.names[j] for j in order[:m]]
+
+
+def _recommend_frame(df:pd.DataFrame, train:pd.DataFrame, m:int=5, k:int=50,
+                     table:MechanismTable=None) -> pd.DataFrame:
+    """add recommendations + P_category_drop to loaded test rows"""
+    if table is None:
+        table = mechanism_table(train)
+
+    # ── C) one neighbor query for all rows, success rates over the index matrix
+    recs = []
+    if len(df):
+        _, idxs = INDEX.kneighbors(df[FEATURE_COLS].values, n_neighbors=k)
+        current = df["Mechanisms"].tolist()
+        for lo in range(0, len(idxs), RANK_CHUNK):
+            used, rate, seen = table.scores(idxs[lo:lo + RANK_CHUNK])
+            for r in range(len(used)):
+                recs.append(",".join(_top_m(table, used[r], rate[r], seen[r], current[lo + r], m)))
+    df["recommendations"] = recs
+
+    # ── D) compute drop probability, column-wise ───────────────────────────────
+    # High → P_low + P_med, Medium → P_low, Low → 0
+    df["P_category_drop"] = np.select(
+        [df["pred_int"].values == 2, df["pred_int"].values == 1],
+        [df["P_low"].values + df["P_med"].values, df["P_low"].values],
+        0.0,
+    )
 
     return df
 
+
+def recommend(csv_path:str, m:int=5, k:int=50) -> pd.DataFrame:
+    """
+    1) load train_recs + predictions.csv → rebuild train Mechanisms & Success
+    2) load csv_path + predictions.csv → features + Mechanisms + pred_int/P_*
+    3) find k neighbors for all test rows at once, success‐rate per mechanism
+    4) return top‐m new recommendations + drop‐prob
+    """
+    preds = _load_predictions()
+    return _recommend_frame(_load_test(csv_path, preds), _load_train(preds), m, k)
+
 # when run as script, dump the result
 if __name__ == "__main__":
     out = recommend("test_recs.csv")
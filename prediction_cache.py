@@ -0,0 +1,91 @@
+# prediction_cache.py
+"""
+Bounded LRU cache in front of the model pipeline.
+
+Keys are the encoded feature row (FeatureEncoder output), so resubmitting
+the same answers - even with numbers sent as strings, or a different
+current_mechanisms list - is a hit. Values are whatever the caller stores;
+the app keeps class probabilities and kNN neighbor indices and applies the
+current_mechanisms exclusion fresh on every request.
+
+Every lookup carries the version of the models that would produce the
+value. When it differs from the version the cache was filled under (the
+artifacts were reloaded) the whole cache is dropped first.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+def artifact_version(paths):
+    """Short version token for a set of artifact files, from their sizes and mtimes."""
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        st = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()[:12]
+
+
+class PredictionCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @staticmethod
+    def key(row):
+        return row.tobytes()
+
+    def _check_version(self, version):
+        if version != self.version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.version = version
+
+    def get(self, key, version):
+        with self._lock:
+            self._check_version(version)
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def size(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self.size(),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,192 @@
+# rate_limit.py
+"""
+Per-user token buckets and coalescing of repeated /predict requests.
+
+RateLimiter gives every key (the logged-in user's id) a bucket of `burst`
+tokens refilled at `rate` per second; a request takes one token (a batch
+one per row) or is rejected with the seconds until enough are available.
+A request costing more than `burst` needs a full bucket and leaves it in
+debt, so large batches still go through but count in full against the
+rate. The buckets live in a store with a single take() method:
+
+    MemoryBucketStore     this process only (the default; with N workers a
+                          user gets up to N times the rate)
+    DatabaseBucketStore   one row per key in stress_rate_limits, shared by
+                          every worker through the app's database
+
+Coalescer runs a function once per key (user id + raw request body) among
+requests that arrive together: the first caller runs it, callers with the
+same key that arrive while it runs - or within `window` seconds after it
+finished, which catches double-submits a sync worker serves one after the
+other - get its result instead of running it again. That means one model
+pass and one stored Assessment for the lot. Errors are never handed on:
+/predict shares only 200 responses, and a caller that waited on a failed
+one runs the request itself.
+"""
+import threading
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+class MemoryBucketStore:
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}  # key -> [tokens, updated]
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1.0, now=None):
+        """Take `cost` tokens (at most `burst` need to be there); returns (allowed, seconds until enough)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict_full(rate, burst, now)
+                bucket = self._buckets[key] = [float(burst), now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            need = min(cost, burst)
+            allowed = tokens >= need
+            bucket[0], bucket[1] = tokens - cost if allowed else tokens, now
+        return allowed, 0.0 if allowed else (need - tokens) / rate
+
+    def _evict_full(self, rate, burst, now):
+        # buckets that have refilled completely carry no state
+        for key in [k for k, (tokens, updated) in self._buckets.items()
+                    if tokens + (now - updated) * rate >= burst]:
+            del self._buckets[key]
+
+
+_DIALECT_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class DatabaseBucketStore:
+    def __init__(self, db):
+        self.db = db
+
+    def take(self, key, rate, burst, cost=1.0, now=None):
+        from models import RateLimitBucket
+
+        now = time.time() if now is None else now
+        table = RateLimitBucket.__table__
+        insert = _DIALECT_INSERT[self.db.engine.dialect.name](table)
+        # own transaction, so the request's session is untouched; the insert
+        # takes the write lock (SQLite) and FOR UPDATE the row lock (Postgres)
+        with self.db.engine.begin() as conn:
+            conn.execute(insert.values(key=str(key), tokens=float(burst), updated=now)
+                         .on_conflict_do_nothing(index_elements=["key"]))
+            stored, updated = conn.execute(select(table.c.tokens, table.c.updated)
+                                           .where(table.c.key == str(key)).with_for_update()).one()
+            tokens = min(burst, stored + max(0.0, now - updated) * rate)
+            need = min(cost, burst)
+            allowed = tokens >= need
+            conn.execute(table.update().where(table.c.key == str(key))
+                         .values(tokens=tokens - cost if allowed else tokens, updated=now))
+        return allowed, 0.0 if allowed else (need - tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, store, per_minute=60, burst=20):
+        self.store = store
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.allowed = self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.rate > 0
+
+    def take(self, key, cost=1.0):
+        """(allowed, retry_after seconds) for one request by `key`."""
+        allowed, retry_after = self.store.take(key, self.rate, self.burst, cost)
+        if allowed:
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "per_minute": self.rate * 60,
+            "burst": self.burst,
+            "store": type(self.store).__name__,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "shared", "finished_at")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.finished_at = None
+        self.shared = False
+
+
+class Coalescer:
+    def __init__(self, window=2.0, max_keys=10_000):
+        self.window = float(window)
+        self.max_keys = max_keys
+        self._calls = {}  # key -> _Call, in flight or finished within the window
+        self._lock = threading.Lock()
+        self.leaders = self.coalesced = self.replayed = 0
+
+    def run(self, key, fn, share=None):
+        """
+        fn()'s result, computed once per key among concurrent or back-to-back
+        callers. Only results share(result) accepts (all, without `share`)
+        are handed on; after an exception or a rejected result, callers
+        that were waiting run fn() themselves.
+        """
+        now = time.monotonic()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.finished_at is not None and now - call.finished_at > self.window:
+                call = None
+            if call is None:
+                if len(self._calls) >= self.max_keys:
+                    self._expire(now)
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+            else:
+                leader = False
+                replay = call.finished_at is not None
+        if not leader:
+            call.done.wait()
+            if not call.shared:
+                return fn()
+            with self._lock:
+                if replay:
+                    self.replayed += 1
+                else:
+                    self.coalesced += 1
+            return call.result
+        try:
+            call.result = fn()
+            call.shared = share is None or share(call.result)
+        finally:
+            if not call.shared:
+                with self._lock:
+                    if self._calls.get(key) is call:
+                        del self._calls[key]
+            call.finished_at = time.monotonic()
+            call.done.set()
+        return call.result
+
+    def _expire(self, now):
+        for key in [k for k, c in self._calls.items()
+                    if c.finished_at is not None and now - c.finished_at > self.window]:
+            del self._calls[key]
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "replayed": self.replayed,
+            "tracked": len(self._calls),
+        }
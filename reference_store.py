@@ -0,0 +1,323 @@
+# reference_store.py
+"""
+Recommendation reference set that grows with the assessments we store.
+
+The kNN reference rows start as train_recs (the base index built at
+startup). A background thread polls stress_assessments for rows newer than
+the last one it has seen and appends them to an append-only delta
+segment: their recommendation features (imputed and scaled like the base
+rows and the queries), the coping mechanisms the student reported
+(stress_assessment_mechanisms, kind "current") and an outcome,
+success when the assessment came out Low - the same rule train_recs rows
+are labelled with, except that here the label is the model's prediction.
+
+Searches span both parts: the base index answers as usual, the delta is
+scanned exactly, and the two top-k lists are merged. Once the delta holds
+compact_rows rows the thread compacts: it rebuilds an index of the same
+kind over base + delta (dropping rows whose assessment has since been
+deleted) and swaps it in. No retraining is involved; the classifier and
+the features are unchanged.
+
+Request threads never wait on any of this. Every append or compaction
+publishes a new immutable ReferenceSnapshot (index, mechanism table, delta
+rows) with a single attribute assignment, and a request uses whichever
+snapshot it picked up for both its neighbor search and its mechanism
+ranking, so indices and table always agree. Appends write past the end of
+the arrays earlier snapshots look at, and growing a buffer copies it, so
+published rows are never modified.
+
+Every process (gunicorn worker) polls the database itself, so all of them
+converge on the same rows, whichever worker stored them. The thread is
+started on first use and again after a fork.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select
+
+from mechanisms import MechanismTable, known_mechanisms
+from models import Assessment, AssessmentMechanism, CURRENT, Mechanism
+from neighbor_index import ExactIndex, build_index
+
+log = logging.getLogger(__name__)
+
+# Assessment columns FeatureEncoder reads (the /predict form fields)
+_FORM_COLUMNS = ("age", "gender", "gpa", "study_hours", "social_media", "sleep", "exercise",
+                 "family_support", "financial_stress", "peer_pressure", "relationship_stress",
+                 "counseling", "diet_quality", "cognitive_distortions", "family_mental_history",
+                 "medical_condition", "substance_use")
+
+# base (train_recs) rows have no assessment behind them
+_BASE_ID = -1
+
+
+class ReferenceSnapshot:
+    """
+    One published state of the reference set: `index` covers rows
+    [0, n_indexed), `delta` (exact) the rows [n_indexed, n) appended since,
+    and `table` scores neighbor indices over all n rows.
+    """
+
+    def __init__(self, index, table, n_indexed=None, delta=None, generation=0):
+        self.index = index
+        self.table = table
+        self.n_indexed = n_indexed
+        self.delta = delta
+        self.generation = generation
+
+    @property
+    def n_delta(self):
+        return 0 if self.delta is None else len(self.delta.reference)
+
+    def kneighbors(self, X, n_neighbors=50):
+        dist, idx = self.index.kneighbors(X, n_neighbors=n_neighbors)
+        if self.delta is None:
+            return dist, idx
+        d_dist, d_idx = self.delta.kneighbors(X, n_neighbors=min(n_neighbors, self.n_delta))
+        dist = np.hstack([dist, d_dist])
+        idx = np.hstack([idx, d_idx + self.n_indexed])
+        # stable: on equal distances base rows stay ahead of newer ones
+        order = np.argsort(dist, axis=1, kind="stable")[:, :n_neighbors]
+        return np.take_along_axis(dist, order, axis=1), np.take_along_axis(idx, order, axis=1)
+
+
+class ReferenceStore:
+    def __init__(self, app, db, encoder, transform, index, reference, table, sync_interval=30.0,
+                 compact_rows=2000, chunk_rows=5000, **index_params):
+        """
+        index is the serving index already built over `reference` (the
+        train_recs rows, imputed and scaled) and table its MechanismTable;
+        transform is the model set's imputer + scaler, which stored
+        assessments go through so they land in the same space. Compactions
+        rebuild an index of the same kind with index_params.
+        """
+        self.app = app
+        self.db = db
+        self.encoder = encoder
+        self.transform = transform
+        self.kind = index.name
+        self.index_params = index_params
+        self.sync_interval = float(sync_interval)
+        self.compact_rows = max(1, int(compact_rows))
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.strip = table.strip
+        self.names = list(table.names)
+        self._name_index = dict(table.index)
+        self.width = table.width
+
+        # the shipped knn_model was fit on fewer rows than train_recs holds; the
+        # extra table rows are never returned as neighbors, so they are left out
+        n = min(len(reference), len(table.success))
+        self.n_base = n
+        self._alloc(max(2 * n, 1024), reference.shape[1], len(self.names))
+        self._features[:n] = reference[:n]
+        self._counts[:n] = table.counts[:n]
+        self._first[:n] = table.first[:n]
+        self._success[:n] = table.success[:n]
+        self._ids[:n] = _BASE_ID
+        self._n = self._n_indexed = n
+        self.synced_id = 0
+        self.generation = 0
+        self._index = index
+        self._snapshot = ReferenceSnapshot(index, table, n)
+
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.appended = self.skipped = self.dropped = self.compactions = self.errors = 0
+        self.last_sync_at = None
+        self.last_compact_ms = 0.0
+
+    # ── buffers ──────────────────────────────────────────────────────────────
+
+    def _alloc(self, rows, width, n_mech, copy=0):
+        """(Re)allocate the row buffers, carrying over the first `copy` rows."""
+        features = np.empty((rows, width), dtype=np.float64)
+        counts = np.zeros((rows, n_mech), dtype=np.uint8)
+        first = np.zeros((rows, n_mech), dtype=np.int16)
+        success = np.zeros(rows, dtype=np.uint8)
+        ids = np.empty(rows, dtype=np.int64)
+        if copy:
+            m = self._counts.shape[1]
+            features[:copy] = self._features[:copy]
+            counts[:copy, :m] = self._counts[:copy]
+            first[:copy, :m] = self._first[:copy]
+            success[:copy] = self._success[:copy]
+            ids[:copy] = self._ids[:copy]
+        self._features, self._counts, self._first, self._success, self._ids = \
+            features, counts, first, success, ids
+
+    def _reserve(self, rows):
+        """Room for `rows` more rows and every known mechanism; never writes into published rows."""
+        need = self._n + rows
+        if need > len(self._ids) or len(self.names) > self._counts.shape[1]:
+            self._alloc(max(need, 2 * len(self._ids)), self._features.shape[1], len(self.names) + 8,
+                        copy=self._n)
+
+    # ── snapshots ────────────────────────────────────────────────────────────
+
+    def snapshot(self):
+        """The current ReferenceSnapshot; starts the sync thread in this process if needed."""
+        self._ensure_thread()
+        return self._snapshot
+
+    def _publish(self):
+        n, lo, m = self._n, self._n_indexed, len(self.names)
+        table = MechanismTable.from_arrays(list(self.names), self._counts[:n, :m], self._first[:n, :m],
+                                           self._success[:n], self.width, self.strip)
+        delta = ExactIndex(self._features[lo:n]) if n > lo else None
+        self.generation += 1
+        self._snapshot = ReferenceSnapshot(self._index, table, lo, delta, self.generation)
+
+    # ── sync ─────────────────────────────────────────────────────────────────
+
+    def _fetch(self, after_id):
+        """Up to chunk_rows stored assessments newer than after_id, with their current mechanisms."""
+        session = self.db.session
+        columns = [Assessment.id, Assessment.predicted_stress] + \
+                  [getattr(Assessment, name) for name in _FORM_COLUMNS]
+        rows = session.execute(select(*columns).where(Assessment.id > after_id)
+                               .order_by(Assessment.id).limit(self.chunk_rows)).all()
+        mechanisms = {}
+        if rows:
+            query = (select(AssessmentMechanism.assessment_id, Mechanism.name)
+                     .join(Mechanism, Mechanism.id == AssessmentMechanism.mechanism_id)
+                     .where(AssessmentMechanism.kind == CURRENT,
+                            AssessmentMechanism.assessment_id.between(rows[0].id, rows[-1].id))
+                     .order_by(AssessmentMechanism.assessment_id, AssessmentMechanism.position))
+            for assessment_id, name in session.execute(query):
+                mechanisms.setdefault(assessment_id, []).append(name)
+        return rows, mechanisms
+
+    def _append(self, rows, mechanisms):
+        X, valid, errors = self.encoder.encode_many([row._mapping for row in rows])
+        self.skipped += len(errors)
+        if not valid:
+            return 0
+        # same imputed, scaled space as the base rows and the queries
+        R = self.encoder.rec_features(self.transform(X))
+        mech_lists = []
+        for i in valid:
+            # rows stored before /predict filtered its input may name anything
+            names = known_mechanisms(mechanisms.get(rows[i].id, []))
+            for name in names:
+                if name not in self._name_index:
+                    self._name_index[name] = len(self.names)
+                    self.names.append(name)
+            mech_lists.append(names)
+        self._reserve(len(valid))
+
+        lo = self._n
+        self._features[lo:lo + len(valid)] = R
+        for r, (i, names) in enumerate(zip(valid, mech_lists)):
+            s = lo + r
+            self._ids[s] = rows[i].id
+            self._success[s] = rows[i].predicted_stress == "Low"
+            for pos in range(len(names) - 1, -1, -1):
+                j = self._name_index[names[pos]]
+                self._counts[s, j] += 1
+                self._first[s, j] = pos
+            self.width = max(self.width, len(names))
+        self._n = lo + len(valid)
+        self.appended += len(valid)
+        return len(valid)
+
+    def sync(self):
+        """Append every assessment stored since the last sync, compacting when the delta is full."""
+        with self._lock, self.app.app_context():
+            try:
+                while True:
+                    rows, mechanisms = self._fetch(self.synced_id)
+                    if not rows:
+                        break
+                    if self._append(rows, mechanisms):
+                        self._publish()
+                    self.synced_id = rows[-1].id
+                    if len(rows) < self.chunk_rows:
+                        break
+                if self._n - self._n_indexed >= self.compact_rows:
+                    self._compact()
+            finally:
+                self.db.session.remove()
+            self.last_sync_at = time.time()
+            return self._n - self.n_base
+
+    def _live_ids(self):
+        rows = self.db.session.execute(select(Assessment.id).where(Assessment.id <= self.synced_id))
+        return np.fromiter((i for (i,) in rows), dtype=np.int64)
+
+    def _compact(self):
+        t0 = time.perf_counter()
+        n = self._n
+        keep = (self._ids[:n] == _BASE_ID) | np.isin(self._ids[:n], self._live_ids())
+        if not keep.all():
+            # drop deleted profiles' rows into fresh buffers; published snapshots keep the old ones
+            old = (self._features, self._counts, self._first, self._success, self._ids)
+            kept = int(keep.sum())
+            self._alloc(max(2 * kept, 1024), self._features.shape[1], self._counts.shape[1])
+            for new, arr in zip((self._features, self._counts, self._first, self._success, self._ids), old):
+                new[:kept] = arr[:n][keep]
+            self.dropped += n - kept
+            self._n = n = kept
+        self._index = build_index(self.kind, reference=self._features[:n], **self.index_params)
+        self._n_indexed = n
+        self._publish()
+        self.compactions += 1
+        self.last_compact_ms = (time.perf_counter() - t0) * 1000
+        log.info("Reference set compacted: %d rows (%d from assessments) in %.0fms",
+                 n, n - self.n_base, self.last_compact_ms)
+
+    # ── background thread ────────────────────────────────────────────────────
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="reference-store", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Sync now instead of at the next interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._closed:
+            try:
+                self.sync()
+            except Exception:
+                self.errors += 1
+                log.exception("Reference set sync failed")
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def close(self):
+        """Stop syncing (the store's model version was swapped out); snapshots stay usable."""
+        self._closed = True
+        self._wake.set()
+
+    def stats(self):
+        snap = self._snapshot
+        return {
+            "kind": self.kind,
+            "generation": snap.generation,
+            "base_rows": self.n_base,
+            "indexed_rows": snap.n_indexed,
+            "delta_rows": snap.n_delta,
+            "compact_rows": self.compact_rows,
+            "synced_to_id": self.synced_id,
+            "appended": self.appended,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "compactions": self.compactions,
+            "last_compact_ms": self.last_compact_ms,
+            "last_sync_at": self.last_sync_at,
+            "errors": self.errors,
+        }
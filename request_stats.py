@@ -0,0 +1,89 @@
+# request_stats.py
+"""
+Per-request SQL query count and latency.
+
+Every statement the app sends through SQLAlchemy inside a request is
+counted and timed on flask.g; when the request finishes the totals go into
+a Server-Timing response header (visible in the browser's network panel),
+together with any metrics.py stage timings recorded on g.stage_ms, and
+into per-endpoint running totals served by /health/requests. Requests
+slower than SLOW_REQUEST_MS are logged with their query count, which is
+how N+1 pages show up.
+"""
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if has_request_context() and starts:
+        g.query_count = g.get("query_count", 0) + 1
+        g.query_ms = g.get("query_ms", 0.0) + (time.perf_counter() - starts.pop()) * 1000
+
+
+class RequestStats:
+    def __init__(self, app=None, slow_ms=500):
+        self.slow_ms = slow_ms
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.request_start = time.perf_counter()
+        g.query_count = 0
+        g.query_ms = 0.0
+
+    def _finish(self, response):
+        if "request_start" not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_start) * 1000
+        queries, query_ms = g.query_count, g.query_ms
+        stages = "".join(f", {name};dur={ms:.2f}" for name, ms in g.get("stage_ms", {}).items())
+        response.headers["Server-Timing"] = (
+            f'db;dur={query_ms:.2f};desc="{queries} queries"{stages}, total;dur={total_ms:.2f}')
+        endpoint = request.endpoint or "unknown"
+        with self._lock:
+            s = self.endpoints.setdefault(endpoint, {"requests": 0, "queries": 0, "query_ms": 0.0,
+                                                     "total_ms": 0.0, "max_ms": 0.0})
+            s["requests"] += 1
+            s["queries"] += queries
+            s["query_ms"] += query_ms
+            s["total_ms"] += total_ms
+            s["max_ms"] = max(s["max_ms"], total_ms)
+        if total_ms > self.slow_ms:
+            log.warning("Slow request %s %s: %.1fms, %d queries (%.1fms)",
+                        request.method, request.path, total_ms, queries, query_ms)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    "requests": s["requests"],
+                    "mean_queries": s["queries"] / s["requests"],
+                    "mean_query_ms": s["query_ms"] / s["requests"],
+                    "mean_ms": s["total_ms"] / s["requests"],
+                    "max_ms": s["max_ms"],
+                }
+                for endpoint, s in self.endpoints.items()
+            }
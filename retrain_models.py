@@ -1,121 +1,347 @@
-import pandas as pd
-import numpy as np
-import joblib
+# retrain_models.py
+"""
+Retrain the stress classifier and recommendation kNN and write every
+artifact the app serves (joblib pickles, JSON columns, bundle, registry
+version).
+
+    python retrain_models.py                            # search budget 8, all CPUs
+    python retrain_models.py --budget 40 --time-budget 1800 --jobs 8
+    python retrain_models.py --budget 0                 # fixed default forest, no search
+
+Stages, each timed:
+
+- load: only the columns training needs, as float32, through pyarrow's CSV
+  reader when it is installed
+- search: `budget` random forest candidates (the current defaults first)
+  scored by stratified k-fold accuracy on a process pool; each candidate
+  also reports what it would cost to serve (nodes, one-row latency with
+  the flat evaluator, pickled size). Candidates not started when
+  --time-budget runs out are skipped.
+- fit: the best candidate on the whole training split, plus the kNN over
+  data/train_recs.csv
+- evaluate: held-out accuracy, macro F1, per-row and batch latency
+- save: pickles, bundle and a new registry version
+
+The summary (stage times, every candidate, the chosen model's test
+metrics and artifact sizes) is printed and written to
+models/training_report.json.
+"""
+import argparse
 import json
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import joblib
+import numpy as np
+import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import ParameterSampler, StratifiedKFold, train_test_split
 from sklearn.neighbors import NearestNeighbors
+from sklearn.preprocessing import StandardScaler
 
-print("Loading data...")
-df = pd.read_csv("Mental_Stress_and_Coping_Mechanisms_processed_final.csv")
+from forest import FlatForest
+from mechanisms import MechanismTable
+from model_bundle import write_bundle
+from model_registry import publish
+from neighbor_index import REFERENCE_FILE
 
-# Reconstruct target from dummies
-dummy_cols = [
-    "Stress Level Category_Low",
-    "Stress Level Category_Medium",
-    "Stress Level Category_High"
-]
-df['Stress Level Category'] = (
-    df[dummy_cols]
-      .idxmax(axis=1)
-      .str.replace("Stress Level Category_", "", regex=False)
-)
-
-cols_to_drop = [
-    "Mental Stress Level",
-    *dummy_cols,
-    "Stress Coping Mechanisms",
-    "Unnamed: 0",
-    "Student_id"
-]
-df = df.drop(columns=cols_to_drop, errors="ignore")
-
-# Combine less common genders
-df['Gender_Other'] = (df[['Gender_Agender','Gender_Bigender','Gender_Genderfluid']].sum(axis=1).clip(upper=1))
-
-# Convert social media usage
-df['Social_Media_Usage_per_week'] = df['Social Media Usage (Hours per day)'] * 7
-
-# Calculate Stress_Ratio
-df['Stress_Ratio'] = (
-    (df['Financial Stress'] + df['Peer Pressure'] + df['Relationship Stress']) /
-    (df['Family Support'] + df['Diet Quality'] + df['Physical Exercise (Hours per week)'] + 0.001)
-)
-
-# Select features
-selected_features = [
-    'Age','Academic Performance (GPA)','Study Hours Per Week',
-    'Social_Media_Usage_per_week','Sleep Duration (Hours per night)',
-    'Physical Exercise (Hours per week)','Family Support','Financial Stress',
-    'Peer Pressure','Relationship Stress','Counseling Attendance','Diet Quality',
-    'Cognitive Distortions','Family Mental Health History','Medical Condition',
-    'Substance Use','Gender_Female','Gender_Male','Gender_Other','Stress_Ratio'
+try:
+    import pyarrow  # noqa: F401  (optional: faster CSV parsing)
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+DATA = "Mental_Stress_and_Coping_Mechanisms_processed_final.csv"
+
+DUMMY_COLS = ["Stress Level Category_Low", "Stress Level Category_Medium", "Stress Level Category_High"]
+LABEL_MAP = {'Low': 0, 'Medium': 1, 'High': 2}
+
+SELECTED_FEATURES = [
+    'Age', 'Academic Performance (GPA)', 'Study Hours Per Week',
+    'Social_Media_Usage_per_week', 'Sleep Duration (Hours per night)',
+    'Physical Exercise (Hours per week)', 'Family Support', 'Financial Stress',
+    'Peer Pressure', 'Relationship Stress', 'Counseling Attendance', 'Diet Quality',
+    'Cognitive Distortions', 'Family Mental Health History', 'Medical Condition',
+    'Substance Use', 'Gender_Female', 'Gender_Male', 'Gender_Other', 'Stress_Ratio'
 ]
 
-X = df[selected_features]
-y = df['Stress Level Category']
-
-# Remove outliers
-Q1, Q3 = X['Study Hours Per Week'].quantile([0.25,0.75])
-IQR = Q3 - Q1
-mask = X['Study Hours Per Week'].between(Q1-1.5*IQR, Q3+1.5*IQR)
-X, y = X[mask], y[mask]
-
-# Split data
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.30, random_state=42, stratify=y
-)
-
-print("Training models...")
-
-# Train imputer
-imputer = SimpleImputer(strategy='mean')
-X_train_imp = imputer.fit_transform(X_train)
-
-# Train scaler
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train_imp)
-
-# Train Random Forest
-label_map = {'Low': 0, 'Medium': 1, 'High': 2}
-y_train_encoded = y_train.map(label_map)
-
-rf_model = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=20,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42,
-    n_jobs=-1
-)
-rf_model.fit(X_train_scaled, y_train_encoded)
-
-# Train k-NN for recommendations
-rec_features = selected_features.copy()
-knn_model = NearestNeighbors(n_neighbors=50, metric="euclidean")
-knn_model.fit(X_train_scaled)
-
-print("Saving models...")
-
-# Save all artifacts
-joblib.dump(scaler, "models/scaler.joblib")
-joblib.dump(imputer, "models/imputer.joblib")
-joblib.dump(rf_model, "models/rf_model.joblib")
-joblib.dump(knn_model, "models/knn_model.joblib")
-
-# Save feature columns
-with open("models/feature_columns.json", "w") as f:
-    json.dump(selected_features, f)
-
-with open("models/rec_feature_columns.json", "w") as f:
-    json.dump(rec_features, f)
-
-# Save label map
-with open("models/label_map.json", "w") as f:
-    json.dump({"0": "Low", "1": "Medium", "2": "High"}, f)
-
-print("Done! Models retrained and saved.")
-print(f"Training samples: {len(X_train)}")
-print(f"Test samples: {len(X_test)}")
\ No newline at end of file
+# processed CSV columns the features and label are derived from; everything else is skipped
+SOURCE_COLUMNS = [c for c in SELECTED_FEATURES
+                  if c not in ('Social_Media_Usage_per_week', 'Gender_Other', 'Stress_Ratio')]
+SOURCE_COLUMNS += ['Social Media Usage (Hours per day)', 'Gender_Agender', 'Gender_Bigender',
+                   'Gender_Genderfluid'] + DUMMY_COLS
+
+# the forest the app shipped with; always the first search candidate
+DEFAULT_PARAMS = {"n_estimators": 100, "max_depth": 20, "min_samples_split": 5, "min_samples_leaf": 2,
+                  "max_features": "sqrt"}
+
+SEARCH_SPACE = {
+    "n_estimators": [25, 50, 100, 200],
+    "max_depth": [8, 12, 16, 20, None],
+    "min_samples_split": [2, 5, 10],
+    "min_samples_leaf": [1, 2, 4, 8],
+    "max_features": ["sqrt", "log2", 0.5],
+}
+
+STAGES = {}
+
+
+@contextmanager
+def stage(name):
+    print(f"{name}...", flush=True)
+    t0 = time.perf_counter()
+    yield
+    STAGES[name] = time.perf_counter() - t0
+    print(f"  {name}: {STAGES[name]:.2f}s", flush=True)
+
+
+def load_data(path):
+    """Features and label from the processed CSV, reading only SOURCE_COLUMNS as float32."""
+    df = pd.read_csv(path, usecols=SOURCE_COLUMNS, dtype=dict.fromkeys(SOURCE_COLUMNS, np.float32),
+                     engine=CSV_ENGINE)
+
+    # Reconstruct target from dummies
+    y = (df[DUMMY_COLS].idxmax(axis=1).str.replace("Stress Level Category_", "", regex=False))
+
+    # Combine less common genders
+    df['Gender_Other'] = df[['Gender_Agender', 'Gender_Bigender', 'Gender_Genderfluid']].sum(axis=1).clip(upper=1)
+    # Convert social media usage
+    df['Social_Media_Usage_per_week'] = df['Social Media Usage (Hours per day)'] * 7
+    # Calculate Stress_Ratio
+    df['Stress_Ratio'] = (
+        (df['Financial Stress'] + df['Peer Pressure'] + df['Relationship Stress']) /
+        (df['Family Support'] + df['Diet Quality'] + df['Physical Exercise (Hours per week)'] + 0.001)
+    )
+    X = df[SELECTED_FEATURES]
+
+    # Remove outliers
+    Q1, Q3 = X['Study Hours Per Week'].quantile([0.25, 0.75])
+    IQR = Q3 - Q1
+    mask = X['Study Hours Per Week'].between(Q1 - 1.5 * IQR, Q3 + 1.5 * IQR)
+    return X[mask], y[mask]
+
+
+def preprocess(X_fit, *others):
+    """Fit imputer + scaler on X_fit; returns them and every input transformed."""
+    imputer = SimpleImputer(strategy='mean')
+    scaler = StandardScaler()
+    out = [scaler.fit_transform(imputer.fit_transform(X_fit))]
+    out += [scaler.transform(imputer.transform(X)) for X in others]
+    return imputer, scaler, out
+
+
+def serving_cost(rf_model, X, repeat=200):
+    """Node count, one-row flat-forest latency (p50, us) and pickled size of a fitted forest."""
+    flat = FlatForest.from_sklearn(rf_model)
+    row = X[:1]
+    flat.predict_proba(row)
+    lat = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        flat.predict_proba(row)
+        lat[i] = time.perf_counter() - t0
+    return {
+        "nodes": int(sum(e.tree_.node_count for e in rf_model.estimators_)),
+        "row_latency_us": float(np.median(lat) * 1e6),
+        "pickle_mb": len(pickle.dumps(rf_model, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20,
+    }
+
+
+# ── hyperparameter search (runs in worker processes) ─────────────────────────
+
+_WORKER = {}
+
+
+def _init_worker(X, y, folds):
+    # the training split is sent once per worker, not once per candidate
+    _WORKER.update(X=X, y=y, folds=folds)
+
+
+def _evaluate(candidate, params, seed):
+    X, y, folds = _WORKER["X"], _WORKER["y"], _WORKER["folds"]
+    t0 = time.perf_counter()
+    scores = []
+    for train_idx, val_idx in folds:
+        _, _, (X_tr, X_val) = preprocess(X[train_idx], X[val_idx])
+        model = RandomForestClassifier(random_state=seed, n_jobs=1, **params).fit(X_tr, y[train_idx])
+        scores.append(accuracy_score(y[val_idx], model.predict(X_val)))
+    fit_s = time.perf_counter() - t0
+    return dict(candidate=candidate, params=params, cv_accuracy=float(np.mean(scores)),
+                cv_std=float(np.std(scores)), fit_s=fit_s, **serving_cost(model, X_val))
+
+
+def search(X, y, budget, folds, jobs, time_budget=None, seed=42):
+    """Cross-validate up to `budget` candidates on `jobs` processes; best first."""
+    candidates = [DEFAULT_PARAMS]
+    candidates += [p for p in ParameterSampler(SEARCH_SPACE, n_iter=max(budget - 1, 0) * 3, random_state=seed)
+                   if p != DEFAULT_PARAMS]
+    candidates = [dict(c) for c in {json.dumps(c, sort_keys=True): c for c in candidates}.values()][:budget]
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(X, y))
+    deadline = time.perf_counter() + time_budget if time_budget else None
+
+    results = []
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(X, y, splits)) as pool:
+        pending = {pool.submit(_evaluate, i, params, seed): i for i, params in enumerate(candidates[:jobs])}
+        queued = iter(list(enumerate(candidates))[jobs:])
+        while pending:
+            future = next(as_completed(pending))
+            del pending[future]
+            result = future.result()
+            results.append(result)
+            print(f"  [{result['candidate']:>3}] cv {result['cv_accuracy']:.4f} ± {result['cv_std']:.4f}  "
+                  f"{result['nodes']:>7} nodes  {result['row_latency_us']:7.1f}us  "
+                  f"{result['pickle_mb']:6.1f}MB  {result['params']}", flush=True)
+            if deadline is not None and time.perf_counter() > deadline:
+                continue  # let running candidates finish, start no more
+            nxt = next(queued, None)
+            if nxt is not None:
+                pending[pool.submit(_evaluate, nxt[0], nxt[1], seed)] = nxt[0]
+    skipped = len(candidates) - len(results)
+    if skipped:
+        print(f"  time budget reached, {skipped} candidates skipped")
+    return sorted(results, key=lambda r: (-r["cv_accuracy"], r["row_latency_us"]))
+
+
+def latency(predict_proba, X, repeat=200):
+    """p50/p99 one-row latency (us) and batch rows/s of a predict_proba callable."""
+    lat = np.empty(repeat)
+    for i in range(repeat):
+        row = X[i % len(X)][None, :]
+        t0 = time.perf_counter()
+        predict_proba(row)
+        lat[i] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    predict_proba(X)
+    p50, p99 = np.percentile(lat * 1e6, [50, 99])
+    return {"p50_us": float(p50), "p99_us": float(p99), "batch_rows_per_s": len(X) / (time.perf_counter() - t0)}
+
+
+def dir_size_mb(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path)) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain and publish the stress models.")
+    parser.add_argument("--data", default=DATA)
+    parser.add_argument("--out", default="models", help="directory for the pickles, JSON and bundle")
+    parser.add_argument("--registry", default=os.path.join("models", "registry"),
+                        help="publish the bundle here as the active version ('' to skip)")
+    parser.add_argument("--budget", type=int, default=8, help="forest candidates to cross-validate (0: defaults only)")
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds after which no new candidate starts")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    with stage("load"):
+        X, y = load_data(args.data)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.30, random_state=42, stratify=y
+        )
+        y_train_encoded = y_train.map(LABEL_MAP).values
+        y_test_encoded = y_test.map(LABEL_MAP).values
+        print(f"  {len(X)} rows, {X.memory_usage(deep=True).sum() / 2**20:.1f}MB in memory")
+
+    candidates = []
+    params = DEFAULT_PARAMS
+    if args.budget > 0:
+        with stage("search"):
+            candidates = search(X_train.values, y_train_encoded, args.budget, args.folds,
+                                max(1, args.jobs), args.time_budget)
+            params = candidates[0]["params"]
+            print(f"  best: {params} (cv accuracy {candidates[0]['cv_accuracy']:.4f})")
+
+    with stage("fit"):
+        imputer, scaler, (X_train_scaled, X_test_scaled) = preprocess(X_train.values, X_test.values)
+        rf_model = RandomForestClassifier(random_state=42, n_jobs=-1, **params)
+        rf_model.fit(X_train_scaled, y_train_encoded)
+        # Train k-NN for recommendations. Its rows are the train_recs rows, so a
+        # neighbor index is always a valid row of the mechanism table whatever
+        # the size of the training data
+        rec_features = SELECTED_FEATURES.copy()
+        train_recs = pd.read_csv("data/train_recs.csv")
+        train_recs["Mechanisms"] = train_recs["Stress Coping Mechanisms"].str.split(",")
+        knn_reference = scaler.transform(imputer.transform(train_recs[rec_features].values))
+        knn_model = NearestNeighbors(n_neighbors=50, metric="euclidean")
+        knn_model.fit(knn_reference)
+
+    with stage("evaluate"):
+        pred = rf_model.predict(X_test_scaled)
+        X_test_raw = X_test.values.astype(np.float64)
+        flat = FlatForest.from_sklearn(rf_model)
+        metrics = {
+            "test_accuracy": float(accuracy_score(y_test_encoded, pred)),
+            "test_macro_f1": float(f1_score(y_test_encoded, pred, average="macro")),
+            # the whole serving path per row: imputer -> scaler -> forest
+            "latency_sklearn": latency(lambda X: rf_model.predict_proba(scaler.transform(imputer.transform(X))),
+                                       X_test_raw),
+            "latency_flat": latency(lambda X: flat.predict_proba(scaler.transform(imputer.transform(X))),
+                                    X_test_raw),
+        }
+
+    with stage("save"):
+        out = args.out
+        os.makedirs(out, exist_ok=True)
+        joblib.dump(scaler, os.path.join(out, "scaler.joblib"))
+        joblib.dump(imputer, os.path.join(out, "imputer.joblib"))
+        joblib.dump(rf_model, os.path.join(out, "rf_model.joblib"))
+        joblib.dump(knn_model, os.path.join(out, "knn_model.joblib"))
+        # the matrix it was fit on, so nothing reads it back out of the pickle
+        np.save(os.path.join(out, REFERENCE_FILE), knn_reference)
+        # Save feature columns
+        with open(os.path.join(out, "feature_columns.json"), "w") as f:
+            json.dump(SELECTED_FEATURES, f)
+        with open(os.path.join(out, "rec_feature_columns.json"), "w") as f:
+            json.dump(rec_features, f)
+        # Save label map
+        with open(os.path.join(out, "label_map.json"), "w") as f:
+            json.dump({"0": "Low", "1": "Medium", "2": "High"}, f)
+
+        # Save fused, memory-mappable inference bundle (served with MODEL_BUNDLE=models/bundle)
+        bundle_dir = os.path.join(out, "bundle")
+        write_bundle(
+            bundle_dir, imputer, scaler, rf_model, knn_reference,
+            SELECTED_FEATURES, rec_features, {"0": "Low", "1": "Medium", "2": "High"},
+            MechanismTable.from_train_recs(train_recs)
+        )
+
+        # ...and publish it as the registry's active version: apps serving with
+        # MODEL_REGISTRY=models/registry validate it and swap to it without a restart
+        version = publish(args.registry, bundle_dir) if args.registry else None
+
+    sizes = {name: os.path.getsize(os.path.join(out, name)) / 2**20
+             for name in ("rf_model.joblib", "knn_model.joblib", REFERENCE_FILE, "scaler.joblib", "imputer.joblib")}
+    sizes["bundle"] = dir_size_mb(bundle_dir)
+    report = {
+        "data": args.data,
+        "rows": {"train": len(X_train), "test": len(X_test)},
+        "params": params,
+        "version": version,
+        "stages_s": STAGES,
+        "metrics": metrics,
+        "artifact_mb": sizes,
+        "candidates": candidates,
+    }
+    with open(os.path.join(out, "training_report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\nSummary")
+    print("  stages      " + "  ".join(f"{k} {v:.1f}s" for k, v in STAGES.items()))
+    print(f"  model       {params}")
+    print(f"  test        accuracy {metrics['test_accuracy']:.4f}  macro F1 {metrics['test_macro_f1']:.4f}")
+    for name in ("sklearn", "flat"):
+        lat = metrics["latency_" + name]
+        print(f"  {name:<11} one row p50 {lat['p50_us']:.0f}us p99 {lat['p99_us']:.0f}us  "
+              f"batch {lat['batch_rows_per_s']:.0f} rows/s")
+    print("  artifacts   " + "  ".join(f"{k} {v:.1f}MB" for k, v in sizes.items()))
+    if version:
+        print(f"  published   {version}")
+    print(f"Done! Training samples: {len(X_train)}, test samples: {len(X_test)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# slow_profiler.py
+"""
+Opt-in sampling profiler for slow requests.
+
+While a request runs, a background thread samples the stack of the thread
+serving it every interval_ms (sys._current_frames(), no tracing hooks, so
+the request itself runs at full speed). When the request finishes slower
+than slow_ms its samples are collapsed into distinct stacks, the `top`
+most frequent are logged, and the dump is kept in a ring of the last
+`keep` ones for /health/profiles. Faster requests drop their samples.
+
+Sampling needs the GIL, so each sample steals a little time from request
+threads; at the default 5ms interval that is well under 1% (see
+benchmarks/bench_metrics.py). The sampler sleeps while no request is in
+flight. Enabled with PROFILE_SLOW_MS; started on first use and again after
+a fork.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from flask import g, request
+
+log = logging.getLogger(__name__)
+
+
+def _collapse(frame, root):
+    """Stack as outermost-first entries: "file:function:line" under root, "package/file:function" elsewhere."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename.startswith(root):
+            stack.append(f"{os.path.relpath(code.co_filename, root)}:{code.co_name}:{frame.f_lineno}")
+        else:
+            parent, name = os.path.split(code.co_filename)
+            stack.append(f"{os.path.basename(parent)}/{name}:{code.co_name}")
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+class SlowRequestProfiler:
+    def __init__(self, app=None, slow_ms=500, interval_ms=5, top=5, keep=20, root=None):
+        self.slow_ms = float(slow_ms)
+        self.interval = float(interval_ms) / 1000
+        self.top = int(top)
+        self.root = root or os.path.dirname(os.path.abspath(__file__))
+        self.profiles = deque(maxlen=keep)
+        self._active = {}  # thread ident -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._busy = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.samples = self.dumps = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._begin)
+        # teardown, unlike after_request, also runs when the view raised, so
+        # the thread's entry never outlives its request
+        app.teardown_request(self._end)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="slow-profiler", daemon=True)
+                self._thread.start()
+
+    def _begin(self):
+        self._ensure_thread()
+        g.profile_start = time.perf_counter()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+        self._busy.set()
+
+    def _end(self, exc=None):
+        with self._lock:
+            counts = self._active.pop(threading.get_ident(), None)
+            if not self._active:
+                self._busy.clear()
+        if counts is None or "profile_start" not in g:
+            return
+        total_ms = (time.perf_counter() - g.profile_start) * 1000
+        if total_ms > self.slow_ms and counts:
+            self._dump(request.method, request.path, total_ms, counts)
+
+    def _dump(self, method, path, total_ms, counts):
+        n = sum(counts.values())
+        top = [{"samples": c, "share": c / n, "stack": list(stack)} for stack, c in counts.most_common(self.top)]
+        self.profiles.append({"method": method, "path": path, "total_ms": total_ms, "samples": n,
+                              "interval_ms": self.interval * 1000, "at": time.time(), "top": top})
+        self.dumps += 1
+        log.warning("Slow request %s %s: %.1fms, %d samples; top stacks:\n%s", method, path, total_ms, n,
+                    "\n".join(f"  {t['share']:5.1%}  {' > '.join(t['stack'][-6:])}" for t in top))
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, counts in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        counts[_collapse(frame, self.root)] += 1
+                        self.samples += 1
+            del frames
+
+    def stats(self):
+        return {
+            "slow_ms": self.slow_ms,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "dumps": self.dumps,
+            "profiles": list(self.profiles),
+        }
@@ -56,6 +56,36 @@ def test_local():
         print(f"ERROR: {str(e)}")
         return False
 
+def test_batch():
+    """Test the batch prediction endpoint running on localhost"""
+    url = "http://localhost:5000/predict/batch"
+    
+    try:
+        response = requests.post(url, json={"assessments": [test_data, test_data]})
+        
+        if response.status_code == 200:
+            results = response.json()["results"]
+            ok = [r.get("index") for r in results] == [0, 1] and \
+                all("error" not in r and r.get("prediction") in ("Low", "Medium", "High") for r in results)
+            if not ok:
+                print(f"ERROR: unexpected batch results: {results}")
+                return False
+            print(f"SUCCESS: {len(results)} batch predictions received")
+            for result in results:
+                print(f"{result['index']}. {result['prediction']} ({len(result['recommendations'])} recommendations)")
+            return True
+        else:
+            print(f"ERROR: Status code {response.status_code}")
+            print(response.text)
+            return False
+            
+    except requests.exceptions.ConnectionError:
+        print("ERROR: Could not connect to server. Make sure Flask app is running.")
+        return False
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        return False
+
 def test_health():
     """Test the health endpoint"""
     url = "http://localhost:5000/health"
@@ -82,8 +112,11 @@ if __name__ == "__main__":
     print("\n2. Testing prediction endpoint...")
     predict_ok = test_local()
     
+    print("\n3. Testing batch prediction endpoint...")
+    batch_ok = test_batch()
+    
     print("\n" + "=" * 50)
-    if health_ok and predict_ok:
+    if health_ok and predict_ok and batch_ok:
         print("All tests passed!")
     else:
         print("Some tests failed. Check the output above.")
@@ -0,0 +1,40 @@
+# test_forest.py
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+from forest import FlatForest, forest_predictor
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    X, y = make_classification(n_samples=600, n_features=12, n_informative=6, n_classes=3, random_state=0)
+    rf = RandomForestClassifier(n_estimators=25, max_depth=10, random_state=0).fit(X, y)
+    rng = np.random.default_rng(1)
+    # rows the forest was fit on, fresh rows, and rows sitting exactly on split thresholds
+    flat = FlatForest.from_sklearn(rf)
+    on_split = X[:50].copy()
+    inner = flat.left != np.arange(len(flat.left))
+    on_split[np.arange(50), flat.feature[inner][:50]] = flat.threshold[inner][:50]
+    return rf, np.vstack([X, rng.normal(size=(400, 12)) * 2, on_split])
+
+
+def test_flat_forest_matches_sklearn(fitted):
+    rf, X = fitted
+    expected = rf.predict_proba(X)
+    got = FlatForest.from_sklearn(rf).predict_proba(X)
+    assert got.shape == expected.shape
+    assert np.allclose(got, expected, rtol=0, atol=1e-12)
+    assert (got.argmax(axis=1) == expected.argmax(axis=1)).all()
+
+
+def test_forest_predictor_evaluators_agree(fitted):
+    rf, X = fitted
+    expected = rf.predict_proba(X)
+    for evaluator in ("flat", "auto"):
+        predict_proba = forest_predictor(rf, evaluator, flat_max_rows=100)
+        assert np.allclose(predict_proba(X), expected, rtol=0, atol=1e-12)
+        assert np.allclose(predict_proba(X[:1]), expected[:1], rtol=0, atol=1e-12)
+    with pytest.raises(ValueError):
+        forest_predictor(rf, "gpu")
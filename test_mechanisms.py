@@ -0,0 +1,81 @@
+# test_mechanisms.py
+import os
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+import models
+from mechanisms import MECHANISMS, MechanismTable, known_mechanisms
+from models import Mechanism, db, mechanism_ids
+
+TRAIN_RECS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "train_recs.csv")
+
+
+def legacy_rank(train_recs, neighbor_idx, current_mechanisms, m=5):
+    """The per-request dict scoring get_recommendations used before MechanismTable."""
+    neighbors = train_recs.iloc[neighbor_idx]
+    stats = {}
+    for mechs, stress_level in zip(neighbors["Mechanisms"], neighbors["Stress Level Category"]):
+        success = 1 if stress_level == "Low" else 0
+        for mech in mechs:
+            mech = mech.strip()
+            if mech not in stats:
+                stats[mech] = {"used": 0, "success": 0}
+            stats[mech]["used"] += 1
+            stats[mech]["success"] += success
+    mech_list = [{"mechanism": k, "success_rate": v["success"] / v["used"]} for k, v in stats.items()]
+    current_set = set(c.strip() for c in current_mechanisms)
+    mech_list = [x for x in mech_list if x["mechanism"] not in current_set]
+    mech_list.sort(key=lambda x: x["success_rate"], reverse=True)
+    return mech_list[:m]
+
+
+def test_table_ranks_like_the_legacy_loop_on_train_recs():
+    train_recs = pd.read_csv(TRAIN_RECS)
+    train_recs["Mechanisms"] = train_recs["Stress Coping Mechanisms"].str.split(",")
+    table = MechanismTable.from_train_recs(train_recs)
+
+    rng = np.random.default_rng(0)
+    idx = np.array([rng.choice(len(train_recs), 50, replace=False) for _ in range(300)])
+    current = [list(rng.choice(MECHANISMS, rng.integers(0, 3), replace=False)) for _ in range(len(idx))]
+    expected = [legacy_rank(train_recs, i, c) for i, c in zip(idx, current)]
+    assert [table.rank(i, c) for i, c in zip(idx, current)] == expected
+    assert table.rank_batch(idx, current) == expected
+    # equal success rates are common at k=50; they must keep the legacy order
+    assert any(len({r["success_rate"] for r in row}) < len(row) for row in expected)
+
+
+def test_ties_keep_first_seen_order():
+    # every mechanism succeeds, so only the order they are met in decides
+    table = MechanismTable([["B", " A"], ["A"], ["C", "B"]], [1, 1, 1])
+    assert [r["mechanism"] for r in table.rank([2, 0, 1], [])] == ["C", "B", "A"]
+    assert [r["mechanism"] for r in table.rank([0, 2, 1], [])] == ["B", "A", "C"]
+    assert [r["mechanism"] for r in table.rank([1, 2, 0], ["C"])] == ["A", "B"]
+
+
+def test_known_mechanisms_keeps_only_the_vocabulary():
+    assert known_mechanisms([" yoga", "YOGA", "Reading", "x" * 500, 42, None, "made up"]) == ["Yoga", "Reading"]
+    assert known_mechanisms(list(MECHANISMS)) == list(MECHANISMS)
+    # a bare string or anything else that is not a list names nothing
+    assert known_mechanisms("Yoga") == []
+    assert known_mechanisms({"Yoga": 1}) == []
+
+
+def test_mechanism_id_cache_is_bounded(tmp_path, monkeypatch):
+    app = Flask("test")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'ids.db'}"
+    db.init_app(app)
+    monkeypatch.setattr(models, "_MAX_CACHED_IDS", 8)
+    with app.app_context():
+        db.create_all()
+        first = mechanism_ids(["legacy 0.0", "legacy 0.1", "legacy 0.2"])
+        for i in range(1, 5):
+            ids = mechanism_ids([f"legacy {i}.{j}" for j in range(3)])
+            assert sorted(ids) == [f"legacy {i}.{j}" for j in range(3)]
+            assert len(models._mechanism_ids) <= 8
+        assert Mechanism.query.count() == 15
+        # each call gets its own mapping: resetting the full cache does not empty earlier results
+        assert sorted(first) == ["legacy 0.0", "legacy 0.1", "legacy 0.2"]
+        assert mechanism_ids(["legacy 0.1"]) == {"legacy 0.1": first["legacy 0.1"]}
+        db.drop_all()
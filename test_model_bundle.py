@@ -0,0 +1,49 @@
+# test_model_bundle.py
+"""
+A bundle written by write_bundle and memory-mapped back must serve what the
+pickles it was built from serve: the folded affine transform in place of
+imputer + scaler, FlatForest in place of the forest, the saved reference
+matrix and mechanism table in place of the kNN and train_recs.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import MODELS, TRAIN_RECS
+from model_registry import load_bundle_dir, load_pickles
+
+
+@pytest.fixture(scope="module")
+def rows():
+    with open(os.path.join(MODELS, "feature_columns.json")) as f:
+        columns = json.load(f)
+    X = pd.read_csv(TRAIN_RECS, nrows=500)[columns].values.astype(np.float64)
+    # missing answers go through the imputer on one path and affine_fill on the other
+    rng = np.random.default_rng(0)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X
+
+
+def test_bundle_matches_pickles(model_dir, bundle_dir, rows):
+    pickles = load_pickles(model_dir)
+    bundle = load_bundle_dir(bundle_dir, neighbor_index="exact", mmap=True)
+    assert isinstance(bundle.knn_reference, np.memmap)
+
+    assert np.allclose(bundle.transform(rows), pickles.transform(rows), rtol=0, atol=1e-9)
+    probs = bundle.classify(rows)
+    assert np.allclose(probs, pickles.classify(rows), rtol=0, atol=1e-9)
+    assert (probs.argmax(axis=1) == pickles.classify(rows).argmax(axis=1)).all()
+
+    current = [["Yoga"], [], ["Reading", "Exercise"]] * (len(rows) // 3) + [[]] * (len(rows) % 3)
+    recs = []
+    for m in (pickles, bundle):
+        refs = m.references()
+        dist, idx = refs.kneighbors(m.neighbor_features(rows), n_neighbors=50)
+        recs.append((dist, idx, refs.table.rank_batch(idx, current)))
+    (p_dist, p_idx, p_recs), (b_dist, b_idx, b_recs) = recs
+    assert np.allclose(b_dist, p_dist, rtol=0, atol=1e-9)
+    assert (b_idx == p_idx).all()
+    assert b_recs == p_recs
@@ -0,0 +1,67 @@
+# test_model_registry.py
+"""
+ModelRegistry swapping between bundle versions in a temporary registry,
+with a ReferenceStore attached to every loaded ModelSet like the app does.
+"""
+import os
+import shutil
+import threading
+
+import numpy as np
+import pytest
+from flask import Flask
+
+from model_registry import ModelRegistry, activate, publish
+from models import db
+from reference_store import ReferenceStore
+
+
+def reference_store_threads():
+    return [t for t in threading.enumerate() if t.name == "reference-store"]
+
+
+@pytest.fixture
+def registry_root(tmp_path, bundle_dir):
+    root = str(tmp_path / "registry")
+    publish(root, bundle_dir, version="good")
+    # a version that loads but fails validation after its reference store has
+    # started: its kNN answers with rows past the end of the mechanism table
+    bad = str(tmp_path / "bad")
+    shutil.copytree(bundle_dir, bad)
+    reference = np.load(os.path.join(bad, "knn_reference.npy"))
+    np.save(os.path.join(bad, "knn_reference.npy"), np.vstack([reference + 1000, reference]))
+    publish(root, bad, version="bad", make_active=False)
+    return root
+
+
+@pytest.fixture
+def attach_store(tmp_path):
+    app = Flask("test")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'refs.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+    def attach(m):
+        m.reference_store = ReferenceStore(app, db, m.encoder, m.transform, m.knn_index, m.knn_reference,
+                                           m.mechanism_table, sync_interval=0.05)
+
+    yield attach
+    with app.app_context():
+        db.drop_all()
+
+
+def test_rejected_version_does_not_leak_its_reference_store(registry_root, attach_store):
+    registry = ModelRegistry(registry_root, on_load=attach_store, retry_backoff=0.0)
+    before = len(reference_store_threads())
+
+    activate(registry_root, "bad")
+    for attempt in range(1, 4):
+        assert registry.check().version == "good"
+        assert registry.failed_attempts == attempt
+    assert "mechanism table" in registry.last_error
+    for t in reference_store_threads():
+        t.join(timeout=0.5)
+    assert len(reference_store_threads()) == before
+    registry._current.reference_store.close()
+
@@ -0,0 +1,100 @@
+# test_predict_batch.py
+"""
+/predict/batch through Flask's test client, scoring with load_pickles on the
+conftest artifacts: per-row results and who may save to which profile.
+"""
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "batch.db"))
+os.environ.setdefault("MODEL_LOADING", "lazy")
+
+import app as app_module
+from model_registry import load_pickles
+from models import Assessment, Profile, User, db
+from rate_limit import MemoryBucketStore, RateLimiter
+
+app = app_module.app
+
+ASSESSMENT = {
+    "age": 22, "gpa": 3.5, "study_hours": 25, "social_media": 3, "sleep": 7, "exercise": 5,
+    "family_support": 4, "financial_stress": 2, "peer_pressure": 3, "relationship_stress": 2,
+    "counseling": "No", "diet_quality": 4, "cognitive_distortions": 2, "family_mental_history": "No",
+    "medical_condition": "No", "substance_use": 1, "gender": "Female",
+    "current_mechanisms": ["Exercise", "Reading"],
+}
+
+
+def make_user(name):
+    user = User.query.filter_by(email=f"{name}@example.com").first()
+    if user is None:
+        user = User(username=name, email=f"{name}@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Profile(user_id=user.id, profile_name=f"{name}'s student"))
+        db.session.commit()
+    return Profile.query.filter_by(user_id=user.id).first().id
+
+
+@pytest.fixture
+def client(model_dir, monkeypatch):
+    app.config["WTF_CSRF_ENABLED"] = False
+    models = load_pickles(model_dir)
+    monkeypatch.setattr(app_module, "current_models", lambda: models)
+    monkeypatch.setattr(app_module, "rate_limiter", RateLimiter(MemoryBucketStore(), per_minute=0))
+    monkeypatch.setattr(app_module, "assessment_writer", None)
+    with app.app_context():
+        db.create_all()
+        mine, theirs = make_user("batch-owner"), make_user("batch-other")
+    client = app.test_client()
+    client.post("/login", data={"email": "batch-owner@example.com", "password": "pw"})
+    return client, mine, theirs
+
+
+def saved_for(profile_id):
+    with app.app_context():
+        return Assessment.query.filter_by(profile_id=profile_id).count()
+
+
+def test_batch_rows_are_checked_one_by_one(client):
+    client, mine, theirs = client
+    before = saved_for(mine)
+    rows = [dict(ASSESSMENT, profile_id=mine),
+            dict(ASSESSMENT, profile_id=str(mine)),
+            dict(ASSESSMENT, profile_id=theirs),
+            dict(ASSESSMENT, profile_id=[mine]),
+            dict(ASSESSMENT, profile_id={"id": mine}),
+            dict(ASSESSMENT, profile_id="12abc"),
+            dict(ASSESSMENT),
+            dict(ASSESSMENT, age="old")]
+    r = client.post("/predict/batch", json=rows)
+    assert r.status_code == 200
+    body = r.get_json()
+    results = body["results"]
+
+    assert [res["index"] for res in results] == list(range(len(rows)))
+    for res in results[:7]:
+        assert res["prediction"] in ("Low", "Medium", "High")
+    assert "error" not in results[0] and "error" not in results[1]
+    assert results[2]["error"] == "Access denied for profile"
+    assert [res["error"] for res in results[3:6]] == ["Invalid profile_id"] * 3
+    assert "error" not in results[6]
+    assert "prediction" not in results[7] and results[7]["error"]
+    assert body["saved"] == 2
+    assert saved_for(mine) == before + 2
+    assert saved_for(theirs) == 0
+
+
+def test_shared_profile_id_may_be_a_string(client):
+    client, mine, theirs = client
+    before = saved_for(mine)
+    r = client.post("/predict/batch", json={"profile_id": str(mine), "assessments": [ASSESSMENT, ASSESSMENT]})
+    assert r.get_json()["saved"] == 2
+    assert saved_for(mine) == before + 2
+
+    r = client.post("/predict/batch", json={"profile_id": theirs, "assessments": [ASSESSMENT]})
+    assert r.get_json()["results"][0]["error"] == "Access denied for profile"
+    assert r.get_json()["saved"] == 0
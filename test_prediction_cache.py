@@ -0,0 +1,56 @@
+# test_prediction_cache.py
+import os
+import tempfile
+
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "cache.db"))
+os.environ.setdefault("MODEL_LOADING", "lazy")
+
+import app as app_module
+from mechanisms import MechanismTable
+from model_registry import SMOKE_ASSESSMENTS, load_pickles
+from prediction_cache import PredictionCache
+from reference_store import ReferenceSnapshot
+
+
+class CountingIndex:
+    def __init__(self, index):
+        self.index, self.name, self.calls = index, index.name, 0
+
+    def kneighbors(self, X, n_neighbors=50):
+        self.calls += 1
+        return self.index.kneighbors(X, n_neighbors=n_neighbors)
+
+
+def test_reference_generation_only_refreshes_neighbors(model_dir, monkeypatch):
+    m = load_pickles(model_dir)
+    forest_calls = []
+    predict_proba = m.predict_proba
+    monkeypatch.setattr(m, "predict_proba", lambda Z: forest_calls.append(len(Z)) or predict_proba(Z))
+    index = CountingIndex(m.knn_index)
+    m.static_references = ReferenceSnapshot(index, m.mechanism_table)
+    cache = PredictionCache(16)
+    monkeypatch.setattr(app_module, "prediction_cache", cache)
+    monkeypatch.setattr(app_module, "micro_batcher", None)
+    X = m.encoder.encode(SMOKE_ASSESSMENTS[0])
+
+    first = app_module.predict_one(X, m)
+    assert app_module.predict_one(X, m) is first
+    assert (len(forest_calls), index.calls, cache.hits) == (1, 1, 1)
+
+    # a reference store publish: new snapshot, new table, same model version
+    t = m.mechanism_table
+    table = MechanismTable.from_arrays(t.names, t.counts, t.first, t.success, t.width, t.strip)
+    m.static_references = ReferenceSnapshot(index, table, generation=1)
+    refreshed = app_module.predict_one(X, m)
+    assert refreshed[0] is first[0] and refreshed[2] is table
+    assert np.array_equal(refreshed[1], first[1])
+    assert (len(forest_calls), index.calls, cache.invalidations) == (1, 2, 0)
+    assert app_module.predict_one(X, m) is refreshed
+    assert index.calls == 2
+
+    # a new model version still starts from an empty cache
+    m.version = "next"
+    app_module.predict_one(X, m)
+    assert (len(forest_calls), cache.invalidations) == (2, 1)
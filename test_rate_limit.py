@@ -0,0 +1,226 @@
+# test_rate_limit.py
+"""
+rate_limit.py on its own and wired into /predict and /predict/batch. The
+route tests replace run_prediction with a counting stand-in, so no model
+is loaded.
+"""
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "rate_limit.db")
+os.environ.setdefault("MODEL_LOADING", "lazy")
+
+import app as app_module
+from models import RateLimitBucket, User, db
+from rate_limit import Coalescer, DatabaseBucketStore, MemoryBucketStore, RateLimiter
+
+app = app_module.app
+
+
+# ── token buckets ────────────────────────────────────────────────────────────
+
+def test_memory_bucket_burst_then_refill():
+    store = MemoryBucketStore()
+    assert [store.take("u", rate=1.0, burst=3, now=0.0)[0] for _ in range(3)] == [True] * 3
+    allowed, retry_after = store.take("u", rate=1.0, burst=3, now=0.0)
+    assert not allowed and retry_after == pytest.approx(1.0)
+    # half a token back after 0.5s, a whole one after 1s
+    assert not store.take("u", rate=1.0, burst=3, now=0.5)[0]
+    assert store.take("u", rate=1.0, burst=3, now=1.0) == (True, 0.0)
+    # never more than the burst, however long the key was idle
+    assert [store.take("u", rate=1.0, burst=3, now=100.0)[0] for _ in range(4)] == [True] * 3 + [False]
+    # other keys have their own bucket
+    assert store.take("v", rate=1.0, burst=3, now=100.0)[0]
+
+
+def test_memory_bucket_cost_larger_than_burst_goes_into_debt():
+    store = MemoryBucketStore()
+    assert store.take("u", rate=1.0, burst=5, cost=12, now=0.0) == (True, 0.0)
+    allowed, retry_after = store.take("u", rate=1.0, burst=5, now=0.0)
+    assert not allowed and retry_after == pytest.approx(8.0)
+    assert store.take("u", rate=1.0, burst=5, now=8.0)[0]
+
+
+def test_memory_bucket_evicts_full_buckets():
+    store = MemoryBucketStore(max_keys=2)
+    store.take("a", rate=1.0, burst=2, now=0.0)
+    store.take("b", rate=1.0, burst=2, now=0.0)
+    store.take("c", rate=1.0, burst=2, now=10.0)
+    assert set(store._buckets) == {"c"}
+
+
+def test_database_bucket_store_is_shared():
+    with app.app_context():
+        db.create_all()
+        RateLimitBucket.query.delete()
+        db.session.commit()
+        # two stores stand for two workers; the second take of a key goes
+        # through ON CONFLICT DO NOTHING and reads the first one's row
+        first, second = DatabaseBucketStore(db), DatabaseBucketStore(db)
+        assert first.take(7, rate=1.0, burst=2, now=1000.0)[0]
+        assert second.take(7, rate=1.0, burst=2, now=1000.0)[0]
+        allowed, retry_after = first.take(7, rate=1.0, burst=2, now=1000.0)
+        assert not allowed and retry_after == pytest.approx(1.0)
+        assert second.take(7, rate=1.0, burst=2, now=1001.0)[0]
+        assert RateLimitBucket.query.count() == 1
+        assert db.session.get(RateLimitBucket, "7").tokens == pytest.approx(0.0)
+
+
+def test_rate_limiter_counts():
+    limiter = RateLimiter(MemoryBucketStore(), per_minute=60, burst=1)
+    assert limiter.take(1)[0]
+    assert not limiter.take(1)[0]
+    assert (limiter.allowed, limiter.rejected) == (1, 1)
+    assert not RateLimiter(MemoryBucketStore(), per_minute=0).enabled
+
+
+# ── coalescing ───────────────────────────────────────────────────────────────
+
+def test_coalescer_shares_concurrent_and_recent_results():
+    coalescer = Coalescer(window=5.0)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return len(calls)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run("k", slow))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == [1] * 4 and len(calls) == 1
+    assert coalescer.run("k", slow) == 1
+    assert (coalescer.leaders, coalescer.coalesced, coalescer.replayed) == (1, 3, 1)
+    assert coalescer.run("other", slow) == 2
+
+
+def test_coalescer_does_not_hand_on_failures():
+    coalescer = Coalescer(window=5.0)
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ValueError("boom")
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            coalescer.run("k", failing)
+    assert len(calls) == 2
+
+    rejected = []
+    for _ in range(2):
+        rejected.append(coalescer.run("r", lambda: ({"error": "bad"}, 400), share=lambda r: r[1] == 200))
+    assert rejected == [({"error": "bad"}, 400)] * 2
+    assert coalescer.coalesced == coalescer.replayed == 0
+
+
+def test_coalescer_waiters_rerun_after_a_failure():
+    coalescer = Coalescer(window=5.0)
+    started = threading.Event()
+    calls = []
+
+    def first():
+        calls.append("first")
+        started.set()
+        time.sleep(0.2)
+        return "bad"
+
+    leader = threading.Thread(target=lambda: coalescer.run("k", first, share=lambda r: r == "ok"))
+    leader.start()
+    started.wait()
+    assert coalescer.run("k", lambda: calls.append("waiter") or "ok", share=lambda r: r == "ok") == "ok"
+    leader.join()
+    assert calls == ["first", "waiter"]
+
+
+# ── /predict and /predict/batch ──────────────────────────────────────────────
+
+@pytest.fixture
+def clients(monkeypatch):
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        db.create_all()
+        if User.query.filter_by(email="limits@example.com").first() is None:
+            user = User(username="limits", email="limits@example.com")
+            user.set_password("pw")
+            db.session.add(user)
+            db.session.commit()
+
+    calls = []
+
+    def run_prediction():
+        data = app_module.request.json
+        calls.append(data)
+        time.sleep(0.05)
+        if data.get("fail"):
+            return {"error": "bad input"}, 400
+        return {"prediction": "Low", "n": len(calls)}, 200
+
+    monkeypatch.setattr(app_module, "run_prediction", run_prediction)
+    monkeypatch.setattr(app_module, "rate_limiter", RateLimiter(MemoryBucketStore(), per_minute=60, burst=3))
+    monkeypatch.setattr(app_module, "predict_coalescer", Coalescer(window=5.0))
+
+    def login():
+        client = app.test_client()
+        client.post("/login", data={"email": "limits@example.com", "password": "pw"})
+        return client
+
+    return login, calls
+
+
+def test_predict_answers_429_with_retry_after(clients):
+    login, calls = clients
+    client = login()
+    assert [client.post("/predict", json={"i": i}).status_code for i in range(3)] == [200] * 3
+    r = client.post("/predict", json={"i": 3})
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert 0 < r.get_json()["retry_after"] <= 1
+    assert len(calls) == 3
+    assert app_module.rate_limiter.rejected == 1
+
+
+def test_batch_rows_count_against_the_same_limit(clients):
+    login, calls = clients
+    client = login()
+    assert client.post("/predict", json={"i": 0}).status_code == 200
+    # three rows against two tokens left: rejected before any scoring
+    r = client.post("/predict/batch", json=[{"i": 1}, {"i": 2}, {"i": 3}])
+    assert r.status_code == 429 and "Retry-After" in r.headers
+    assert app_module.rate_limiter.rejected == 1
+
+
+def test_identical_predicts_are_coalesced(clients, monkeypatch):
+    login, calls = clients
+    monkeypatch.setattr(app_module, "rate_limiter", RateLimiter(MemoryBucketStore(), per_minute=60, burst=10))
+    users = [login() for _ in range(3)]
+    statuses = []
+    threads = [threading.Thread(target=lambda c=c: statuses.append(c.post("/predict", json={"same": 1}).status_code))
+               for c in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert statuses == [200] * 3
+    # a double-submit after the first one finished is replayed too
+    assert users[0].post("/predict", json={"same": 1}).get_json() == {"prediction": "Low", "n": 1}
+    assert len(calls) == 1
+    assert users[0].get("/health/limits").get_json()["coalescing"]["leaders"] == 1
+
+
+def test_failed_predicts_are_not_replayed(clients):
+    login, calls = clients
+    client = login()
+    for _ in range(2):
+        r = client.post("/predict", json={"fail": 1})
+        assert r.status_code == 400
+    assert len(calls) == 2
+    stats = app_module.predict_coalescer.stats()
+    assert stats["replayed"] == stats["coalesced"] == 0
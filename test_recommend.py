@@ -0,0 +1,81 @@
+# test_recommend.py
+"""
+predict_recommendation.py, the offline recommender. It reads its artifacts
+from the working directory, so every test imports it afresh from one.
+"""
+import importlib
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import MODELS, TRAIN_RECS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_recommender(monkeypatch, directory, neighbor_index="sklearn"):
+    monkeypatch.chdir(directory)
+    monkeypatch.setenv("NEIGHBOR_INDEX", neighbor_index)
+    monkeypatch.delitem(sys.modules, "predict_recommendation", raising=False)
+    return importlib.import_module("predict_recommendation")
+
+
+def test_imports_from_the_repo_root(monkeypatch):
+    # the root has knn_model.joblib but no knn_reference.npy: the default
+    # sklearn backend must not need it
+    pr = import_recommender(monkeypatch, BASE_DIR)
+    assert pr.REFERENCE is None and pr.INDEX.name == "sklearn"
+    with pytest.raises(FileNotFoundError):
+        import_recommender(monkeypatch, BASE_DIR, neighbor_index="exact")
+
+
+def legacy_recommend(df, train, knn, feature_cols, m=5, k=50):
+    """The per-row loop recommend() replaced: one kneighbors call and one sort_values per row."""
+    def _rec(row):
+        x = row[feature_cols].values.reshape(1, -1)
+        _, idxs = knn.kneighbors(x, n_neighbors=k)
+        neigh = train.iloc[idxs[0]]
+        stats = {}
+        for mechs, succ in zip(neigh["Mechanisms"], neigh["Success"]):
+            for mech in mechs:
+                stats.setdefault(mech, {"used": 0, "succ": 0})
+                stats[mech]["used"] += 1
+                stats[mech]["succ"] += succ
+        mech_df = pd.DataFrame([{"Mechanism": m, "SuccessRate": v["succ"] / v["used"]}
+                                for m, v in stats.items()])
+        mech_df = mech_df[~mech_df["Mechanism"].isin(set(row["Mechanisms"]))]
+        return ",".join(mech_df.sort_values("SuccessRate", ascending=False).head(m)["Mechanism"])
+
+    return df.apply(_rec, axis=1)
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    """models/ kNN artifacts, train_recs scored against its first 300 rows, made-up predictions."""
+    work = tmp_path_factory.mktemp("recommend")
+    for name in ("knn_model.joblib", "knn_reference.npy", "rec_feature_columns.json"):
+        os.symlink(os.path.join(MODELS, name), work / name)
+    recs = pd.read_csv(TRAIN_RECS)
+    recs.to_csv(work / "train_recs.csv", index=False)
+    recs.head(300).to_csv(work / "test_recs.csv", index=False)
+    rng = np.random.default_rng(0)
+    probs = rng.dirichlet(np.ones(3), len(recs))
+    pd.DataFrame({"Student_id": recs["Student_id"], "pred_int": probs.argmax(axis=1),
+                  "P_low": probs[:, 0], "P_med": probs[:, 1], "P_high": probs[:, 2]}) \
+        .to_csv(work / "predictions.csv", index=False)
+    return str(work)
+
+
+@pytest.mark.parametrize("neighbor_index", ["sklearn", "exact"])
+def test_recommend_matches_the_per_row_loop(monkeypatch, workdir, neighbor_index):
+    pr = import_recommender(monkeypatch, workdir, neighbor_index)
+    out = pr.recommend("test_recs.csv")
+
+    preds = pr._load_predictions()
+    train, test = pr._load_train(preds), pr._load_test("test_recs.csv", preds)
+    legacy = legacy_recommend(test, train, pr.KNN, pr.FEATURE_COLS)
+    assert len(out) == len(test) == 300
+    assert out["recommendations"].tolist() == legacy.tolist()
@@ -0,0 +1,95 @@
+# test_reference_store.py
+"""
+Stored assessments must land in the same (imputed, scaled) feature space as
+the train_recs reference rows, or the delta segment wins every search.
+Needs only the kNN reference, imputer and scaler artifacts and train_recs.csv.
+"""
+import json
+import os
+
+import joblib
+import numpy as np
+import pytest
+from flask import Flask
+
+from compact_recs import CompactRecs
+from feature_encoder import FeatureEncoder
+from models import Assessment, AssessmentMechanism, CURRENT, db, mechanism_ids
+from neighbor_index import build_index, load_reference
+from reference_store import ReferenceStore
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS = os.path.join(BASE_DIR, "models")
+
+
+def random_assessments(n, rng):
+    """Answers spread over the form's ranges, like the students in train_recs."""
+    def scale():
+        return int(rng.integers(0, 6))
+
+    def yes_no():
+        return str(rng.choice(["Yes", "No"]))
+
+    return [{"age": int(rng.integers(18, 30)), "gender": str(rng.choice(["Female", "Male", "Other"])),
+             "gpa": float(rng.uniform(2, 4)), "study_hours": float(rng.uniform(5, 40)),
+             "social_media": float(rng.uniform(0, 8)), "sleep": float(rng.uniform(4, 9)),
+             "exercise": float(rng.uniform(0, 10)), "family_support": scale(), "financial_stress": scale(),
+             "peer_pressure": scale(), "relationship_stress": scale(), "counseling": yes_no(),
+             "diet_quality": scale(), "cognitive_distortions": scale(), "family_mental_history": yes_no(),
+             "medical_condition": yes_no(), "substance_use": scale()}
+            for _ in range(n)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    app = Flask("test")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'refs.db'}"
+    db.init_app(app)
+
+    with open(os.path.join(MODELS, "rec_feature_columns.json")) as f:
+        columns = json.load(f)
+    imputer = joblib.load(os.path.join(MODELS, "imputer.joblib"))
+    scaler = joblib.load(os.path.join(MODELS, "scaler.joblib"))
+    recs = CompactRecs.read_csv(os.path.join(BASE_DIR, "data", "train_recs.csv"), columns)
+    reference = load_reference(MODELS)
+
+    rng = np.random.default_rng(0)
+    with app.app_context():
+        db.create_all()
+        ids = mechanism_ids(["Yoga", "Reading"])
+        rows = [dict(a, id=i + 1, profile_id=1, predicted_stress="Low")
+                for i, a in enumerate(random_assessments(60, rng))]
+        db.session.execute(Assessment.__table__.insert(), rows)
+        db.session.execute(AssessmentMechanism.__table__.insert(),
+                           [dict(assessment_id=row["id"], kind=CURRENT, position=0, mechanism_id=ids["Yoga"])
+                            for row in rows])
+        db.session.commit()
+
+    store = ReferenceStore(app, db, FeatureEncoder(columns, columns),
+                           lambda X: scaler.transform(imputer.transform(X)),
+                           build_index("exact", reference=reference), reference, recs.mechanism_table(),
+                           compact_rows=10**9)
+    store.sync()
+    yield store, rng
+    store.close()
+    with app.app_context():
+        db.drop_all()
+
+
+def test_delta_rows_share_the_base_feature_space(store):
+    store, rng = store
+    snap = store._snapshot
+    assert snap.n_delta == 60
+
+    base = store._features[:snap.n_indexed]
+    delta = snap.delta.reference
+    scale = np.abs(delta).mean() / np.abs(base).mean()
+    assert 0.5 < scale < 2, f"delta rows are {scale:.1f}x the base rows' magnitude"
+
+    # new students, queried the way score_rows does: 60 stored rows next to
+    # 4k base rows must not crowd the base rows out of the neighbors
+    X, _, _ = store.encoder.encode_many(random_assessments(40, rng))
+    dist, idx = snap.kneighbors(store.encoder.rec_features(store.transform(X)), n_neighbors=50)
+    from_delta = idx >= snap.n_indexed
+    assert 0 < from_delta.mean() < 0.2
+    assert np.median(dist[from_delta]) < 2 * np.median(dist[~from_delta])
@@ -0,0 +1,194 @@
+# trends.py
+"""
+Per-profile stress trends, maintained incrementally as assessments are
+written so that reading them never scans a profile's history.
+
+stress_profile_stats keeps one row of running totals per profile (counts
+per category, an exponentially weighted average of prob_high, the last two
+drop probabilities) and stress_profile_trend_days one row per profile and
+UTC day with summed counts and probabilities. record() folds new
+assessments into both with upserts in the caller's transaction, so the
+aggregates commit or roll back with the assessments themselves;
+concurrent writers add to the stored values instead of overwriting them.
+Week and month buckets are rolled up from the day rows on read.
+
+The running average and last/previous drop probability are order
+dependent: they assume assessments are recorded oldest first, which holds
+as long as each write path commits in submission order (the write-behind
+queue is flushed before any synchronous write).
+
+Assessments are only ever removed together with their profile, and the
+aggregates go with it (ON DELETE CASCADE / ORM cascade), so there is no
+decrement path. rebuild() recomputes everything from stress_assessments;
+db_migrate runs it when the tables are first created.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import Assessment, ProfileStats, ProfileTrendDay, db
+
+# weight of the newest assessment in ewma_prob_high; 1/3 is roughly a
+# rolling mean over the last five
+EWMA_ALPHA = 1 / 3
+
+BUCKETS = ("day", "week", "month")
+
+_CATEGORY_COLUMN = {"Low": "count_low", "Medium": "count_medium", "High": "count_high"}
+_COUNT_COLUMNS = ("count",) + tuple(_CATEGORY_COLUMN.values())
+
+_DIALECT_INSERT = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _upsert(model, values, increments, replace):
+    """INSERT values, or on conflict add `increments` to the stored columns and overwrite `replace`."""
+    insert = _DIALECT_INSERT[db.engine.dialect.name](model)
+    stmt = insert.values(**values)
+    table = model.__table__
+    set_ = {name: table.c[name] + stmt.excluded[name] for name in increments}
+    set_.update(replace)
+    keys = [c.name for c in table.primary_key.columns]
+    db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=set_))
+
+
+def _counts(assessments):
+    counts = dict.fromkeys(_COUNT_COLUMNS, 0)
+    for a in assessments:
+        counts["count"] += 1
+        column = _CATEGORY_COLUMN.get(a.predicted_stress)
+        if column:
+            counts[column] += 1
+    return counts
+
+
+def _when(a):
+    return a.created_at or datetime.utcnow()
+
+
+def record(assessments):
+    """Fold newly written assessments (oldest first within a profile) into the aggregates."""
+    by_profile = defaultdict(list)
+    for a in assessments:
+        if isinstance(a, Assessment) and a.created_at is None:
+            a.created_at = datetime.utcnow()  # so the row and its day bucket agree
+        if a.profile_id is not None:
+            by_profile[a.profile_id].append(a)
+    for profile_id, items in by_profile.items():
+        items.sort(key=_when)
+        _record_stats(profile_id, items)
+        by_day = defaultdict(list)
+        for a in items:
+            by_day[_when(a).date()].append(a)
+        for day, day_items in by_day.items():
+            _record_day(profile_id, day, day_items)
+
+
+def _record_stats(profile_id, items):
+    # ewma after the new values: an existing row becomes stored * decay + tail;
+    # a fresh profile starts from its first prob_high
+    decay, tail, fresh = 1.0, 0.0, None
+    for a in items:
+        x = a.prob_high or 0.0
+        decay *= 1 - EWMA_ALPHA
+        tail = tail * (1 - EWMA_ALPHA) + EWMA_ALPHA * x
+        fresh = x if fresh is None else fresh * (1 - EWMA_ALPHA) + EWMA_ALPHA * x
+
+    last = items[-1]
+    prev = items[-2].drop_probability if len(items) > 1 else None
+    values = dict(_counts(items), profile_id=profile_id, ewma_prob_high=fresh,
+                  last_drop_probability=last.drop_probability, prev_drop_probability=prev,
+                  last_at=_when(last))
+    table = ProfileStats.__table__
+    _upsert(ProfileStats, values, _COUNT_COLUMNS, {
+        "ewma_prob_high": table.c.ewma_prob_high * decay + tail,
+        "prev_drop_probability": prev if len(items) > 1 else table.c.last_drop_probability,
+        "last_drop_probability": last.drop_probability,
+        "last_at": _when(last),
+    })
+
+
+def _record_day(profile_id, day, items):
+    values = dict(_counts(items), profile_id=profile_id, day=day,
+                  sum_prob_high=sum(a.prob_high or 0.0 for a in items),
+                  sum_drop_probability=sum(a.drop_probability or 0.0 for a in items),
+                  last_drop_probability=items[-1].drop_probability, last_at=_when(items[-1]))
+    _upsert(ProfileTrendDay, values, _COUNT_COLUMNS + ("sum_prob_high", "sum_drop_probability"), {
+        "last_drop_probability": items[-1].drop_probability,
+        "last_at": _when(items[-1]),
+    })
+
+
+def rebuild(chunk=5000):
+    """Recompute every profile's aggregates from stress_assessments; returns profiles covered."""
+    ProfileTrendDay.query.delete()
+    ProfileStats.query.delete()
+    rows = (db.session.query(Assessment.profile_id, Assessment.created_at, Assessment.predicted_stress,
+                             Assessment.prob_high, Assessment.drop_probability)
+            .order_by(Assessment.profile_id, Assessment.created_at, Assessment.id)
+            .execution_options(yield_per=chunk))
+    profiles, current, pending = 0, None, []
+    for row in rows:
+        if row.profile_id != current and pending:
+            record(pending)
+            profiles += 1
+            pending = []
+        current = row.profile_id
+        pending.append(row)
+    if pending:
+        record(pending)
+        profiles += 1
+    db.session.commit()
+    return profiles
+
+
+def _bucket_start(day, bucket):
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def summary(profile_id):
+    stats = db.session.get(ProfileStats, profile_id)
+    if stats is None:
+        return {"count": 0, "low": 0, "medium": 0, "high": 0, "ewma_prob_high": None,
+                "last_drop_probability": None, "drop_probability_change": None, "last_at": None}
+    change = None
+    if stats.prev_drop_probability is not None and stats.last_drop_probability is not None:
+        change = stats.last_drop_probability - stats.prev_drop_probability
+    return {
+        "count": stats.count,
+        "low": stats.count_low,
+        "medium": stats.count_medium,
+        "high": stats.count_high,
+        "ewma_prob_high": stats.ewma_prob_high,
+        "last_drop_probability": stats.last_drop_probability,
+        "drop_probability_change": change,
+        "last_at": stats.last_at.isoformat() if stats.last_at else None,
+    }
+
+
+def trend(profile_id, bucket="day"):
+    """Time buckets (oldest first) rolled up from the profile's day rows."""
+    if bucket not in BUCKETS:
+        raise ValueError(f"unknown bucket {bucket!r}; choose one of {', '.join(BUCKETS)}")
+    days = ProfileTrendDay.query.filter_by(profile_id=profile_id).order_by(ProfileTrendDay.day)
+    summed = _COUNT_COLUMNS + ("sum_prob_high", "sum_drop_probability")
+    buckets = {}
+    for d in days:
+        b = buckets.setdefault(_bucket_start(d.day, bucket), dict.fromkeys(summed, 0))
+        for name in summed:
+            b[name] += getattr(d, name)
+        b["last_drop_probability"] = d.last_drop_probability
+    return [{
+        "start": start.isoformat(),
+        "count": b["count"],
+        "low": b["count_low"],
+        "medium": b["count_medium"],
+        "high": b["count_high"],
+        "mean_prob_high": b["sum_prob_high"] / b["count"],
+        "mean_drop_probability": b["sum_drop_probability"] / b["count"],
+        "last_drop_probability": b["last_drop_probability"],
+    } for start, b in buckets.items()]